@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -3,9 +3,29 @@ Models for the accounts app.
 """
 
 from django.contrib.auth.models import AbstractUser
+from django.db import models, router
 
 
 class User(AbstractUser):
     """Representation of the custom User table"""
-    pass
     # add additional fields in here
+
+    # bumped whenever the user's trips or destinations change, so caches of
+    # derived data (map clusters, tiles, ...) can be keyed on it
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    @classmethod
+    def bump_data_versions(cls, user_ids):
+        cls.objects.filter(pk__in=user_ids).update(
+            data_version=models.F("data_version") + 1)
+
+    def read_data_version(self):
+        """
+        The data version as seen where reads go. Read-only views read from a
+        replica that may lag behind the primary the user was loaded from, so
+        caches they fill must be keyed on the replica's version.
+        """
+        if router.db_for_read(type(self)) == self._state.db:
+            return self.data_version
+        return type(self).objects.filter(pk=self.pk).values_list(
+            "data_version", flat=True).first()
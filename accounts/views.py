@@ -2,11 +2,14 @@
 Views for the accounts app
 """
 
+from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, DetailView, UpdateView, DeleteView
 from .forms import AccountCreationForm, AccountForm
 from .models import User
+from trips.deletion import delete_account
 
 
 class SignUpView(CreateView):
@@ -44,3 +47,8 @@ class DeleteAccountView(LoginRequiredMixin, DeleteView):
 
     def get_object(self, queryset=...):
         return self.request.user
+
+    def form_valid(self, form):
+        delete_account(self.object)
+        logout(self.request)
+        return redirect(self.get_success_url())
@@ -11,6 +11,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from config.startup import LifespanMiddleware
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
 
 application = get_asgi_application()
+application = LifespanMiddleware(application)
@@ -0,0 +1,93 @@
+"""
+Brotli and gzip compression of dynamic responses.
+
+Responses that contain a CSRF token are open to BREACH, which recovers
+secrets from compressed sizes when a page also reflects attacker-chosen
+text. Django masks CSRF tokens differently on every response; on top of
+that such responses are only gzipped, with a random-length gzip header
+(as Django's GZipMiddleware does) so their size does not give the content
+away. Brotli has no such padding, so it is kept for responses without
+secrets, such as JSON map data.
+"""
+
+import re
+
+from django.conf import settings
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # installed with whitenoise[brotli]
+    brotli = None
+
+# bytes of random padding in the gzip header of responses with secrets
+MAX_RANDOM_BYTES = 100
+
+CODING = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?")
+
+
+def accepted_encodings(accept_encoding):
+    """The content codings an Accept-Encoding header allows."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        if match := CODING.match(part):
+            try:
+                if float(match[2] or 1) > 0:
+                    accepted.add(match[1].lower())
+            except ValueError:
+                pass
+    return accepted
+
+
+def is_sensitive(response):
+    """
+    Whether a CSRF token was rendered into the response, which makes
+    CsrfViewMiddleware (re)set the CSRF cookie.
+    """
+    return settings.CSRF_COOKIE_NAME in response.cookies
+
+
+def choose_encoding(accept_encoding, sensitive=False):
+    """Returns "br", "gzip" or None for a response and the client's Accept-Encoding."""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli and not sensitive and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, sensitive=False):
+    if encoding == "br":
+        return brotli.compress(data, quality=settings.COMPRESS_BROTLI_QUALITY)
+    return compress_string(data, max_random_bytes=MAX_RANDOM_BYTES if sensitive else None)
+
+
+def _brotli_chunk(compressor, chunk):
+    # flushed so each chunk reaches the client as soon as it is produced
+    return compressor.process(chunk) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, sensitive=False):
+    if encoding == "gzip":
+        yield from compress_sequence(
+            chunks, max_random_bytes=MAX_RANDOM_BYTES if sensitive else None)
+        return
+    compressor = brotli.Compressor(quality=settings.COMPRESS_BROTLI_QUALITY)
+    for chunk in chunks:
+        if data := _brotli_chunk(compressor, chunk):
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding, sensitive=False):
+    if encoding == "gzip":
+        # one gzip member per chunk, which clients decode as a single stream
+        async for chunk in chunks:
+            yield compress(chunk, encoding, sensitive)
+        return
+    compressor = brotli.Compressor(quality=settings.COMPRESS_BROTLI_QUALITY)
+    async for chunk in chunks:
+        if data := _brotli_chunk(compressor, chunk):
+            yield data
+    yield compressor.finish()
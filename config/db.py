@@ -0,0 +1,67 @@
+"""
+Routing of reads to database replicas.
+
+Views with `ReplicaReadMixin` run the reads of GET and HEAD requests on one
+of the `DATABASE_REPLICAS` aliases, picked at random once per request so
+its reads are consistent with each other; everything else reads
+from and all writes go to the primary ("default"). Replicas may lag, so
+after any write request `PinPrimaryMiddleware` sets a cookie that keeps the
+client's reads on the primary for `REPLICA_PIN_SECONDS`, so users see their
+own changes.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PIN_COOKIE = "pin_primary"
+
+# alias of the replica reads go to, if any
+_replica = ContextVar("replica", default=None)
+
+
+@contextmanager
+def replica_reads():
+    """Sends the reads in the block to one replica, if there are any."""
+    token = _replica.set(
+        random.choice(settings.DATABASE_REPLICAS) if settings.DATABASE_REPLICAS else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # a database cache must see its own writes
+        if model._meta.app_label == "django_cache":
+            return "default"
+        return _replica.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # all aliases hold the same data
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    Reads from a replica for GET and HEAD requests of clients that did not
+    write recently, including while rendering the response.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or PIN_COOKIE in request.COOKIES:
+            return super().dispatch(request, *args, **kwargs)
+
+        # authenticate against the primary
+        request.user.is_authenticated
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
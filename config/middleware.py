@@ -0,0 +1,224 @@
+"""
+Load shedding for overloaded workers, pinning clients that just wrote to
+the primary database, and compression of dynamic responses.
+
+Each worker process admits at most `limit` requests at once and answers
+the rest with a fast 503, so the requests it does admit stay fast instead
+of all of them queueing until they time out. The limit adapts AIMD style:
+it grows by about one per `limit` requests completed while the worker is
+busy, and shrinks by a fifth (at most once per target latency) whenever a
+request takes longer than `LOAD_SHED_TARGET_LATENCY`, counting any time
+spent queued in front of the worker as reported by an `X-Request-Start`
+header (only where `LOAD_SHED_TRUST_REQUEST_START` says the proxy sets it,
+as clients could send any value).
+
+Requests are prioritized by URL name (`LOAD_SHED_PRIORITIES`): "low"
+requests only get a share of the limit and are also shed while requests
+are queueing, "normal" ones get all of it, and "high" ones are never shed.
+"""
+
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import compression
+from .db import PIN_COOKIE
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("low", "normal", "high")
+
+
+# queue times longer than this many target latencies are taken to be bogus
+MAX_QUEUE_LATENCIES = 5
+
+
+def queue_seconds(request):
+    """
+    Seconds the request waited before reaching the worker, from an
+    `X-Request-Start: t=<time>` header set by the proxy, or 0.
+    """
+    if not settings.LOAD_SHED_TRUST_REQUEST_START:
+        return 0
+    value = request.headers.get("X-Request-Start", "").removeprefix("t=")
+    try:
+        start = float(value)
+    except ValueError:
+        return 0
+    # the time may be in seconds, milliseconds or microseconds
+    while start > 1e11:
+        start /= 1000
+    queued = time.time() - start
+    if not 0 <= queued <= MAX_QUEUE_LATENCIES * settings.LOAD_SHED_TARGET_LATENCY:
+        return 0
+    return queued
+
+
+class AdaptiveLimit:
+    """In-flight requests of a worker and their adaptive limit."""
+
+    def __init__(self, initial=16, minimum=2, maximum=64, target_latency=1.0, low_share=0.5):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.low_share = low_share
+        self.in_flight = 0
+        self.queue_latency = 0.0
+        self.shed = dict.fromkeys(PRIORITIES, 0)
+        self.last_decrease = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, priority, queued=0):
+        """Admits a request, returning whether it may go ahead."""
+        with self.lock:
+            # smoothed, so one slow request does not shed the next ones
+            self.queue_latency = 0.8 * self.queue_latency + 0.2 * queued
+            if priority == "high":
+                admit = True
+            elif priority == "low":
+                admit = (self.in_flight < self.limit * self.low_share
+                         and self.queue_latency < self.target_latency / 2)
+            else:
+                admit = self.in_flight < self.limit
+            if admit:
+                self.in_flight += 1
+            else:
+                self.shed[priority] += 1
+            return admit
+
+    def release(self, latency):
+        """Records that an admitted request finished after `latency` seconds."""
+        with self.lock:
+            busy = self.in_flight >= self.limit / 2
+            self.in_flight -= 1
+            now = time.monotonic()
+            if latency > self.target_latency:
+                if now - self.last_decrease > self.target_latency:
+                    self.limit = max(self.minimum, self.limit * 0.8)
+                    self.last_decrease = now
+            elif busy:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def stats(self):
+        with self.lock:
+            return {"limit": self.limit, "in_flight": self.in_flight,
+                    "queue_latency": self.queue_latency, "shed": dict(self.shed)}
+
+
+def get_priority(request):
+    try:
+        name = resolve(request.path_info).view_name
+    except Resolver404:
+        return "normal"
+    return settings.LOAD_SHED_PRIORITIES.get(name, "normal")
+
+
+class LoadSheddingMiddleware:
+    """Sheds requests beyond the worker's adaptive concurrency limit with a 503."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiter = AdaptiveLimit(
+            initial=settings.LOAD_SHED_INITIAL_LIMIT,
+            minimum=settings.LOAD_SHED_MIN_LIMIT,
+            maximum=settings.LOAD_SHED_MAX_LIMIT,
+            target_latency=settings.LOAD_SHED_TARGET_LATENCY,
+        )
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def shed(self, priority):
+        logger.info("Shed a %s priority request: %s", priority, self.limiter.stats())
+        response = HttpResponse("The server is busy, please try again shortly",
+                                status=503, content_type="text/plain")
+        response["Retry-After"] = 1
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        priority, queued = get_priority(request), queue_seconds(request)
+        if not self.limiter.acquire(priority, queued):
+            return self.shed(priority)
+        started = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            self.limiter.release(time.monotonic() - started + queued)
+
+    async def __acall__(self, request):
+        priority, queued = get_priority(request), queue_seconds(request)
+        if not self.limiter.acquire(priority, queued):
+            return self.shed(priority)
+        started = time.monotonic()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.limiter.release(time.monotonic() - started + queued)
+
+
+class PinPrimaryMiddleware(MiddlewareMixin):
+    """
+    Keeps the reads of clients that just wrote on the primary database for
+    `REPLICA_PIN_SECONDS`, see config/db.py.
+    """
+
+    def process_response(self, request, response):
+        if settings.DATABASE_REPLICAS and request.method not in ("GET", "HEAD", "OPTIONS"):
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS,
+                                secure=settings.SESSION_COOKIE_SECURE, httponly=True,
+                                samesite="Lax")
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses dynamic responses of the `COMPRESS_CONTENT_TYPES` of at
+    least `COMPRESS_MIN_SIZE` bytes, with Brotli or gzip as the client
+    accepts. See config/compression.py.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "").partition(";")[0].strip()
+        if (response.has_header("Content-Encoding")
+                or content_type not in settings.COMPRESS_CONTENT_TYPES):
+            return response
+        size = (int(response.get("Content-Length", settings.COMPRESS_MIN_SIZE))
+                if response.streaming else len(response.content))
+        if size < settings.COMPRESS_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        sensitive = compression.is_sensitive(response)
+        encoding = compression.choose_encoding(
+            request.headers.get("Accept-Encoding", ""), sensitive)
+        if not encoding:
+            return response
+
+        if response.streaming:
+            stream = compression.acompress_stream if response.is_async else compression.compress_stream
+            response.streaming_content = stream(response.streaming_content, encoding, sensitive)
+            del response.headers["Content-Length"]
+        else:
+            content = compression.compress(response.content, encoding, sensitive)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        # a strong ETag must change with the encoding, a weak one need not
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
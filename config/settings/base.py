@@ -20,11 +20,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 INSTALLED_APPS = [
     'accounts.apps.AccountsConfig',
     'trips.apps.TripsConfig',
+    'tasks.apps.TasksConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 AUTH_USER_MODEL = "accounts.User"
@@ -32,6 +34,9 @@ AUTH_USER_MODEL = "accounts.User"
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'config.middleware.CompressionMiddleware',
+    'config.middleware.LoadSheddingMiddleware',
+    'config.middleware.PinPrimaryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +76,21 @@ DATABASES = {
     }
 }
 
+# Read-only views read from these database aliases (if any), and clients
+# read from the primary for a while after writing, see config/db.py
+DATABASE_ROUTERS = ['config.db.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 10
+
+
+# Each process has its own cache here; production shares one between all
+# of its processes, see production.py
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -114,5 +134,74 @@ STATICFILES_DIRS = [BASE_DIR / 'static',]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Vector tiles of destinations are cached on disk here
+TILE_CACHE_DIR = BASE_DIR / "tilecache"
+
+# Map thumbnails of trips are cached on disk here, and rendered on a pool
+# of this many processes (or in the web worker if 0)
+THUMBNAIL_CACHE_DIR = BASE_DIR / "thumbnailcache"
+THUMBNAIL_PROCESSES = 2
+
+# Geocoder used to fill in missing destination coordinates, see
+# trips/geocoding.py
+GEOCODER_BACKEND = "trips.geocoding.MapboxGeocoder"
+
+# Run background tasks on a thread pool inside each ASGI worker process,
+# instead of (or besides) `manage.py taskworker`
+TASKS_IN_PROCESS = False
+TASKS_CONCURRENCY = 4
+# Finished tasks are kept this many seconds, then pruned by the workers
+TASKS_RETENTION = 60 * 60 * 24 * 7
+
+# Location searches allowed, as (tokens per second, burst), per user and
+# for all users together, see trips/throttle.py
+LOCATION_SEARCH_USER_RATE = (1, 5)
+LOCATION_SEARCH_GLOBAL_RATE = (20, 50)
+
+# Pages of shared trips are kept whole for this many seconds in the cache
+# and downstream caches (which are purged when a trip changes), and for this
+# many in browsers, see trips/sharing.py
+SHARED_PAGE_TIMEOUT = 60 * 60 * 24
+SHARED_PAGE_MAX_AGE = 60
+# A CDN's purge-by-surrogate-key endpoint, and headers to send with purges
+SHARED_PAGE_PURGE_URL = None
+SHARED_PAGE_PURGE_HEADERS = {}
+
+# Dynamic responses compressed with Brotli (at this quality) or gzip, see
+# config/compression.py
+COMPRESS_CONTENT_TYPES = {
+    "text/html",
+    "text/plain",
+    "application/json",
+    "application/geo+json",
+    "image/svg+xml",
+    "application/vnd.mapbox-vector-tile",
+}
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_BROTLI_QUALITY = 4
+
+# Per worker limit on concurrent requests, adapted so requests finish
+# within the target latency (in seconds), see config/middleware.py
+LOAD_SHED_INITIAL_LIMIT = 16
+LOAD_SHED_MIN_LIMIT = 2
+LOAD_SHED_MAX_LIMIT = 64
+LOAD_SHED_TARGET_LATENCY = 1.0
+# Whether the proxy in front of the workers sets X-Request-Start, so the
+# time requests spent queueing there can be counted
+LOAD_SHED_TRUST_REQUEST_START = False
+# Priorities of views by URL name, "normal" if not listed
+LOAD_SHED_PRIORITIES = {
+    "accounts:login": "high",
+    "accounts:logout": "high",
+    "trips:search-loc": "low",
+    "trips:search": "low",
+    "trips:search-trip": "low",
+    "trips:nearby-dests": "low",
+    "trips:optimize-trip": "low",
+    "trips:dest-duplicates": "low",
+    "trips:dest-conflicts": "low",
+    "trips:user-tile": "low",
+}
+
 LOGIN_REDIRECT_URL = 'trips:profile'
 LOGOUT_REDIRECT_URL = 'trips:index'
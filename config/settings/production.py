@@ -19,6 +19,38 @@ DATABASES = {
     ),
 }
 
+# Comma separated URLs of read replicas
+for i, url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(","))):
+    DATABASES[f"replica{i + 1}"] = dj_database_url.parse(
+        url, conn_max_age=600, conn_health_checks=True)
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+# Shared by all web processes, so purges of shared pages, circuit breakers
+# and rate limits apply to every one of them. The table is created by
+# `manage.py createcachetable` in render-build.sh
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+
+# Fastly-style purge endpoint of the CDN in front of the site, e.g.
+# https://api.fastly.com/service/<id>/purge
+SHARED_PAGE_PURGE_URL = os.environ.get("CDN_PURGE_URL")
+if SHARED_PAGE_PURGE_URL:
+    SHARED_PAGE_PURGE_HEADERS = {"Fastly-Key": os.environ["CDN_PURGE_KEY"]}
+
+# Render's plan has no background worker services, so the web processes
+# run the task queue themselves (set TASKS_IN_PROCESS=false when running
+# `manage.py taskworker` separately)
+TASKS_IN_PROCESS = os.environ.get("TASKS_IN_PROCESS", "true").lower() != "false"
+
+# Set REQUEST_START_HEADER=true if the proxy sets X-Request-Start, see
+# config/middleware.py
+LOAD_SHED_TRUST_REQUEST_START = os.environ.get("REQUEST_START_HEADER", "false").lower() == "true"
+
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -0,0 +1,35 @@
+"""
+Single-node production settings with an embedded SQLite database.
+
+For small self-hosted instances: there is no database server to run or
+reach over the network. The database is in WAL mode, so readers never block
+the (single) writer, and write transactions begin IMMEDIATE, taking the
+write lock up front instead of failing to upgrade a read lock midway.
+"""
+
+from .production import *
+
+# Comma separated host names the instance is served on
+ALLOWED_HOSTS += [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            # seconds to wait for the write lock
+            'timeout': 20,
+            'init_command': (
+                'PRAGMA journal_mode = WAL;'
+                # durable at checkpoints rather than every commit, safe with WAL
+                'PRAGMA synchronous = NORMAL;'
+                # 64 MiB page cache (negative sizes are in KiB)
+                'PRAGMA cache_size = -65536;'
+                'PRAGMA mmap_size = 268435456;'
+                'PRAGMA temp_store = MEMORY;'
+            ),
+        },
+    },
+}
+DATABASE_REPLICAS = []
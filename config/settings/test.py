@@ -8,3 +8,7 @@ SECRET_KEY = 'django-insecure-rjr9fwc*!63&wu8m7is(cbeqw%8t9lpfor(wk9v4_j79-=iplz
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
+
+# A second database to test reading from replicas, as a separate database
+# it behaves like a replica that has not caught up yet
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'NAME': 'test_wanderlust_replica'}}
@@ -0,0 +1,155 @@
+"""
+Worker start-up: lazy imports, warm-up and start-up profiling.
+
+Workers restart often, so dependencies only a few requests need are
+imported lazily (`lazy_import`), and `warm_up` does the work the first
+requests would otherwise do (URL resolution, template compilation) before
+a worker accepts traffic. Database connections are left to the requests,
+which under ASGI run on threads of their own and close their connections
+when they finish. `LifespanMiddleware` runs it on the ASGI lifespan
+startup event, and also starts and stops the in-process task worker (see
+`TASKS_IN_PROCESS`).
+"""
+
+import importlib.util
+import json
+import logging
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def lazy_import(name):
+    """
+    Returns the module `name`, executing it only once an attribute of it is
+    first used.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def warm_up():
+    """
+    Resolves the URL patterns (importing all views) and compiles the
+    project's templates. Returns the seconds each took.
+    """
+    from django.template import engines
+    from django.template.exceptions import TemplateSyntaxError
+    from django.urls import get_resolver
+
+    timings = {}
+    started = time.monotonic()
+    get_resolver().reverse_dict
+    timings["urls"] = time.monotonic() - started
+
+    started = time.monotonic()
+    for engine in engines.all():
+        for directory in map(Path, engine.template_dirs):
+            if not directory.is_relative_to(settings.BASE_DIR):
+                continue
+            for path in directory.rglob("*.html"):
+                try:
+                    engine.get_template(path.relative_to(directory).as_posix())
+                except TemplateSyntaxError:
+                    logger.exception("Could not compile template %s", path)
+    timings["templates"] = time.monotonic() - started
+    return timings
+
+
+class LifespanMiddleware:
+    """
+    ASGI middleware that warms the worker up on lifespan startup, which
+    servers complete before accepting requests, and runs background tasks
+    in the process until shutdown if `TASKS_IN_PROCESS` is set. Django
+    itself does not handle lifespan events.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.task_worker = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await self.app(scope, receive, send)
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    timings = await sync_to_async(warm_up)()
+                except Exception as e:
+                    logger.exception("Warm-up failed")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                logger.info("Warmed up in %s", ", ".join(
+                    f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
+                if settings.TASKS_IN_PROCESS:
+                    from tasks.worker import Worker
+                    self.task_worker = Worker(settings.TASKS_CONCURRENCY)
+                    self.task_worker.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.task_worker:
+                    self.task_worker.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+# Run with `python -X importtime` in a fresh process by `measure_startup`
+PROFILE_SCRIPT = """
+import json, sys, time
+started = time.monotonic()
+import django
+django.setup()
+timings = {"setup": time.monotonic() - started}
+from django.conf import settings
+from django.test import Client
+from config.startup import warm_up
+if %(warm_up)r:
+    timings.update(warm_up())
+host = next((h for h in settings.ALLOWED_HOSTS if h not in ("*", "")), "localhost")
+client = Client(SERVER_NAME=host.lstrip("."))
+for request in ("first_request", "second_request"):
+    started = time.monotonic()
+    client.get(%(path)r, secure=True)
+    timings[request] = time.monotonic() - started
+print(json.dumps(timings))
+"""
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def measure_startup(path="/", warm=False):
+    """
+    Starts Django in a fresh process and requests `path` twice. Returns the
+    seconds start-up steps took and the import times, as a list of (module,
+    self seconds, cumulative seconds, depth) in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROFILE_SCRIPT % {"path": path, "warm_up": warm}],
+        capture_output=True, text=True, check=True, cwd=settings.BASE_DIR)
+    imports = [(m[4], int(m[1]) / 1e6, int(m[2]) / 1e6, len(m[3]) // 2)
+               for m in IMPORT_TIME.finditer(result.stderr)]
+    return json.loads(result.stdout.splitlines()[-1]), imports
+
+
+def imports_by_package(imports):
+    """Total import time of each top-level package, slowest first."""
+    totals = defaultdict(float)
+    for module, seconds, _, _ in imports:
+        totals[module.partition(".")[0]] += seconds
+    return sorted(totals.items(), key=lambda item: -item[1])
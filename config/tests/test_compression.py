@@ -0,0 +1,105 @@
+import gzip
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..compression import brotli, choose_encoding
+from ..middleware import CompressionMiddleware
+from accounts.models import User
+from trips.models import Trip
+
+
+class ChooseEncodingTests(SimpleTestCase):
+    def test_choose_encoding(self):
+        """
+        Prefers Brotli to gzip, except for sensitive responses, and respects q=0.
+        """
+        self.assertEqual(choose_encoding("gzip, deflate, br"), "br" if brotli else "gzip")
+        self.assertEqual(choose_encoding("gzip, br", sensitive=True), "gzip")
+        self.assertEqual(choose_encoding("br;q=0, GZIP;q=0.5"), "gzip")
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+        self.assertIsNone(choose_encoding(""))
+
+
+@override_settings(COMPRESS_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.data = {"features": [{"name": f"destination {i}"} for i in range(50)]}
+
+    def process(self, response, accept="gzip, br"):
+        request = self.factory.get("/", headers={"accept-encoding": accept})
+        return CompressionMiddleware(lambda request: response)(request)
+
+    @unittest.skipUnless(brotli, "brotli is not installed")
+    def test_brotli(self):
+        """
+        Compresses JSON with Brotli and weakens its ETag.
+        """
+        response = JsonResponse(self.data)
+        content = response.content
+        response["ETag"] = '"abc"'
+        response = self.process(response)
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertEqual(brotli.decompress(response.content), content)
+
+    def test_sensitive_responses_gzipped_with_padding(self):
+        """
+        Responses with a CSRF token are gzipped with a random length header.
+        """
+        body = "<form>token</form>" + "<p>text</p>" * 50
+        response = HttpResponse(body)
+        response.set_cookie(settings.CSRF_COOKIE_NAME, "token")
+        response = self.process(response, accept="br, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response.content[3] & gzip.FNAME)
+        self.assertEqual(gzip.decompress(response.content).decode(), body)
+
+    def test_skipped(self):
+        """
+        Small, already encoded and binary responses and clients without support are skipped.
+        """
+        response = self.process(HttpResponse("x" * 99))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.process(JsonResponse(self.data), accept="identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        response = self.process(HttpResponse(b"x" * 200, content_type="image/png"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = HttpResponse("x" * 200, headers={"Content-Encoding": "gzip"})
+        self.assertEqual(self.process(response).content, b"x" * 200)
+
+    def test_streaming(self):
+        """
+        Compresses streamed files without a Content-Length.
+        """
+        with tempfile.TemporaryFile() as f:
+            f.write(b"<svg>" + b"<circle/>" * 100 + b"</svg>")
+            f.seek(0)
+            response = self.process(FileResponse(f, content_type="image/svg+xml"), accept="gzip")
+            self.assertFalse(response.has_header("Content-Length"))
+            data = gzip.decompress(b"".join(response.streaming_content))
+        self.assertEqual(data, b"<svg>" + b"<circle/>" * 100 + b"</svg>")
+
+
+class CompressedPagesTests(TestCase):
+    def test_pages_compressed(self):
+        """
+        Pages with forms are gzipped, map data is compressed with Brotli.
+        """
+        user = User.objects.create(username="myuser")
+        for i in range(30):
+            Trip.objects.create(owner=user, title=f"trip {i}")
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("trips:profile"), headers={"accept-encoding": "br, gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn(b"trip 29", gzip.decompress(response.content))
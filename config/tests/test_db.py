@@ -0,0 +1,87 @@
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..db import PIN_COOKIE, ReplicaRouter, replica_reads
+from accounts.models import User
+from trips.models import Destination, Trip
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TestCase):
+    # the replica is a separate, empty database, like a replica lagging behind
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = User.objects.create(username="myuser")
+        self.trip = Trip.objects.create(owner=self.user, title="Lisbon")
+        self.client.force_login(self.user)
+
+    def test_router(self):
+        """
+        Reads go to a replica only where allowed, writes always go to the primary.
+        """
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Trip), "default")
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Trip), "replica")
+            self.assertEqual(router.db_for_write(Trip), "default")
+            with override_settings(DATABASE_REPLICAS=[]), replica_reads():
+                self.assertEqual(router.db_for_read(Trip), "default")
+            cache_entry = DatabaseCache("cache", {}).cache_model_class
+            self.assertEqual(router.db_for_read(cache_entry), "default")
+        self.assertEqual(router.db_for_read(Trip), "default")
+
+    def test_read_only_views_read_from_replica(self):
+        """
+        Read-only views read from the replica, after authenticating on the primary.
+        """
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            response = self.client.get(reverse("trips:profile"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Lisbon")
+        self.assertTrue(queries)
+
+        response = self.client.get(reverse("trips:trip-detail", args=[self.trip.slug]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_replica_caches_keyed_on_replica_version(self):
+        """
+        Caches filled from the replica are not served for the primary's data.
+        """
+        Destination.objects.create(trip=self.trip, name="Belem", latitude=38.7, longitude=-9.2)
+        self.user.refresh_from_db()
+        with replica_reads():
+            self.assertIsNone(self.user.read_data_version())
+        self.assertEqual(self.user.read_data_version(), self.user.data_version)
+
+        url = reverse("trips:profile-map") + "?zoom=3"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["features"], [])
+        self.client.cookies[PIN_COOKIE] = "1"
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()["features"]), 1)
+
+    def test_writes_pin_to_primary(self):
+        """
+        After a write, the client reads from the primary for a while.
+        """
+        response = self.client.post(reverse("trips:create-trip"), {"title": "Porto"})
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 10)
+
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            response = self.client.get(reverse("trips:profile"))
+        self.assertContains(response, "Lisbon")
+        self.assertContains(response, "Porto")
+        self.assertFalse(queries)
+
+    def test_other_views_read_from_primary(self):
+        """
+        Views without the replica policy read from the primary.
+        """
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            response = self.client.get(reverse("trips:edit-trip", args=[self.trip.slug]))
+        self.assertContains(response, "Lisbon")
+        self.assertFalse(queries)
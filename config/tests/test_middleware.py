@@ -0,0 +1,100 @@
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from ..middleware import AdaptiveLimit, LoadSheddingMiddleware, queue_seconds
+
+
+class AdaptiveLimitTests(SimpleTestCase):
+    def test_admits_by_priority(self):
+        """
+        Low priority requests get a share of the limit, high priority ones are never shed.
+        """
+        limiter = AdaptiveLimit(initial=4, low_share=0.5)
+        self.assertEqual([limiter.acquire("low") for _ in range(3)], [True, True, False])
+        self.assertEqual([limiter.acquire("normal") for _ in range(3)], [True, True, False])
+        self.assertTrue(limiter.acquire("high"))
+        self.assertEqual(limiter.stats()["shed"], {"low": 1, "normal": 1, "high": 0})
+
+    def test_low_priority_shed_while_queueing(self):
+        """
+        Low priority requests are shed while requests wait long in front of the worker.
+        """
+        limiter = AdaptiveLimit(target_latency=1.0)
+        for _ in range(5):
+            limiter.acquire("normal", queued=2)
+        self.assertFalse(limiter.acquire("low"))
+        self.assertTrue(limiter.acquire("normal"))
+
+    def test_adapts_limit(self):
+        """
+        The limit grows while busy requests are fast and shrinks when they are slow.
+        """
+        limiter = AdaptiveLimit(initial=4, minimum=2, target_latency=1.0)
+        for _ in range(4):
+            limiter.acquire("normal")
+        limiter.release(0.1)
+        self.assertEqual(limiter.limit, 4.25)
+
+        limiter.release(2)
+        self.assertAlmostEqual(limiter.limit, 3.4)
+        # decreased at most once per target latency
+        limiter.release(2)
+        self.assertAlmostEqual(limiter.limit, 3.4)
+        with mock.patch("config.middleware.time.monotonic", return_value=time.monotonic() + 2):
+            limiter.release(2)
+        self.assertAlmostEqual(limiter.limit, 2.72)
+        self.assertEqual(limiter.in_flight, 0)
+
+        # not while idle
+        limiter.acquire("normal")
+        limiter.release(0.1)
+        self.assertAlmostEqual(limiter.limit, 2.72)
+
+
+class LoadSheddingMiddlewareTests(SimpleTestCase):
+    def test_sheds_low_priority(self):
+        """
+        Responds with a 503 to low priority requests beyond their share of the limit.
+        """
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse("ok"))
+        middleware.limiter.limit = 2
+        middleware.limiter.in_flight = 1
+        factory = RequestFactory()
+
+        response = middleware(factory.post(reverse("trips:search-loc")))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+        response = middleware(factory.get(reverse("trips:profile")))
+        self.assertContains(response, "ok")
+        self.assertEqual(middleware.limiter.in_flight, 1)
+
+    @override_settings(LOAD_SHED_TRUST_REQUEST_START=True)
+    def test_queue_seconds(self):
+        """
+        Reads the time queued in front of the worker in seconds, milliseconds or microseconds.
+        """
+        factory = RequestFactory()
+        start = time.time() - 3
+        for value in (f"t={start}", str(int(start * 1000)), f"t={int(start * 1e6)}"):
+            request = factory.get("/", headers={"X-Request-Start": value})
+            self.assertAlmostEqual(queue_seconds(request), 3, places=1)
+        self.assertEqual(queue_seconds(factory.get("/")), 0)
+        self.assertEqual(queue_seconds(factory.get("/", headers={"X-Request-Start": "x"})), 0)
+
+    def test_queue_seconds_untrusted(self):
+        """
+        Ignores the header unless the proxy is known to set it, and times
+        that cannot be right.
+        """
+        factory = RequestFactory()
+        request = factory.get("/", headers={"X-Request-Start": f"t={time.time() - 3}"})
+        self.assertEqual(queue_seconds(request), 0)
+        with self.settings(LOAD_SHED_TRUST_REQUEST_START=True):
+            for start in (time.time() + 60, time.time() - 3600, 0):
+                request = factory.get("/", headers={"X-Request-Start": f"t={start}"})
+                self.assertEqual(queue_seconds(request), 0)
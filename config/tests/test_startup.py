@@ -0,0 +1,73 @@
+import asyncio
+import sys
+from types import ModuleType
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from ..startup import LifespanMiddleware, imports_by_package, lazy_import
+
+
+class StartupTests(TestCase):
+    def test_lazy_import(self):
+        """
+        A lazily imported module is only executed once it is used.
+        """
+        if "colorsys" in sys.modules:
+            self.skipTest("colorsys is already imported")
+        self.addCleanup(sys.modules.pop, "colorsys", None)
+        colorsys = lazy_import("colorsys")
+        self.assertIs(sys.modules["colorsys"], colorsys)
+        self.assertIsNot(type(colorsys), ModuleType)
+        self.assertEqual(colorsys.rgb_to_hsv(1, 0, 0), (0, 1, 1))
+        self.assertIs(type(colorsys), ModuleType)
+        self.assertIs(lazy_import("sys"), sys)
+
+    def test_lifespan_warms_up(self):
+        """
+        Startup completes after warming up, and other requests reach the application.
+        """
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+        called = []
+
+        async def app(scope, receive, send):
+            called.append(scope["type"])
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        middleware = LifespanMiddleware(app)
+        asyncio.run(middleware({"type": "lifespan"}, receive, send))
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        asyncio.run(middleware({"type": "http"}, receive, send))
+        self.assertEqual(called, ["http"])
+
+    @override_settings(TASKS_IN_PROCESS=True, TASKS_CONCURRENCY=2)
+    def test_lifespan_runs_task_worker(self):
+        """
+        The in-process task worker starts with the server and stops on shutdown.
+        """
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            pass
+
+        with mock.patch("tasks.worker.Worker") as worker:
+            asyncio.run(LifespanMiddleware(None)({"type": "lifespan"}, receive, send))
+        worker.assert_called_once_with(2)
+        worker.return_value.start.assert_called_once_with()
+        worker.return_value.stop.assert_called_once_with()
+
+    def test_imports_by_package(self):
+        """
+        Import times are summed by top-level package.
+        """
+        imports = [("a.b", 0.5, 0.5, 1), ("c", 0.2, 0.2, 0), ("a", 0.1, 0.6, 0)]
+        self.assertEqual(imports_by_package(imports), [("a", 0.6), ("c", 0.2)])
@@ -12,3 +12,6 @@ python manage.py collectstatic --no-input
 
 # Apply any outstanding database migrations
 python manage.py migrate
+
+# Create the table of the cache shared by the web processes
+python manage.py createcachetable --database default
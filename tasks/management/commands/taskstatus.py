@@ -0,0 +1,37 @@
+"""
+Shows the background task queue.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.worker import prune as prune_tasks, queue_stats
+
+
+class Command(BaseCommand):
+    help = "Shows the number of background tasks by name and status."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--failed", action="store_true",
+                            help="Also list failed tasks with their last error.")
+        parser.add_argument("--prune", action="store_true",
+                            help="First delete finished tasks older than TASKS_RETENTION.")
+
+    def handle(self, *args, failed, prune, **options):
+        if prune:
+            self.stdout.write(f"Pruned {prune_tasks()} finished tasks.")
+        stats = queue_stats()
+        if not stats:
+            self.stdout.write("No tasks.")
+        for (name, status), count in stats.items():
+            self.stdout.write(f"{name:60} {status:8} {count:>8}")
+
+        oldest = Task.objects.filter(status=Task.Status.QUEUED, run_after__lte=timezone.now()).order_by(
+            "run_after").values_list("run_after", flat=True).first()
+        if oldest:
+            self.stdout.write(f"Oldest due task waiting for {timezone.now() - oldest}.")
+
+        if failed:
+            for t in Task.objects.filter(status=Task.Status.FAILED).order_by("-finished_at"):
+                self.stdout.write(f"\n#{t.pk} {t.name} {t.args} {t.kwargs}\n{t.last_error}")
@@ -0,0 +1,30 @@
+"""
+Runs queued background tasks until interrupted.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.worker import Worker, run_pending
+
+
+class Command(BaseCommand):
+    help = "Runs queued background tasks until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=settings.TASKS_CONCURRENCY,
+                            help="Number of tasks to run at once.")
+        parser.add_argument("--once", action="store_true",
+                            help="Run the tasks that are due, then exit.")
+
+    def handle(self, *args, concurrency, once, **options):
+        if once:
+            count = run_pending()
+            self.stdout.write(f"Ran {count} task{'s' if count != 1 else ''}.")
+            return
+
+        worker = Worker(concurrency)
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status__in', ['done', 'failed'])), fields=['finished_at'], name='task_finished_idx'),
+        ),
+    ]
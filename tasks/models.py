@@ -0,0 +1,47 @@
+"""
+Models for the tasks app.
+"""
+
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """A queued call of a registered task function, see tasks.registry."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # higher priorities run first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=Status, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    # a running task whose lock expired is assumed lost and queued again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # serves claiming the next due task
+            models.Index(fields=["-priority", "run_after"], name="task_queued_idx",
+                         condition=models.Q(status="queued")),
+            models.Index(fields=["locked_until"], name="task_running_idx",
+                         condition=models.Q(status="running")),
+            # serves pruning finished tasks
+            models.Index(fields=["finished_at"], name="task_finished_idx",
+                         condition=models.Q(status__in=["done", "failed"])),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
@@ -0,0 +1,45 @@
+"""
+Registration and queueing of task functions.
+
+Decorating a function with `@task` registers it under its dotted path and
+adds an `enqueue(*args, **kwargs)` method that stores a call in the task
+table. Arguments must be JSON serializable. Enqueueing inside a transaction
+only makes the task visible to workers once the transaction commits.
+"""
+
+import datetime
+import functools
+import importlib
+
+from django.utils import timezone
+
+from .models import Task
+
+tasks = {}
+
+
+def task(func=None, *, priority=0, max_attempts=3):
+    """Registers a task function, with its default priority and attempts."""
+    if func is None:
+        return functools.partial(task, priority=priority, max_attempts=max_attempts)
+
+    name = f"{func.__module__}.{func.__qualname__}"
+    tasks[name] = func
+
+    def enqueue(*args, priority=priority, delay=None, **kwargs):
+        run_after = timezone.now()
+        if delay:
+            run_after += datetime.timedelta(seconds=delay)
+        return Task.objects.create(name=name, args=list(args), kwargs=kwargs, priority=priority,
+                                   max_attempts=max_attempts, run_after=run_after)
+
+    func.task_name = name
+    func.enqueue = enqueue
+    return func
+
+
+def get_task_function(name):
+    """Returns a registered task function, importing its module if needed."""
+    if name not in tasks:
+        importlib.import_module(name.rpartition(".")[0])
+    return tasks[name]
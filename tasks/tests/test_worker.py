@@ -0,0 +1,152 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Task
+from ..registry import task
+from ..worker import claim, prune, requeue_expired, run_pending, run_task
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(priority=5)
+def urgent(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def flaky():
+    calls.append("flaky")
+    raise ValueError("try again")
+
+
+class TaskWorkerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        """
+        Enqueued tasks are stored and run with their arguments.
+        """
+        t = record.enqueue("hello")
+        self.assertEqual(t.name, "tasks.tests.test_worker.record")
+        self.assertEqual(t.status, Task.Status.QUEUED)
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ["hello"])
+        t.refresh_from_db()
+        self.assertEqual(t.status, Task.Status.DONE)
+        self.assertEqual(t.attempts, 1)
+
+    def test_priority_order(self):
+        """
+        Higher priority tasks run first, then the oldest.
+        """
+        record.enqueue("first")
+        record.enqueue("second")
+        urgent.enqueue("urgent")
+        record.enqueue("low", priority=-1)
+        run_pending()
+        self.assertEqual(calls, ["urgent", "first", "second", "low"])
+
+    def test_delay(self):
+        """
+        Delayed tasks only run once they are due.
+        """
+        record.enqueue("later", delay=60)
+        self.assertEqual(run_pending(), 0)
+
+    def test_retry_then_fail(self):
+        """
+        Failing tasks are retried after a backoff, then marked failed.
+        """
+        t = flaky.enqueue()
+        with self.assertLogs("tasks.worker", "ERROR"):
+            run_pending()
+        t.refresh_from_db()
+        self.assertEqual(t.status, Task.Status.QUEUED)
+        self.assertIn("ValueError: try again", t.last_error)
+        self.assertGreater(t.run_after, timezone.now())
+
+        Task.objects.filter(pk=t.pk).update(run_after=timezone.now())
+        with self.assertLogs("tasks.worker", "ERROR"):
+            run_pending()
+        t.refresh_from_db()
+        self.assertEqual(t.status, Task.Status.FAILED)
+        self.assertEqual(t.attempts, 2)
+        self.assertEqual(calls, ["flaky", "flaky"])
+
+    def test_claim_locks(self):
+        """
+        Claimed tasks are not handed out again until their lock expires.
+        """
+        t = record.enqueue("once")
+        self.assertEqual(claim(5, "worker-1"), [t])
+        self.assertEqual(claim(5, "worker-2"), [])
+
+        Task.objects.filter(pk=t.pk).update(
+            locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(requeue_expired(), 1)
+        self.assertEqual(claim(5, "worker-2"), [t])
+
+    def test_expired_lock_outcome_dropped(self):
+        """
+        A task whose lock expired while it ran does not overwrite the
+        outcome of its next run.
+        """
+        t = record.enqueue("slow")
+        [claimed] = claim(1, "worker-1")
+        Task.objects.filter(pk=t.pk).update(
+            locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        requeue_expired()
+        [reclaimed] = claim(1, "worker-2")
+
+        with self.assertLogs("tasks.worker", "WARNING"):
+            run_task(claimed)
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.worker), (Task.Status.RUNNING, "worker-2"))
+        run_task(reclaimed)
+        t.refresh_from_db()
+        self.assertEqual(t.status, Task.Status.DONE)
+
+    @override_settings(TASKS_RETENTION=60)
+    def test_prune(self):
+        """
+        Finished tasks are deleted once older than the retention period.
+        """
+        old = timezone.now() - datetime.timedelta(seconds=120)
+        Task.objects.create(name="done", status=Task.Status.DONE, finished_at=old)
+        Task.objects.create(name="failed", status=Task.Status.FAILED, finished_at=old)
+        recent = Task.objects.create(name="recent", status=Task.Status.DONE,
+                                     finished_at=timezone.now())
+        queued = record.enqueue("queued")
+        self.assertEqual(prune(), 2)
+        self.assertQuerySetEqual(Task.objects.order_by("pk"), [recent, queued])
+
+        Task.objects.filter(pk=recent.pk).update(finished_at=old)
+        out = StringIO()
+        call_command("taskstatus", "--prune", stdout=out)
+        self.assertIn("Pruned 1 finished tasks.", out.getvalue())
+        self.assertQuerySetEqual(Task.objects.all(), [queued])
+
+    def test_commands(self):
+        """
+        The worker command runs due tasks and the status command counts them.
+        """
+        record.enqueue("cli")
+        out = StringIO()
+        call_command("taskworker", "--once", stdout=out)
+        self.assertIn("Ran 1 task.", out.getvalue())
+        self.assertEqual(calls, ["cli"])
+
+        out = StringIO()
+        call_command("taskstatus", stdout=out)
+        self.assertIn("tasks.tests.test_worker.record", out.getvalue())
+        self.assertIn("done", out.getvalue())
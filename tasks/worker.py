@@ -0,0 +1,181 @@
+"""
+Running queued tasks.
+
+Workers claim due tasks with `SELECT ... FOR UPDATE SKIP LOCKED`, so any
+number of them (threads in the web processes or `manage.py taskworker`)
+can share the queue without handing out a task twice. A claimed task is
+locked for `LOCK_TIMEOUT` seconds; if its worker dies, the task is queued
+again once the lock expires, and its first worker can no longer record an
+outcome. Failed tasks are retried with exponential backoff until they run
+out of attempts. Workers prune finished tasks older than `TASKS_RETENTION`
+seconds every `PRUNE_INTERVAL`.
+"""
+
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Task
+from .registry import get_task_function
+
+LOCK_TIMEOUT = 60 * 10
+RETRY_DELAY = 30
+POLL_INTERVAL = 1.0
+PRUNE_INTERVAL = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def _default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def requeue_expired():
+    """Queues again running tasks whose lock expired."""
+    return Task.objects.filter(status=Task.Status.RUNNING, locked_until__lt=timezone.now()).update(
+        status=Task.Status.QUEUED, locked_until=None, worker="")
+
+
+def prune(retention=None):
+    """Deletes finished tasks older than `retention` seconds (`TASKS_RETENTION` by default)."""
+    if retention is None:
+        retention = settings.TASKS_RETENTION
+    deleted, _ = Task.objects.filter(
+        status__in=[Task.Status.DONE, Task.Status.FAILED],
+        finished_at__lt=timezone.now() - datetime.timedelta(seconds=retention)).delete()
+    return deleted
+
+
+def claim(limit=1, worker_id=None):
+    """Locks and returns up to `limit` due tasks, highest priority first."""
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = list(Task.objects.select_for_update(skip_locked=True).filter(
+            status=Task.Status.QUEUED, run_after__lte=now,
+        ).order_by("-priority", "run_after", "pk")[:limit])
+        Task.objects.filter(pk__in=[t.pk for t in claimed]).update(
+            status=Task.Status.RUNNING, attempts=F("attempts") + 1, worker=worker_id or "",
+            locked_until=now + datetime.timedelta(seconds=LOCK_TIMEOUT))
+    for t in claimed:
+        t.status = Task.Status.RUNNING
+        t.attempts += 1
+        t.worker = worker_id or ""
+    return claimed
+
+
+def run_task(t):
+    """
+    Runs a claimed task and records its outcome, unless the task was queued
+    again meanwhile because its lock expired.
+    """
+    try:
+        get_task_function(t.name)(*t.args, **t.kwargs)
+    except Exception:
+        logger.exception("Task %s (%s) failed", t.pk, t.name)
+        t.last_error = traceback.format_exc()
+        if t.attempts < t.max_attempts:
+            t.status = Task.Status.QUEUED
+            t.run_after = timezone.now() + datetime.timedelta(
+                seconds=RETRY_DELAY * 2 ** (t.attempts - 1))
+        else:
+            t.status = Task.Status.FAILED
+            t.finished_at = timezone.now()
+    else:
+        t.status = Task.Status.DONE
+        t.finished_at = timezone.now()
+    t.locked_until = None
+    updated = Task.objects.filter(
+        pk=t.pk, status=Task.Status.RUNNING, worker=t.worker, attempts=t.attempts,
+    ).update(status=t.status, run_after=t.run_after, locked_until=None,
+             last_error=t.last_error, finished_at=t.finished_at)
+    if not updated:
+        logger.warning("Task %s (%s) lost its lock before finishing", t.pk, t.name)
+    return t
+
+
+def run_pending(limit=None):
+    """
+    Runs due tasks one at a time in the current thread until none are left
+    (or `limit` ran). Returns the number of tasks run.
+    """
+    count = 0
+    while limit is None or count < limit:
+        claimed = claim(1, _default_worker_id())
+        if not claimed:
+            break
+        run_task(claimed[0])
+        count += 1
+    return count
+
+
+class Worker:
+    """Polls the queue and runs tasks on a thread pool."""
+
+    def __init__(self, concurrency=4, poll_interval=POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.slots = threading.Semaphore(concurrency)
+        self.worker_id = _default_worker_id()
+        self.last_prune = None
+
+    def _run(self, t):
+        try:
+            run_task(t)
+        finally:
+            close_old_connections()
+            self.slots.release()
+
+    def run(self):
+        """Runs tasks until `stop()` is called."""
+        logger.info("Task worker %s started with %d threads", self.worker_id, self.concurrency)
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="task") as pool:
+            while not self.stopping.is_set():
+                free = 0
+                while self.slots.acquire(blocking=False):
+                    free += 1
+                claimed = []
+                try:
+                    requeue_expired()
+                    if self.last_prune is None or (
+                            time.monotonic() - self.last_prune > PRUNE_INTERVAL):
+                        prune()
+                        self.last_prune = time.monotonic()
+                    claimed = claim(free, self.worker_id) if free else []
+                except DatabaseError:
+                    # keep polling through transient errors (lost connection, lock timeout)
+                    logger.exception("Task worker %s could not claim tasks", self.worker_id)
+                for _ in range(free - len(claimed)):
+                    self.slots.release()
+                for t in claimed:
+                    pool.submit(self._run, t)
+                close_old_connections()
+                if not claimed:
+                    self.stopping.wait(self.poll_interval)
+        logger.info("Task worker %s stopped", self.worker_id)
+
+    def stop(self):
+        self.stopping.set()
+
+    def start(self):
+        """Runs the worker in a daemon thread."""
+        thread = threading.Thread(target=self.run, name="task-worker", daemon=True)
+        thread.start()
+        return thread
+
+
+def queue_stats():
+    """Returns {(name, status): count} over the whole task table."""
+    rows = Task.objects.values_list("name", "status").annotate(
+        count=Count("pk")).order_by("name", "status")
+    return {(name, status): count for name, status, count in rows}
@@ -0,0 +1,40 @@
+"""
+Access control for trips shared with collaborators.
+
+A user's role on a trip is "owner", a `Collaborator.Role` ("editor" may
+change the trip and its destinations, "viewer" only see them) or None.
+Each role may do everything the roles below it may.
+
+`get_trip` fetches a trip together with the requesting user's role in one
+query (see `TripQuerySet.with_access`) and remembers it for the rest of
+the request, so the permission check, the view and its template share a
+single lookup however often they ask.
+"""
+
+from django.shortcuts import get_object_or_404
+
+from .models import Collaborator, Trip
+
+OWNER = "owner"
+EDITOR = Collaborator.Role.EDITOR
+VIEWER = Collaborator.Role.VIEWER
+
+RANKS = {None: 0, VIEWER: 1, EDITOR: 2, OWNER: 3}
+
+
+def has_role(trip, role):
+    """Whether the user a trip was fetched for has at least `role` on it."""
+    return RANKS[trip.access_role] >= RANKS[role]
+
+
+def get_trip(request, slug):
+    """
+    The trip at `slug` annotated with the request's user's `access_role`,
+    fetched once per request. Raises Http404 if there is no such trip.
+    """
+    if not hasattr(request, "_trips"):
+        request._trips = {}
+    if slug not in request._trips:
+        request._trips[slug] = get_object_or_404(
+            Trip.objects.with_access(request.user).select_related("owner"), slug=slug)
+    return request._trips[slug]
@@ -0,0 +1,69 @@
+"""
+Circuit breaker for calls to external services.
+
+After `failure_threshold` consecutive failures (errors, or calls slower
+than `slow_seconds`) the circuit opens and callers fail fast for
+`reset_seconds`. Then a single caller is let through to probe the service:
+its success closes the circuit, its failure opens it again.
+
+The breaker's state lives in the default cache. In production that is the
+database cache shared by all web processes, so they open and close the
+circuit together; elsewhere each process has a breaker of its own. A
+cache may drop entries when it fills up, which at worst closes an open
+circuit early, until the next failures open it again.
+"""
+
+import time
+
+from django.core.cache import cache
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, slow_seconds=2.0, reset_seconds=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_seconds = slow_seconds
+        self.reset_seconds = reset_seconds
+
+    def _key(self, part):
+        return f"breaker:{self.name}:{part}"
+
+    @property
+    def is_open(self):
+        """Whether calls are currently being refused (ignoring probes)."""
+        return time.time() < cache.get(self._key("open-until"), 0)
+
+    def allow(self):
+        """Whether a call may go ahead now."""
+        open_until = cache.get(self._key("open-until"))
+        if open_until is None:
+            return True
+        if time.time() < open_until:
+            return False
+        # half open: only the first caller probes
+        return cache.add(self._key("probe"), True, self.reset_seconds)
+
+    def record(self, seconds):
+        """Records a call that completed in `seconds`."""
+        if seconds > self.slow_seconds:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_success(self):
+        cache.delete_many([self._key("failures"), self._key("open-until"), self._key("probe")])
+
+    def record_failure(self):
+        key = self._key("failures")
+        cache.add(key, 0, None)
+        try:
+            failures = cache.incr(key)
+        except ValueError:  # evicted in between
+            failures = 1
+            cache.set(key, failures, None)
+        if failures >= self.failure_threshold or cache.get(self._key("open-until")):
+            cache.set(self._key("open-until"), time.time() + self.reset_seconds, None)
+            cache.delete(self._key("probe"))
+
+
+mapbox = CircuitBreaker("mapbox")
@@ -0,0 +1,119 @@
+"""
+Hierarchical grid clustering of map markers.
+
+Points are projected to Web Mercator and grouped by a grid whose cells are
+`RADIUS` pixels wide at each zoom level. Each level is built from the level
+below it, so a cluster at zoom z is exactly the union of clusters at z + 1.
+A viewport of a few screens therefore never holds more than a few hundred
+clusters, however many points there are.
+"""
+
+import math
+
+from django.core.cache import cache
+
+from .geo import point_feature
+
+MAX_ZOOM = 16
+RADIUS = 80
+EXTENT = 512
+CACHE_TIMEOUT = 60 * 60 * 24
+MAX_LATITUDE = 85.05112878
+
+
+def _project(longitude, latitude):
+    latitude = max(min(latitude, MAX_LATITUDE), -MAX_LATITUDE)
+    x = longitude / 360 + 0.5
+    sin = math.sin(math.radians(latitude))
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return x, y
+
+
+def _unproject(x, y):
+    longitude = (x - 0.5) * 360
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return longitude, latitude
+
+
+class ClusterIndex:
+    """
+    Clusters of points for every zoom level from 0 to `MAX_ZOOM`.
+
+    Each cluster is an (x, y, count, properties) tuple in projected
+    coordinates; properties are only kept for single points.
+    """
+
+    def __init__(self, points):
+        """`points` is an iterable of (longitude, latitude, properties)."""
+        level = [(*_project(lon, lat), 1, props) for lon, lat, props in points]
+        self.bbox = None
+        if level:
+            self.bbox = [
+                *_unproject(min(c[0] for c in level), max(c[1] for c in level)),
+                *_unproject(max(c[0] for c in level), min(c[1] for c in level)),
+            ]
+
+        self.levels = [None] * (MAX_ZOOM + 2)
+        self.levels[MAX_ZOOM + 1] = level
+        for zoom in range(MAX_ZOOM, -1, -1):
+            level = self._cluster(level, RADIUS / (EXTENT * 2 ** zoom))
+            self.levels[zoom] = level
+
+    @staticmethod
+    def _cluster(level, size):
+        cells = {}
+        for cluster in level:
+            cells.setdefault((int(cluster[0] / size), int(cluster[1] / size)), []).append(cluster)
+
+        clustered = []
+        for members in cells.values():
+            if len(members) == 1:
+                clustered.append(members[0])
+                continue
+            count = sum(m[2] for m in members)
+            x = sum(m[0] * m[2] for m in members) / count
+            y = sum(m[1] * m[2] for m in members) / count
+            clustered.append((x, y, count, None))
+        return clustered
+
+    def get_clusters(self, zoom, bbox=None):
+        """Returns GeoJSON features for the clusters at a zoom level."""
+        level = self.levels[max(0, min(zoom, MAX_ZOOM + 1))]
+        if bbox:
+            boxes = []
+            for box in bbox.split():
+                x0, y1 = _project(box.west, box.south)
+                x1, y0 = _project(box.east, box.north)
+                boxes.append((x0, y0, x1, y1))
+            level = [c for c in level
+                     if any(x0 <= c[0] <= x1 and y0 <= c[1] <= y1 for x0, y0, x1, y1 in boxes)]
+
+        features = []
+        for x, y, count, props in level:
+            lon, lat = _unproject(x, y)
+            if count == 1:
+                features.append(point_feature(lon, lat, **props))
+            else:
+                features.append(point_feature(lon, lat, cluster=True, point_count=count))
+        return features
+
+
+def get_trip_cluster_index(user):
+    """
+    Returns the cluster index of a user's trip markers.
+
+    The index is built once per data version and cached, keyed on the
+    version of the database it is built from.
+    """
+    version = user.read_data_version()
+    key = f"trips:trip-clusters:{user.pk}:{version}"
+    index = cache.get(key) if version is not None else None
+    if index is None:
+        index = ClusterIndex(
+            (trip.avg_longitude, trip.avg_latitude,
+             {"title": trip.title, "link": trip.get_absolute_url()})
+            for trip in user.trip_set.with_centroid().only("slug", "title")
+        )
+        if version is not None:
+            cache.set(key, index, CACHE_TIMEOUT)
+    return index
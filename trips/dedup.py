@@ -0,0 +1,131 @@
+"""
+Duplicate destination detection.
+
+Destinations are hashed into cubes of `DISTANCE_M` on the unit sphere (so
+neither the antimeridian nor the poles need special handling), and only
+destinations in neighboring cubes are compared. Only pairs not already in
+the same group are measured, so many copies of one place cost few
+distance computations, and copies at the very same point none.
+"""
+
+import difflib
+import itertools
+import math
+import re
+import unicodedata
+
+import numpy as np
+from django.db import transaction
+
+from .geo import EARTH_RADIUS_KM
+from .models import Destination
+from .nearby import to_unit_vectors
+
+DISTANCE_M = 150
+NAME_SIMILARITY = 0.8
+# fields copied together from a duplicate when the kept destination has none
+MERGED_FIELDS = (("latitude", "longitude"), ("start_time", "end_time"))
+
+
+def normalize_name(name):
+    """Lowercases a name and strips accents, punctuation and extra spaces."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", name.lower()).split())
+
+
+def similar_names(a, b):
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= NAME_SIMILARITY
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+def find_duplicate_groups(rows, distance_m=DISTANCE_M):
+    """
+    Groups likely duplicates among (pk, name, latitude, longitude) rows.
+
+    Returns lists of pks (each with at least two members), sorted.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    pks = [row[0] for row in rows]
+    names = [normalize_name(row[1]) for row in rows]
+    km = distance_m / 1000
+    points = to_unit_vectors([row[2] for row in rows], [row[3] for row in rows]) * EARTH_RADIUS_KM
+    cells = np.floor(points / km).astype(np.int64)
+    points = points.tolist()
+
+    groups = _DisjointSet()
+    # cube -> normalized name -> indexes of destinations, one per point
+    buckets = {}
+    first_at = {}
+    for i, cell in enumerate(map(tuple, cells.tolist())):
+        first = first_at.setdefault((names[i], tuple(points[i])), i)
+        if first != i:
+            groups.union(pks[first], pks[i])
+            continue
+        buckets.setdefault(cell, {}).setdefault(names[i], []).append(i)
+
+    offsets = list(itertools.product((-1, 0, 1), repeat=3))
+    for (cx, cy, cz), by_name in buckets.items():
+        for name, members in by_name.items():
+            for neighbor in offsets:
+                other = buckets.get((cx + neighbor[0], cy + neighbor[1], cz + neighbor[2]))
+                if not other:
+                    continue
+                for other_name, others in other.items():
+                    if not similar_names(name, other_name):
+                        continue
+                    for i in members:
+                        for j in others:
+                            if (i < j and groups.find(pks[i]) != groups.find(pks[j])
+                                    and math.dist(points[i], points[j]) <= km):
+                                groups.union(pks[i], pks[j])
+
+    clusters = {}
+    for pk in groups.parent:
+        clusters.setdefault(groups.find(pk), []).append(pk)
+    return sorted(sorted(members) for members in clusters.values() if len(members) > 1)
+
+
+def user_duplicate_groups(user):
+    """Returns a user's likely duplicate destinations as lists of objects."""
+    rows = Destination.objects.filter(trip__owner=user).exclude(latitude=None).exclude(
+        longitude=None).values_list("pk", "name", "latitude", "longitude").iterator(chunk_size=5000)
+    groups = find_duplicate_groups(rows)
+    dests = Destination.objects.select_related("trip").in_bulk(
+        [pk for group in groups for pk in group])
+    return [[dests[pk] for pk in group] for group in groups]
+
+
+def merge_destinations(keep, duplicates):
+    """
+    Merges duplicates into the kept destination.
+
+    Empty fields of `keep` are filled from the duplicates (in the given
+    order), then the duplicates are deleted.
+    """
+    for fields in MERGED_FIELDS:
+        if all(getattr(keep, field) is None for field in fields):
+            for dest in duplicates:
+                if any(getattr(dest, field) is not None for field in fields):
+                    for field in fields:
+                        setattr(keep, field, getattr(dest, field))
+                    break
+    with transaction.atomic():
+        keep.save()
+        Destination.objects.filter(pk__in=[d.pk for d in duplicates]).exclude(pk=keep.pk).delete()
@@ -0,0 +1,142 @@
+"""
+Set-based deletion of large object graphs.
+
+Django's deletion collector loads every related object into memory (and,
+since trips and destinations have delete signals, sends a signal for each
+one). `purge` instead walks the model relations and deletes each level with
+batched DELETE statements by primary key, children before parents. Only a
+batch of primary keys is held at a time, so memory use does not grow with
+the size of the graph. Protected references are checked before anything
+is deleted, and the whole purge runs in one transaction, so one that is
+interrupted leaves no half deleted trip or account behind.
+
+Delete signals are not sent; callers take care of their side effects, and
+of the files cached for what they delete once the transaction commits.
+"""
+
+import logging
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import connections, models, transaction
+from django.db.models.deletion import ProtectedError, RestrictedError
+
+from . import thumbnails, tiles
+from .models import Trip
+from .sharing import purge_shared_pages
+
+BATCH_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
+
+def log_progress(model, deleted):
+    logger.info("Deleted %d %s", deleted, model._meta.verbose_name_plural)
+
+
+def _related(queryset):
+    """Yields (on_delete, related queryset, field name) for rows pointing at `queryset`."""
+    for rel in queryset.model._meta.related_objects:
+        if rel.many_to_many:
+            if rel.through._meta.auto_created:
+                yield models.CASCADE, rel.through._base_manager.filter(
+                    **{f"{rel.field.m2m_reverse_field_name()}__in": queryset}), None
+        else:
+            yield rel.on_delete, rel.related_model._base_manager.filter(
+                **{f"{rel.field.name}__in": queryset}), rel.field.name
+    for field in queryset.model._meta.many_to_many:
+        if field.remote_field.through._meta.auto_created:
+            yield models.CASCADE, field.remote_field.through._base_manager.filter(
+                **{f"{field.m2m_field_name()}__in": queryset}), None
+
+
+def _delete_in_batches(queryset, batch_size, progress):
+    model = queryset.model
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    deleted = 0
+    while batch := list(pks[:batch_size]):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN "
+                           f"({', '.join(['%s'] * len(batch))})", batch)
+            deleted += cursor.rowcount
+        progress(model, deleted)
+    return deleted
+
+
+def _check(queryset):
+    """Raises if rows pointing at `queryset` would stop it being purged."""
+    for on_delete, related, field_name in _related(queryset):
+        if on_delete is models.CASCADE:
+            _check(related)
+        elif on_delete in (models.PROTECT, models.RESTRICT) and related.exists():
+            error = ProtectedError if on_delete is models.PROTECT else RestrictedError
+            raise error(f"Cannot delete some {queryset.model._meta.verbose_name_plural} "
+                        f"referenced through {related.model.__name__}.{field_name}",
+                        set(related[:10]))
+        elif on_delete not in (models.SET_NULL, models.DO_NOTHING) and related.exists():
+            raise NotImplementedError(f"{on_delete.__name__} is not supported")
+
+
+def _purge(queryset, batch_size, progress, counts):
+    for on_delete, related, field_name in _related(queryset):
+        if on_delete is models.CASCADE:
+            _purge(related, batch_size, progress, counts)
+        elif on_delete is models.SET_NULL:
+            related.update(**{field_name: None})
+    if deleted := _delete_in_batches(queryset, batch_size, progress):
+        counts[queryset.model._meta.label] += deleted
+
+
+def purge(queryset, batch_size=BATCH_SIZE, progress=log_progress):
+    """
+    Deletes the rows of `queryset` and everything that cascades from them.
+
+    `progress(model, deleted)` is called after each batch with the number
+    of rows of that model deleted so far. Returns a Counter of deleted rows
+    by model label.
+    """
+    _check(queryset)
+    counts = Counter()
+    with transaction.atomic(using=queryset.db):
+        _purge(queryset, batch_size, progress, counts)
+    return counts
+
+
+def _clear_cached_files(trip_ids, user_ids, using):
+    transaction.on_commit(lambda: (thumbnails.clear_thumbnails(trip_ids),
+                                   tiles.clear_user_tiles(user_ids)), using=using)
+
+
+def delete_trips(trips, batch_size=BATCH_SIZE, progress=log_progress):
+    """
+    Purges trips with their destinations, bumps their owners' data versions
+    and drops the pages, thumbnails and tiles cached for them.
+    """
+    trip_ids = list(trips.values_list("pk", flat=True))
+    owner_ids = list(trips.order_by().values_list("owner_id", flat=True).distinct())
+    shared = list(trips.filter(public=True).values_list("slug", flat=True))
+    with transaction.atomic(using=trips.db):
+        counts = purge(trips, batch_size, progress)
+        get_user_model().bump_data_versions(owner_ids)
+        purge_shared_pages(shared, using=trips.db)
+        _clear_cached_files(trip_ids, owner_ids, trips.db)
+    return counts
+
+
+def delete_account(user, batch_size=BATCH_SIZE, progress=log_progress):
+    """
+    Purges a user with all of their trips and destinations, and drops the
+    pages, thumbnails and tiles cached for them.
+    """
+    users = get_user_model()._base_manager.filter(pk=user.pk)
+    trips = Trip.objects.filter(owner=user)
+    trip_ids = list(trips.values_list("pk", flat=True))
+    shared = list(trips.filter(public=True).values_list("slug", flat=True))
+    with transaction.atomic(using=users.db):
+        counts = purge(users, batch_size, progress)
+        purge_shared_pages(shared, using=users.db)
+        _clear_cached_files(trip_ids, [user.pk], users.db)
+    return counts
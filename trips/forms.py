@@ -1,8 +1,12 @@
 # accounts/forms.py
-from django.forms import (ModelForm, ModelChoiceField, DateInput,
-                          DateTimeInput, HiddenInput, CharField, TextInput)
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.forms import (Form, ModelForm, ModelChoiceField,
+                          ModelMultipleChoiceField, DateInput, DateTimeInput,
+                          HiddenInput, CharField, ChoiceField, TextInput, Widget)
 from django.urls import reverse_lazy
-from .models import Trip, Destination
+from .models import Collaborator, Trip, Destination
+from .schedule import schedule_conflicts
 
 
 class UIDateInput(DateInput):
@@ -13,10 +17,34 @@ class UIDateTimeInput(DateTimeInput):
     input_type = "datetime-local"
 
 
+class TripSearchInput(Widget):
+    """
+    Typeahead trip picker.
+
+    Renders a search box backed by the trip search endpoint instead of an
+    <option> per trip. Only the currently selected trip (if any) is fetched.
+    """
+    template_name = "trips/trip_search_widget.html"
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["selected"] = self.get_selected(value)
+        return context
+
+    def get_selected(self, value):
+        choices = getattr(self, "choices", None)
+        if not value or choices is None:
+            return None
+        try:
+            return choices.queryset.only("pk", "title").filter(pk=value).first()
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+
 class TripForm(ModelForm):
     class Meta:
         model = Trip
-        fields = ("title", "start_date", "end_date", "scheduled", "notes")
+        fields = ("title", "start_date", "end_date", "scheduled", "notes", "public")
         widgets = {
             "start_date": UIDateInput(),
             "end_date": UIDateInput(),
@@ -25,14 +53,18 @@ class TripForm(ModelForm):
 
 class DestinationForm(ModelForm):
     trip = ModelChoiceField(queryset=Trip.objects, required=False,
-                            empty_label="--- (Create a new trip for this destination) ---")
+                            widget=TripSearchInput(attrs={
+                                "placeholder": "(Search your trips, or leave blank to create a new trip)",
+                            }))
 
     location = CharField(required=False,
                          template_name="trips/location_search_field_snippet.html",
                          widget=TextInput(attrs={
                              "placeholder": "(Search for a new location)",
                              "hx-post": reverse_lazy("trips:search-loc"),
-                             "hx-params": "location",
+                             "hx-params": "location,sent",
+                             "hx-vals": "js:{sent: Date.now()}",
+                             "hx-sync": "this:replace",
                              "hx-target": "next #id_location_results",
                              "hx-swap": "outerHTML",
                              "hx-trigger": "input delay:250ms",
@@ -56,16 +88,70 @@ class DestinationForm(ModelForm):
             raise Exception(
                 "DestinationForm requires either a user or a specific trip")
         super().__init__(*args, **kwargs)
+        self.owner = only_trip.owner if only_trip else self.user
+        self.schedule_conflicts = []
 
         if only_trip:
             self.fields['trip'].queryset = Trip.objects.filter(pk=only_trip.pk)
             self.fields['trip'].initial = only_trip
             self.fields['trip'].disabled = True
         else:
-            self.fields['trip'].queryset = Trip.objects.filter(owner=self.user)
+            self.fields['trip'].queryset = Trip.objects.editable_by(self.user)
 
     def clean_trip(self):
         if self.cleaned_data['trip']:
             return self.cleaned_data['trip']
         if self.user and self.data.get('name'):
             return Trip.objects.create(owner=self.user, title=self.data.get('name'))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # the stop joins the schedule of the owner of the trip it is saved to
+        trip = cleaned_data.get('trip')
+        if trip:
+            self.owner = trip.owner
+        # overlapping stops are allowed, but reported back to the user
+        self.schedule_conflicts = schedule_conflicts(
+            self.owner, cleaned_data.get('start_time'), cleaned_data.get('end_time'),
+            exclude=self.instance.pk)
+        return cleaned_data
+
+
+class CollaboratorForm(Form):
+    username = CharField(max_length=150)
+    role = ChoiceField(choices=Collaborator.Role)
+
+    def __init__(self, *args, **kwargs):
+        self.trip = kwargs.pop("trip")
+        super().__init__(*args, **kwargs)
+
+    def clean_username(self):
+        try:
+            user = get_user_model().objects.get(username=self.cleaned_data['username'])
+        except get_user_model().DoesNotExist:
+            raise ValidationError("No user with this username.")
+        if user.pk == self.trip.owner_id:
+            raise ValidationError("You already own this trip.")
+        return user
+
+
+class MergeDestinationsForm(Form):
+    keep = ModelChoiceField(queryset=Destination.objects.none())
+    merge = ModelMultipleChoiceField(queryset=Destination.objects.none())
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop("user")
+        super().__init__(*args, **kwargs)
+        dests = Destination.objects.filter(trip__owner=user)
+        self.fields['keep'].queryset = dests
+        self.fields['merge'].queryset = dests
+
+    def clean(self):
+        cleaned_data = super().clean()
+        keep = cleaned_data.get('keep')
+        merge = cleaned_data.get('merge')
+        if keep and merge is not None:
+            cleaned_data['merge'] = [dest for dest in merge if dest.pk != keep.pk]
+            if not cleaned_data['merge']:
+                raise ValidationError("Choose at least one other destination to merge.")
+        return cleaned_data
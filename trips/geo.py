@@ -0,0 +1,214 @@
+"""
+Geographic helpers for the trips app.
+"""
+
+import math
+from django.db.models import F, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Destinations are indexed by the quadtree cell that contains them at this
+# level. Cell ids are Morton (Z-order) codes, so every cell at a coarser
+# level covers one contiguous range of ids and a bbox query becomes a handful
+# of indexed range scans.
+CELL_LEVEL = 20
+MAX_COVER_CELLS = 16
+
+
+def wrap_longitude(longitude):
+    """Returns the equivalent longitude between -180 and 180."""
+    if -180 <= longitude <= 180:
+        return longitude
+    return (longitude + 180) % 360 - 180
+
+
+class BBox:
+    """A west, south, east, north bounding box in degrees."""
+
+    def __init__(self, west, south, east, north):
+        if not (-90 <= south <= north <= 90):
+            raise ValueError("Invalid bbox latitudes")
+        if not (-180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError("Invalid bbox longitudes")
+        self.west = west
+        self.south = south
+        self.east = east
+        self.north = north
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Parses a `west,south,east,north` string (as used by mapbox-gl).
+
+        mapbox-gl reports longitudes beyond ±180 when the view crosses the
+        antimeridian or shows the whole world, so they are wrapped around.
+        """
+        try:
+            parts = [float(part) for part in value.split(",")]
+        except (AttributeError, ValueError):
+            raise ValueError("Invalid bbox")
+        if len(parts) != 4 or not all(map(math.isfinite, parts)):
+            raise ValueError("Invalid bbox")
+        west, south, east, north = parts
+        if east - west >= 360:
+            west, east = -180, 180
+        else:
+            west, east = wrap_longitude(west), wrap_longitude(east)
+        return cls(west, south, east, north)
+
+    @classmethod
+    def around(cls, latitude, longitude, km):
+        """Returns the smallest box containing the circle of radius `km`."""
+        angle = km / EARTH_RADIUS_KM
+        dlat = math.degrees(angle)
+        south, north = latitude - dlat, latitude + dlat
+        if south <= -90 or north >= 90:
+            # the circle covers a pole, so it spans every longitude
+            return cls(-180, max(south, -90), 180, min(north, 90))
+
+        dlon = math.degrees(
+            math.asin(min(1, math.sin(angle) / math.cos(math.radians(latitude)))))
+        if dlon >= 180:
+            return cls(-180, south, 180, north)
+        west = (longitude - dlon + 540) % 360 - 180
+        east = (longitude + dlon + 540) % 360 - 180
+        return cls(west, south, east, north)
+
+    @property
+    def crosses_antimeridian(self):
+        return self.west > self.east
+
+    def split(self):
+        """Returns equivalent boxes that do not cross the antimeridian."""
+        if self.crosses_antimeridian:
+            return [BBox(self.west, self.south, 180, self.north),
+                    BBox(-180, self.south, self.east, self.north)]
+        return [self]
+
+    def as_q(self, latitude="latitude", longitude="longitude"):
+        """Returns a filter matching points inside the box."""
+        q = Q(**{f"{latitude}__gte": self.south, f"{latitude}__lte": self.north})
+        if self.crosses_antimeridian:
+            return q & (Q(**{f"{longitude}__gte": self.west}) |
+                        Q(**{f"{longitude}__lte": self.east}))
+        return q & Q(**{f"{longitude}__gte": self.west, f"{longitude}__lte": self.east})
+
+
+def point_feature(longitude, latitude, **properties):
+    """Builds a compact GeoJSON point feature."""
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [round(longitude, 6), round(latitude, 6)],
+        },
+        "properties": properties,
+    }
+
+
+def feature_collection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _cell_xy(latitude, longitude, level):
+    size = 1 << level
+    x = int((longitude + 180) / 360 * size)
+    y = int((latitude + 90) / 180 * size)
+    return min(max(x, 0), size - 1), min(max(y, 0), size - 1)
+
+
+def _interleave(x, y):
+    code = 0
+    for bit in range(CELL_LEVEL):
+        code |= ((x >> bit) & 1) << (2 * bit)
+        code |= ((y >> bit) & 1) << (2 * bit + 1)
+    return code
+
+
+def cell_id(latitude, longitude):
+    """Returns the quadtree cell id of a point at `CELL_LEVEL`."""
+    return _interleave(*_cell_xy(latitude, longitude, CELL_LEVEL))
+
+
+def cell_ranges(bbox, max_cells=MAX_COVER_CELLS):
+    """
+    Returns merged (low, high) cell id ranges covering the box.
+
+    Each non-wrapping part of the box is covered with at most `max_cells`
+    cells from the finest level that allows it.
+    """
+    ranges = []
+    for box in bbox.split():
+        level = CELL_LEVEL
+        while True:
+            x0, y0 = _cell_xy(box.south, box.west, level)
+            x1, y1 = _cell_xy(box.north, box.east, level)
+            if level == 0 or (x1 - x0 + 1) * (y1 - y0 + 1) <= max_cells:
+                break
+            level -= 1
+
+        shift = 2 * (CELL_LEVEL - level)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                code = _interleave(x, y)
+                ranges.append((code << shift, ((code + 1) << shift) - 1))
+
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in km."""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) *
+         math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+
+def haversine_expression(latitude, longitude, lat_field="latitude", lon_field="longitude"):
+    """Database expression for the distance in km from a point to a row."""
+    dlat = Radians(F(lat_field) - Value(latitude))
+    dlon = Radians(F(lon_field) - Value(longitude))
+    a = (Power(Sin(dlat / 2), 2) + Cos(Radians(Value(latitude))) *
+         Cos(Radians(F(lat_field))) * Power(Sin(dlon / 2), 2))
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(a), Value(1.0)))
+
+
+def mercator_xy(latitude, longitude):
+    """Projects a point to Web Mercator, with the world spanning 0 to 1."""
+    sin = math.sin(math.radians(min(max(latitude, -85.0511), 85.0511)))
+    return (longitude + 180) / 360, 0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+
+
+def points_svg(points, width, height, padding=12):
+    """
+    Draws (latitude, longitude) points as an SVG image: the route through
+    them in order, fitted to the image and projected with Web Mercator.
+    """
+    xys = [mercator_xy(lat, lon) for lat, lon in points] or [(0.5, 0.5)]
+    west, east = min(x for x, _ in xys), max(x for x, _ in xys)
+    north, south = min(y for _, y in xys), max(y for _, y in xys)
+    # single points and close clusters are shown at about city zoom
+    scale = min((width - 2 * padding) / max(east - west, 1e-4),
+                (height - 2 * padding) / max(south - north, 1e-4))
+    pixels = [(width / 2 + (x - (west + east) / 2) * scale,
+               height / 2 + (y - (north + south) / 2) * scale) for x, y in xys]
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}">',
+             f'<rect width="{width}" height="{height}" fill="#e8f4f4"/>']
+    if len(points) > 1:
+        coords = " ".join(f"{x:.1f},{y:.1f}" for x, y in pixels)
+        parts.append(f'<polyline points="{coords}" fill="none" stroke="#01baba" '
+                     'stroke-width="2" stroke-linejoin="round"/>')
+    if points:
+        parts += [f'<circle cx="{x:.1f}" cy="{y:.1f}" r="4" fill="#017a7a"/>' for x, y in pixels]
+    parts.append("</svg>")
+    return "".join(parts).encode()
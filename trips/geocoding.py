@@ -0,0 +1,198 @@
+"""
+Batch geocoding of destinations without coordinates.
+
+Destinations are looked up by name, normalized (trimmed and lowercased) in
+the database so identical names of all users share one lookup; a partial
+index on the normalized names of ungeocoded destinations serves matching
+them. Every
+lookup, found or not, is stored as a `GeocodedName`, which both caches the
+result and checkpoints the run: names already looked up are skipped when a
+run is resumed. Lookups go through the geocoder named by the
+`GEOCODER_BACKEND` setting, on a bounded thread pool and rate limited.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.module_loading import import_string
+
+from config.startup import lazy_import
+
+from .breaker import mapbox
+from .geo import cell_id
+from .models import Destination, GeocodedName, normalized_name
+from .sharing import purge_shared_pages
+
+requests = lazy_import("requests")
+
+BATCH_SIZE = 100
+CONCURRENCY = 4
+RATE = 10.0
+
+logger = logging.getLogger(__name__)
+
+
+class GeocoderError(Exception):
+    """A lookup failed and should be tried again later."""
+
+
+class MapboxGeocoder:
+    """Looks up places with the Mapbox Search Box API."""
+    url = "https://api.mapbox.com/search/searchbox/v1/forward"
+
+    def __init__(self, timeout=10):
+        self.session = requests.Session()
+        self.timeout = timeout
+
+    def geocode(self, query):
+        """Returns the (latitude, longitude) of the best match, or None."""
+        if not mapbox.allow():
+            raise GeocoderError("Mapbox circuit is open")
+        params = {"q": query, "access_token": os.environ["MAPBOX_ACCESS_TOKEN"], "limit": 1}
+        started = time.monotonic()
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            mapbox.record_failure()
+            raise GeocoderError(str(e)) from e
+        if not response.ok:
+            if response.status_code >= 500 or response.status_code == 429:
+                mapbox.record_failure()
+            raise GeocoderError(f"{response.status_code} {response.reason}")
+        mapbox.record(time.monotonic() - started)
+        for feature in response.json()["features"]:
+            coords = feature["properties"]["coordinates"]
+            return coords["latitude"], coords["longitude"]
+        return None
+
+
+def get_geocoder():
+    return import_string(settings.GEOCODER_BACKEND)()
+
+
+class RateLimiter:
+    """Spaces calls from any number of threads at least 1 / `rate` seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def pending_names(retry_misses=False):
+    """Normalized names of ungeocoded destinations that still need a lookup."""
+    looked_up = GeocodedName.objects.filter(query=OuterRef("key"))
+    if retry_misses:
+        looked_up = looked_up.exclude(latitude=None)
+    return Destination.objects.filter(latitude=None).annotate(key=normalized_name()).exclude(
+        key="").filter(~Exists(looked_up)).values_list("key", flat=True).distinct().order_by("key")
+
+
+def apply_results(results):
+    """
+    Fills in coordinates of ungeocoded destinations from
+    {normalized name: (latitude, longitude)}, bumps their owners' data
+    versions and purges the pages of shared trips among them. Returns the
+    number of destinations updated.
+    """
+    updated = 0
+    with transaction.atomic():
+        dests = Destination.objects.filter(latitude=None).annotate(key=normalized_name())
+        owner_ids = set(dests.filter(key__in=list(results)).values_list(
+            "trip__owner_id", flat=True))
+        shared = set(dests.filter(key__in=list(results), trip__public=True).values_list(
+            "trip__slug", flat=True))
+        for key, (latitude, longitude) in results.items():
+            updated += dests.filter(key=key).update(
+                latitude=latitude, longitude=longitude, cell=cell_id(latitude, longitude))
+        get_user_model().bump_data_versions(owner_ids)
+        purge_shared_pages(shared)
+    return updated
+
+
+def apply_cached(batch_size=BATCH_SIZE):
+    """Fills in destinations whose name was already found by an earlier run."""
+    missing = Destination.objects.filter(latitude=None).annotate(
+        key=normalized_name()).values("key")
+    cached = GeocodedName.objects.exclude(latitude=None).filter(query__in=missing).order_by("query")
+    updated = 0
+    last = ""
+    while batch := list(cached.filter(query__gt=last)[:batch_size]):
+        updated += apply_results({g.query: (g.latitude, g.longitude) for g in batch})
+        last = batch[-1].query
+    return updated
+
+
+def geocode_missing(geocoder=None, batch_size=BATCH_SIZE, concurrency=CONCURRENCY, rate=RATE,
+                    limit=None, retry_misses=False, progress=None):
+    """
+    Geocodes destinations missing coordinates, a batch of names at a time.
+
+    Names found by earlier runs are applied without a lookup. The rest are
+    looked up concurrently a batch at a time, and each batch's results are
+    saved in one transaction, so an interrupted run resumes after the last
+    saved batch. Names whose lookup failed are left for the next run.
+    Returns a dict of counts: names `looked_up`, `found` and `failed`, and
+    `destinations` updated.
+    """
+    geocoder = geocoder or get_geocoder()
+    limiter = RateLimiter(rate)
+    counts = {"looked_up": 0, "found": 0, "failed": 0, "destinations": apply_cached(batch_size)}
+
+    def lookup(key):
+        limiter.wait()
+        try:
+            return key, geocoder.geocode(key)
+        except GeocoderError as e:
+            logger.warning("Geocoding %r failed: %s", key, e)
+            return key, e
+        except Exception as e:
+            # such as an unexpected response; one name should not stop the run
+            logger.exception("Geocoding %r failed", key)
+            return key, e
+
+    names = pending_names(retry_misses)
+    last = None
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="geocode") as pool:
+        while limit is None or counts["looked_up"] + counts["failed"] < limit:
+            size = batch_size
+            if limit is not None:
+                size = min(size, limit - counts["looked_up"] - counts["failed"])
+            batch = list((names.filter(key__gt=last) if last is not None else names)[:size])
+            if not batch:
+                break
+            last = batch[-1]
+
+            results = list(pool.map(lookup, batch))
+            found = {}
+            with transaction.atomic():
+                for key, result in results:
+                    if isinstance(result, Exception):
+                        counts["failed"] += 1
+                        continue
+                    counts["looked_up"] += 1
+                    latitude, longitude = result or (None, None)
+                    GeocodedName.objects.update_or_create(
+                        query=key, defaults={"latitude": latitude, "longitude": longitude})
+                    if result:
+                        found[key] = result
+                counts["found"] += len(found)
+                counts["destinations"] += apply_results(found)
+            if progress:
+                progress(counts)
+    return counts
@@ -0,0 +1,90 @@
+"""
+Cached per-user indexes of destinations, patched by small overlays.
+
+Indexes over all of a user's destinations (nearest neighbors, schedule)
+are costly to build and large to pickle. Each is cached once, with the user
+data version it reflects, and changes since then are recorded under a
+second, small key: an overlay of the current values of added or changed
+destinations (`changed`) and the primary keys whose entries in the index
+are out of date (`removed`). Saving a destination only rewrites the
+overlay; lookups combine both.
+
+The overlay follows the user's data version one change at a time. If it
+misses a change (such as a bulk update, which bumps the version without
+a signal) or grows past `max_overlay` entries, it is dropped, and the
+index is rebuilt on the next lookup.
+"""
+
+from django.core.cache import cache
+
+CACHE_TIMEOUT = 60 * 60 * 24
+MAX_OVERLAY = 64
+
+
+class Overlay:
+    """Destinations changed since an index was built."""
+
+    def __init__(self, version):
+        self.base_version = version
+        self.version = version
+        # {pk: value, or None for destinations no longer indexed}
+        self.changed = {}
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.removed)
+
+    def entries(self):
+        """The (pk, value) pairs to add to the index."""
+        return [(pk, value) for pk, value in self.changed.items() if value is not None]
+
+
+class IndexCache:
+    """
+    Caches `build(user)` per user, with an overlay kept up to date by
+    `sync` from the destination signals.
+    """
+
+    def __init__(self, name, build, max_overlay=MAX_OVERLAY, timeout=CACHE_TIMEOUT):
+        self.name = name
+        self.build = build
+        self.max_overlay = max_overlay
+        self.timeout = timeout
+
+    def _keys(self, user_id):
+        return f"trips:{self.name}:{user_id}", f"trips:{self.name}-overlay:{user_id}"
+
+    def get(self, user):
+        """Returns (index, overlay) for the user's current data version."""
+        index_key, overlay_key = self._keys(user.pk)
+        cached = cache.get_many([index_key, overlay_key])
+        version, index = cached.get(index_key, (None, None))
+        overlay = cached.get(overlay_key)
+        if (index is None or overlay is None or overlay.base_version != version
+                or overlay.version != user.data_version):
+            index, overlay = self.build(user), Overlay(user.data_version)
+            cache.set_many({index_key: (user.data_version, index), overlay_key: overlay},
+                           self.timeout)
+        return index, overlay
+
+    def sync(self, user_id, version, pk=None, value=None):
+        """
+        Records a change that bumped the user's data version to `version`:
+        destination `pk` now has `value` (None if it is deleted or no longer
+        indexed). Changes that move no destination leave out `pk`.
+        """
+        _, overlay_key = self._keys(user_id)
+        overlay = cache.get(overlay_key)
+        if overlay is None:
+            return
+        if overlay.version != version - 1 or len(overlay) >= self.max_overlay:
+            cache.delete(overlay_key)
+            return
+        if pk is not None:
+            overlay.removed.add(pk)
+            overlay.changed[pk] = value
+        overlay.version = version
+        cache.set(overlay_key, overlay, self.timeout)
+
+    def clear(self, user_id):
+        cache.delete_many(self._keys(user_id))
@@ -0,0 +1,142 @@
+"""
+Location search with Mapbox, with stale-while-revalidate caching.
+
+Results are cached per query. Fresh results are served from the cache;
+stale ones are served at once while a background task refreshes them
+(once the circuit breaker lets calls through again). Results stale for
+longer than `MAX_STALE_SECONDS`, e.g. because no task worker ran the
+refresh, are searched again right away instead. Calls to Mapbox have
+a timeout and go through the `mapbox` circuit breaker; while it is open,
+uncached searches are answered from the user's own saved places instead
+of waiting on Mapbox.
+"""
+
+import os
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from config.startup import lazy_import
+from tasks.registry import task
+
+from .breaker import mapbox
+from .models import Destination, GeocodedName
+
+requests = lazy_import("requests")
+
+SEARCH_URL = "https://api.mapbox.com/search/searchbox/v1/forward"
+TIMEOUT = (3.05, 5)
+FRESH_SECONDS = 60 * 60
+MAX_STALE_SECONDS = 60 * 60 * 24
+# at most one refresh of a query is queued this often
+REFRESH_SECONDS = 60 * 10
+CACHE_SECONDS = 60 * 60 * 24 * 7
+LOCAL_RESULTS = 5
+
+
+class LocationSearchError(Exception):
+    """Mapbox could not answer a search."""
+
+    def __init__(self, message, outage=True):
+        super().__init__(message)
+        # whether the error says Mapbox is unhealthy (rather than the request bad)
+        self.outage = outage
+
+
+def _cache_key(query):
+    return f"trips:location-search:{' '.join(query.lower().split())}"
+
+
+def fetch_locations(query):
+    """Searches Mapbox, recording the outcome in the circuit breaker."""
+    params = {
+        "q": query,
+        "access_token": os.environ["MAPBOX_ACCESS_TOKEN"],
+        "auto_complete": "true",
+    }
+    started = time.monotonic()
+    try:
+        response = requests.get(SEARCH_URL, params=params, timeout=TIMEOUT)
+    except requests.RequestException as e:
+        mapbox.record_failure()
+        raise LocationSearchError(str(e)) from e
+
+    if not response.ok:
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text[:500]
+        outage = response.status_code >= 500 or response.status_code == 429
+        if outage:
+            mapbox.record_failure()
+        raise LocationSearchError(
+            str({"reason": response.reason, "response": body}), outage=outage)
+    mapbox.record(time.monotonic() - started)
+
+    results = []
+    for feature in response.json()["features"]:
+        props = feature["properties"]
+        coords = props["coordinates"]
+        results.append({
+            "name": props["name"],
+            "place": props.get("place_formatted"),
+            "latitude": coords["latitude"],
+            "longitude": coords["longitude"],
+        })
+    cache.set(_cache_key(query), {"results": results, "fetched_at": time.time()}, CACHE_SECONDS)
+    return results
+
+
+@task(priority=1, max_attempts=1)
+def refresh_locations(query):
+    if mapbox.allow():
+        try:
+            fetch_locations(query)
+        finally:
+            cache.delete(f"{_cache_key(query)}:refreshing")
+
+
+def local_locations(user, query):
+    """The user's located destinations and known places matching the query."""
+    dests = Destination.objects.filter(trip__owner=user, name__icontains=query).exclude(
+        latitude=None).exclude(longitude=None).select_related("trip")[:LOCAL_RESULTS]
+    results = [{"name": d.name, "place": d.trip.title, "latitude": d.latitude,
+                "longitude": d.longitude} for d in dests]
+    known = GeocodedName.objects.filter(query__startswith=query.lower().strip()).exclude(
+        Q(latitude=None) | Q(longitude=None))[:LOCAL_RESULTS - len(results)]
+    results += [{"name": g.query, "place": None, "latitude": g.latitude,
+                 "longitude": g.longitude} for g in known]
+    return results
+
+
+def search_locations(user, query):
+    """
+    Returns (results, stale) for a search, falling back on cached or local
+    results when Mapbox is unavailable.
+
+    Raises LocationSearchError if Mapbox failed and there is nothing to
+    fall back on.
+    """
+    entry = cache.get(_cache_key(query))
+    age = time.time() - entry["fetched_at"] if entry else None
+    if entry and age < FRESH_SECONDS:
+        return entry["results"], False
+
+    if entry and age < MAX_STALE_SECONDS:
+        if cache.add(f"{_cache_key(query)}:refreshing", True, REFRESH_SECONDS):
+            refresh_locations.enqueue(query)
+        return entry["results"], True
+
+    if not mapbox.allow():
+        return entry["results"] if entry else local_locations(user, query), True
+
+    try:
+        return fetch_locations(query), False
+    except LocationSearchError as e:
+        if entry and e.outage:
+            return entry["results"], True
+        local = local_locations(user, query) if e.outage else []
+        if not local:
+            raise
+        return local, True
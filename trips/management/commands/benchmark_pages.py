@@ -0,0 +1,82 @@
+"""
+Times requests for pages as a user, to compare settings, database backends
+and response encodings.
+"""
+
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from config.compression import brotli, choose_encoding, compress, is_sensitive
+
+DEFAULT_PATHS = [
+    reverse("trips:profile"),
+    reverse("trips:calendar"),
+    reverse("trips:profile-map") + "?zoom=0",
+    reverse("trips:search") + "?q=a",
+]
+
+
+class Command(BaseCommand):
+    help = ("Requests pages as a user and reports their latency percentiles and "
+            "query counts. Run it with different --settings to compare backends, "
+            "e.g. config.settings.production and config.settings.sqlite, or with "
+            "--compression to compare encodings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS,
+                            help="The pages to request (default: the main read-heavy pages).")
+        parser.add_argument("--user", required=True, help="The username to request pages as.")
+        parser.add_argument("--requests", type=int, default=50,
+                            help="The number of times to request each page.")
+        parser.add_argument("--compression", action="store_true",
+                            help="Also report the bytes each encoding saves and its CPU "
+                                 "time per response.")
+
+    def handle(self, *args, paths, user, requests, compression, **options):
+        try:
+            user = get_user_model().objects.get(username=user)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {user!r}")
+
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ("*", "")), "localhost")
+        client = Client(SERVER_NAME=host.lstrip("."))
+        client.force_login(user)
+        self.stdout.write(f"{connection.vendor} database, {requests} requests per page")
+        self.stdout.write(f"{'page':40} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+        for path in paths:
+            timings = []
+            for _ in range(requests):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(path, secure=True)
+                    timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"{path} returned {response.status_code}")
+            q = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+            self.stdout.write(f"{path:40} {q[49] * 1000:>7.1f}ms {q[94] * 1000:>7.1f}ms "
+                              f"{q[98] * 1000:>7.1f}ms {len(queries):>8}")
+            if compression:
+                self.report_compression(response, requests)
+
+    def report_compression(self, response, repeat):
+        """Compresses the (uncompressed) response with each encoding."""
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        sensitive = is_sensitive(response)
+        used = choose_encoding("br, gzip", sensitive)
+        for encoding in ("gzip", "br") if brotli else ("gzip",):
+            started = time.process_time()
+            for _ in range(repeat):
+                compressed = compress(body, encoding, sensitive)
+            cpu = (time.process_time() - started) / repeat
+            saved = 1 - len(compressed) / len(body) if body else 0
+            self.stdout.write(f"  {encoding:5} {len(body):>8} -> {len(compressed):>8} bytes "
+                              f"({saved:.0%} saved), {cpu * 1000:.2f}ms CPU"
+                              f"{' (used)' if encoding == used else ''}")
@@ -0,0 +1,44 @@
+"""
+Fills in coordinates of destinations that have none by geocoding their names.
+"""
+
+from django.core.management.base import BaseCommand
+
+from trips import geocoding
+from trips.tasks import geocode_missing_destinations
+
+
+class Command(BaseCommand):
+    help = "Geocodes destinations missing coordinates by name."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=geocoding.BATCH_SIZE,
+                            help="Names looked up and saved per batch.")
+        parser.add_argument("--concurrency", type=int, default=geocoding.CONCURRENCY,
+                            help="Lookups running at once.")
+        parser.add_argument("--rate", type=float, default=geocoding.RATE,
+                            help="Maximum lookups per second.")
+        parser.add_argument("--limit", type=int, help="Stop after this many lookups.")
+        parser.add_argument("--retry-misses", action="store_true",
+                            help="Look up again names that were not found before.")
+        parser.add_argument("--enqueue", action="store_true",
+                            help="Queue a background task instead of running now.")
+
+    def handle(self, *args, batch_size, concurrency, rate, limit, retry_misses, enqueue,
+               **options):
+        if enqueue:
+            t = geocode_missing_destinations.enqueue(limit=limit)
+            self.stdout.write(f"Queued task {t.pk}.")
+            return
+
+        def progress(counts):
+            self.stdout.write(self.format(counts))
+
+        counts = geocoding.geocode_missing(
+            batch_size=batch_size, concurrency=concurrency, rate=rate, limit=limit,
+            retry_misses=retry_misses, progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Done: {self.format(counts)}"))
+
+    def format(self, counts):
+        return (f"{counts['looked_up']} names looked up, {counts['found']} found, "
+                f"{counts['failed']} failed, {counts['destinations']} destinations updated")
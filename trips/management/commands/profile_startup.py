@@ -0,0 +1,34 @@
+"""
+Reports how long a worker takes to start and serve its first request.
+"""
+
+from django.core.management.base import BaseCommand
+
+from config.startup import imports_by_package, measure_startup
+
+
+class Command(BaseCommand):
+    help = ("Starts Django in a fresh process, requests a page twice and reports "
+            "the time taken by each start-up step and by imports.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="The page to request.")
+        parser.add_argument("--warm-up", action="store_true",
+                            help="Warm the process up first, as the ASGI application does.")
+        parser.add_argument("--top", type=int, default=15,
+                            help="The number of packages and modules to list.")
+
+    def handle(self, *args, path, warm_up, top, **options):
+        timings, imports = measure_startup(path, warm_up)
+        for step, seconds in timings.items():
+            self.stdout.write(f"{step:20} {seconds * 1000:>9.1f} ms")
+        self.stdout.write(f"{'time to first request':20} "
+                          f"{(sum(timings.values()) - timings['second_request']) * 1000:>9.1f} ms")
+
+        self.stdout.write("\nSlowest packages to import (self time):")
+        for package, seconds in imports_by_package(imports)[:top]:
+            self.stdout.write(f"  {package:40} {seconds * 1000:>9.1f} ms")
+
+        self.stdout.write("\nSlowest modules to import (including their imports):")
+        for module, _, cumulative, _ in sorted(imports, key=lambda i: -i[2])[:top]:
+            self.stdout.write(f"  {module:40} {cumulative * 1000:>9.1f} ms")
@@ -0,0 +1,15 @@
+"""
+Shows how location searches were throttled.
+"""
+
+from django.core.management.base import BaseCommand
+
+from trips.throttle import metrics
+
+
+class Command(BaseCommand):
+    help = "Shows the number of location searches by outcome since the cache was cleared."
+
+    def handle(self, *args, **options):
+        for event, count in metrics().items():
+            self.stdout.write(f"{event:20} {count:>8}")
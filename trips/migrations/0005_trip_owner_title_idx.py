@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_remove_destination_mapbox_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['owner', 'title'], name='trip_owner_title_idx'),
+        ),
+    ]
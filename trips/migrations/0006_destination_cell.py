@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:54
+
+from django.db import migrations, models
+
+# trips.geo.cell_id as of this migration, copied so later changes to it
+# cannot change what this migration does
+CELL_LEVEL = 20
+
+
+def cell_id(latitude, longitude):
+    size = 1 << CELL_LEVEL
+    x = min(max(int((longitude + 180) / 360 * size), 0), size - 1)
+    y = min(max(int((latitude + 90) / 180 * size), 0), size - 1)
+    code = 0
+    for bit in range(CELL_LEVEL):
+        code |= ((x >> bit) & 1) << (2 * bit)
+        code |= ((y >> bit) & 1) << (2 * bit + 1)
+    return code
+
+
+def populate_cells(apps, schema_editor):
+    Destination = apps.get_model("trips", "Destination")
+    located = Destination.objects.exclude(latitude=None).exclude(longitude=None)
+    batch = []
+    for dest in located.only("latitude", "longitude").iterator(chunk_size=2000):
+        dest.cell = cell_id(dest.latitude, dest.longitude)
+        batch.append(dest)
+        if len(batch) >= 2000:
+            Destination.objects.bulk_update(batch, ["cell"])
+            batch = []
+    Destination.objects.bulk_update(batch, ["cell"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_trip_owner_title_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='cell',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(fields=['cell'], name='destination_cell_idx'),
+        ),
+        migrations.RunPython(populate_cells, migrations.RunPython.noop),
+    ]
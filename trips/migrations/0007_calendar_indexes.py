@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_destination_cell'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(fields=['trip', 'start_time'], name='destination_trip_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['owner', 'start_date'], name='trip_owner_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['owner', 'end_date'], name='trip_owner_end_idx'),
+        ),
+    ]
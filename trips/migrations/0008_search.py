@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:10
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """Adds an index on Postgres only, as other databases have no GIN indexes."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Trip = apps.get_model("trips", "Trip")
+    Destination = apps.get_model("trips", "Destination")
+    Trip.objects.update(search_vector=(
+        SearchVector("title", weight="A", config="english")
+        + SearchVector("notes", weight="B", config="english")))
+    Destination.objects.update(search_vector=SearchVector("name", weight="A", config="english"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_calendar_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='destination',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        AddPostgresIndex(
+            model_name='destination',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='destination_search_idx'),
+        ),
+        AddPostgresIndex(
+            model_name='destination',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='destination_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddPostgresIndex(
+            model_name='trip',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='trip_search_idx'),
+        ),
+        AddPostgresIndex(
+            model_name='trip',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='trip_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0008_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodedName',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=50, unique=True)),
+                ('latitude', models.FloatField(null=True)),
+                ('longitude', models.FloatField(null=True)),
+                ('looked_up_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
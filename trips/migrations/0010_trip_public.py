@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_geocodedname'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='public',
+            field=models.BooleanField(default=False, help_text='Anyone with the link can view this trip.'),
+        ),
+    ]
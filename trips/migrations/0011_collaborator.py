@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_trip_public'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Collaborator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('viewer', 'Viewer'), ('editor', 'Editor')], default='viewer', max_length=10)),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+                ('trip', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='trips.trip')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trip', 'user'), name='collaborator_trip_user_uniq')],
+            },
+        ),
+    ]
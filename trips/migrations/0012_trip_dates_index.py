@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:01
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """Adds an index on Postgres only, as other databases have no GiST indexes."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_collaborator'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # lets the GiST index include the owner
+        BtreeGistExtension(),
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_owner_start_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_owner_end_idx',
+        ),
+        AddPostgresIndex(
+            model_name='trip',
+            index=django.contrib.postgres.indexes.GistIndex(models.F('owner'), models.Func(django.db.models.functions.comparison.Least('start_date', 'end_date'), django.db.models.functions.comparison.Greatest('start_date', 'end_date'), models.Value('[]'), function='DATERANGE', output_field=django.contrib.postgres.fields.ranges.DateRangeField()), name='trip_owner_dates_idx'),
+        ),
+    ]
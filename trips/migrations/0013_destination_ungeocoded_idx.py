@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:03
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0012_trip_dates_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('name')), condition=models.Q(('latitude', None)), name='destination_ungeocoded_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:23
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """Adds an index on Postgres only, as other databases have no GiST indexes."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0013_destination_ungeocoded_idx'),
+    ]
+
+    operations = [
+        AddPostgresIndex(
+            model_name='destination',
+            index=django.contrib.postgres.indexes.GistIndex(models.Func('start_time', django.db.models.functions.comparison.Greatest('start_time', 'end_time'), models.Case(models.When(end_time__gt=models.F('start_time'), then=models.Value('[)')), default=models.Value('[]')), function='TSTZRANGE', output_field=django.contrib.postgres.fields.ranges.DateTimeRangeField()), name='destination_times_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0014_destination_times_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_owner_title_idx',
+        ),
+    ]
@@ -2,17 +2,101 @@
 Models for the trips app.
 """
 
+import datetime
+
 from nanoid import generate as generate_nanoid
-from django.db import models
+from django.contrib.postgres.fields import DateRangeField, DateTimeRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models
+from django.db.models.functions import Greatest, Least, Lower, Trim
 from django.conf import settings
 from django.urls import reverse
 
+from .geo import BBox, cell_id, cell_ranges, haversine_expression
+
 
 def generate_random_slug():
     """Generates a 12 character nanoid"""
     return generate_nanoid(size=12)
 
 
+def trip_dates():
+    """
+    The days of a trip as a Postgres date range, just one day if only one of
+    its dates is set (LEAST and GREATEST skip nulls there).
+    """
+    return models.Func(
+        Least("start_date", "end_date"), Greatest("start_date", "end_date"), models.Value("[]"),
+        function="DATERANGE", output_field=DateRangeField())
+
+
+def destination_times():
+    """
+    The times of a destination as a Postgres timestamp range, just the
+    instant it starts if it has no end time after that. Null if it has no
+    start time.
+    """
+    return models.Func(
+        "start_time", Greatest("start_time", "end_time"),
+        models.Case(models.When(end_time__gt=models.F("start_time"), then=models.Value("[)")),
+                    default=models.Value("[]")),
+        function="TSTZRANGE", output_field=DateTimeRangeField())
+
+
+def normalized_name():
+    """A destination's name as geocoding looks it up, see geocoding.py."""
+    return Lower(Trim("name"))
+
+
+class TripQuerySet(models.QuerySet):
+    def with_centroid(self):
+        """Trips with destinations, annotated with their average location."""
+        return self.annotate(
+            avg_latitude=models.Avg("destination__latitude"),
+            avg_longitude=models.Avg("destination__longitude"),
+        ).exclude(avg_latitude=None).exclude(avg_longitude=None)
+
+    def overlapping(self, first, last):
+        """
+        Trips with dates between `first` and `last` (inclusive).
+
+        A trip with only one of its dates set lasts just that day. On
+        Postgres the date ranges are compared with the GiST index on
+        (owner, dates); elsewhere each branch is a range on a date column.
+        """
+        if connections[self.db].vendor == "postgresql":
+            return self.exclude(start_date=None, end_date=None).alias(dates=trip_dates()).filter(
+                dates__overlap=(first, last + datetime.timedelta(days=1)))
+        return self.filter(
+            models.Q(start_date__lte=last, end_date__gte=first)
+            | models.Q(start_date__range=(first, last), end_date=None)
+            | models.Q(start_date=None, end_date__range=(first, last))
+        )
+
+    def with_access(self, user):
+        """
+        Trips annotated with `user`'s role on them as `access_role`: "owner",
+        a `Collaborator.Role` or None. The role is joined in through the
+        collaborator table's (trip, user) index, so no extra query is needed.
+        """
+        if not user.is_authenticated:
+            return self.annotate(access_role=models.Value(None, models.CharField()))
+        return self.annotate(
+            membership=models.FilteredRelation(
+                "collaborator", condition=models.Q(collaborator__user=user)),
+            access_role=models.Case(
+                models.When(owner=user, then=models.Value("owner")),
+                default=models.F("membership__role"),
+            ),
+        )
+
+    def editable_by(self, user):
+        """Trips `user` owns or is an editor of."""
+        return self.filter(models.Q(owner=user) | models.Exists(Collaborator.objects.filter(
+            trip=models.OuterRef("pk"), user=user, role=Collaborator.Role.EDITOR)))
+
+
 class Trip(models.Model):
     """Representation of the trip table"""
 
@@ -26,14 +110,88 @@ class Trip(models.Model):
     end_date = models.DateField(null=True, blank=True)
     scheduled = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
+    # shown read-only to anyone at its shared URL, see sharing.py
+    public = models.BooleanField(default=False,
+                                 help_text="Anyone with the link can view this trip.")
+    # title and notes for full-text search on Postgres, see search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = TripQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Postgres only, see migrations 0008 and 0012
+            GistIndex(models.F("owner"), trip_dates(), name="trip_owner_dates_idx"),
+            GinIndex(fields=["search_vector"], name="trip_search_idx"),
+            GinIndex(fields=["title"], name="trip_title_trgm_idx", opclasses=["gin_trgm_ops"]),
+        ]
 
     def get_absolute_url(self):
         return reverse("trips:trip-detail", kwargs={"slug": self.slug})
 
+    def get_shared_url(self):
+        return reverse("trips:shared-trip", kwargs={"slug": self.slug})
+
     def __str__(self):
         return f'{self.title} ({self.slug})'
 
 
+class Collaborator(models.Model):
+    """A user a trip is shared with, and what they may do with it"""
+
+    class Role(models.TextChoices):
+        # sees the trip and its destinations
+        VIEWER = "viewer"
+        # also changes them
+        EDITOR = "editor"
+
+    # indexed by the (trip, user) constraint
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    role = models.CharField(max_length=10, choices=Role, default=Role.VIEWER)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # serves access checks and a trip's collaborator listing
+            models.UniqueConstraint(fields=["trip", "user"], name="collaborator_trip_user_uniq"),
+        ]
+
+    def __str__(self):
+        return f'{self.user} ({self.role} of {self.trip})'
+
+
+class DestinationQuerySet(models.QuerySet):
+    """Spatial queries over destinations, served by the cell index."""
+
+    def in_bbox(self, bbox):
+        """Destinations inside a `geo.BBox`."""
+        cells = models.Q()
+        for low, high in cell_ranges(bbox):
+            cells |= models.Q(cell__range=(low, high))
+        return self.filter(cells).filter(bbox.as_q())
+
+    def near(self, latitude, longitude, km):
+        """Destinations within `km` of a point, annotated with `distance`."""
+        return self.in_bbox(BBox.around(latitude, longitude, km)).annotate(
+            distance=haversine_expression(latitude, longitude)
+        ).filter(distance__lte=km)
+
+    def overlapping(self, start, end):
+        """
+        Destinations whose times overlap [start, end).
+
+        A destination without an end time lasts just the instant it starts.
+        On Postgres the time ranges are compared with the GiST index on
+        them; elsewhere it takes ranges on both time columns.
+        """
+        if connections[self.db].vendor == "postgresql":
+            return self.exclude(start_time=None).alias(times=destination_times()).filter(
+                times__overlap=(start, end))
+        return self.filter(start_time__lt=end).filter(
+            models.Q(end_time__gt=start) | models.Q(end_time=None, start_time__gte=start))
+
+
 class Destination(models.Model):
     """Representation of the destination table"""
     # primary key: id (auto set by django)
@@ -41,8 +199,55 @@ class Destination(models.Model):
     name = models.CharField(max_length=50)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # quadtree cell of (latitude, longitude), see geo.cell_id
+    cell = models.BigIntegerField(null=True, editable=False)
     start_time = models.DateTimeField(null=True, blank=True)
     end_time = models.DateTimeField(null=True, blank=True)
+    # name for full-text search on Postgres, see search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = DestinationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cell"], name="destination_cell_idx"),
+            # serves the calendar's per-trip time range queries
+            models.Index(fields=["trip", "start_time"], name="destination_trip_start_idx"),
+            # serves geocoding's lookups of ungeocoded destinations by name
+            models.Index(normalized_name(), condition=models.Q(latitude=None),
+                         name="destination_ungeocoded_idx"),
+            # Postgres only, see migrations 0008 and 0014
+            GistIndex(destination_times(), name="destination_times_idx"),
+            GinIndex(fields=["search_vector"], name="destination_search_idx"),
+            GinIndex(fields=["name"], name="destination_name_trgm_idx",
+                     opclasses=["gin_trgm_ops"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.latitude is None or self.longitude is None:
+            self.cell = None
+        else:
+            self.cell = cell_id(self.latitude, self.longitude)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "cell"}
+        return super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.name} [from Trip: {self.trip}]'
+
+
+class GeocodedName(models.Model):
+    """
+    Result of geocoding a normalized destination name, shared by all users.
+
+    Coordinates are null if nothing was found. See geocoding.py.
+    """
+    query = models.CharField(max_length=50, unique=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    looked_up_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.query
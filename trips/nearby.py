@@ -0,0 +1,165 @@
+"""
+Nearest saved destinations for a user.
+
+Each user's located destinations are indexed by a KD-tree over unit-sphere
+(x, y, z) coordinates, where straight-line distance orders points the same
+way as great-circle distance. The index is built lazily on the first
+lookup and cached; destination changes are recorded in a small overlay of
+new or moved points next to it instead of rewriting it (see `indexcache`).
+"""
+
+import heapq
+import math
+
+import numpy as np
+
+from .geo import EARTH_RADIUS_KM
+from .indexcache import IndexCache
+from .models import Destination
+
+LEAF_SIZE = 32
+
+
+def to_unit_vectors(latitudes, longitudes):
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1))
+
+
+class KDTree:
+    """A static KD-tree answering k-nearest-neighbor queries."""
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.order = np.arange(len(self.points))
+        # per node: start, end, left child, right child (-1 for leaves)
+        self.nodes = []
+        self.lo = []
+        self.hi = []
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def _build(self, start, end):
+        node = len(self.nodes)
+        pts = self.points[self.order[start:end]]
+        self.nodes.append([start, end, -1, -1])
+        self.lo.append(pts.min(axis=0))
+        self.hi.append(pts.max(axis=0))
+        if end - start > LEAF_SIZE:
+            dim = int(np.argmax(self.hi[node] - self.lo[node]))
+            mid = (start + end) // 2
+            part = np.argpartition(pts[:, dim], mid - start)
+            self.order[start:end] = self.order[start:end][part]
+            self.nodes[node][2] = self._build(start, mid)
+            self.nodes[node][3] = self._build(mid, end)
+        return node
+
+    def _min_dist2(self, node, point):
+        gap = np.maximum(0, np.maximum(self.lo[node] - point, point - self.hi[node]))
+        return float(gap @ gap)
+
+    def query(self, point, k):
+        """Returns (squared distances, indexes) of the k nearest points."""
+        if not len(self.points) or k <= 0:
+            return np.empty(0), np.empty(0, dtype=int)
+        point = np.asarray(point, dtype=float)
+        best = []  # max-heap of (-dist2, index)
+        queue = [(self._min_dist2(0, point), 0)]
+        while queue:
+            bound, node = heapq.heappop(queue)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            start, end, left, right = self.nodes[node]
+            if left == -1:
+                idx = self.order[start:end]
+                diff = self.points[idx] - point
+                for d2, i in zip(np.einsum("ij,ij->i", diff, diff), idx):
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, i))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, i))
+            else:
+                for child in (left, right):
+                    heapq.heappush(queue, (self._min_dist2(child, point), child))
+        best.sort(reverse=True)
+        return np.array([-d2 for d2, _ in best]), np.array([i for _, i in best], dtype=int)
+
+
+class NearbyIndex:
+    """A user's destinations indexed for nearest-neighbor lookups."""
+
+    def __init__(self, rows):
+        """`rows` are (pk, latitude, longitude, properties)."""
+        rows = list(rows)
+        self.pks = np.array([row[0] for row in rows], dtype=np.int64)
+        self.coords = [(row[1], row[2]) for row in rows]
+        self.props = [row[3] for row in rows]
+        self.tree = KDTree(to_unit_vectors(*zip(*self.coords)) if rows else [])
+
+    @classmethod
+    def build(cls, user):
+        dests = Destination.objects.filter(trip__owner=user).exclude(
+            latitude=None).exclude(longitude=None).values_list(
+            "pk", "latitude", "longitude", "name", "trip__slug")
+        return cls(
+            (pk, lat, lon, {"name": name, "trip": slug}) for pk, lat, lon, name, slug in dests
+        )
+
+    def __len__(self):
+        return len(self.pks)
+
+    def query(self, latitude, longitude, k, overlay=None):
+        """
+        Returns up to k (pk, latitude, longitude, distance in km, properties)
+        tuples, nearest first, with the changes in `overlay` applied.
+        """
+        removed = overlay.removed if overlay else set()
+        point = to_unit_vectors([latitude], [longitude])[0]
+        # removed points are still in the tree, so ask for extra neighbors
+        d2, idx = self.tree.query(point, k + len(removed))
+        found = [(math.sqrt(d), int(self.pks[i]), self.coords[i], self.props[i])
+                 for d, i in zip(d2, idx) if int(self.pks[i]) not in removed]
+        entries = overlay.entries() if overlay else []
+        if entries:
+            diff = to_unit_vectors(*zip(*(entry[:2] for _, entry in entries))) - point
+            chords = np.sqrt(np.einsum("ij,ij->i", diff, diff)).tolist()
+            found += [(chord, pk, entry[:2], entry[2])
+                      for chord, (pk, entry) in zip(chords, entries)]
+        return [(pk, *coord, float(chord_to_km(chord)), props)
+                for chord, pk, coord, props in heapq.nsmallest(k, found, key=lambda f: f[:2])]
+
+
+nearby_cache = IndexCache("nearby", NearbyIndex.build)
+
+
+def get_nearby_index(user):
+    """
+    Returns the user's index and the overlay of destinations changed since
+    it was built.
+    """
+    return nearby_cache.get(user)
+
+
+def nearest_destinations(user, latitude, longitude, k=10):
+    index, overlay = get_nearby_index(user)
+    return index.query(latitude, longitude, k, overlay)
+
+
+def sync_cached_index(user_id, version, destination=None, trip_slug=None, deleted=False):
+    """
+    Records a saved or deleted destination of the trip at `trip_slug` in
+    the user's cached index after the change bumped their data version to
+    `version`.
+    """
+    if destination is None:
+        nearby_cache.sync(user_id, version)
+    elif deleted or destination.latitude is None or destination.longitude is None:
+        nearby_cache.sync(user_id, version, destination.pk)
+    else:
+        nearby_cache.sync(user_id, version, destination.pk, (
+            destination.latitude, destination.longitude,
+            {"name": destination.name, "trip": trip_slug}))
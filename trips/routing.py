@@ -0,0 +1,143 @@
+"""
+Itinerary optimization for trips.
+
+Reorders a trip's scheduled, located destinations to shorten the total
+route with 2-opt, improving both a nearest-neighbor tour and the current
+order, on a precomputed NumPy distance matrix. Improvement stops at a time
+limit, so large trips still return quickly with the best route found so far.
+"""
+
+import datetime
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Destination
+from .sharing import purge_shared_pages
+from .stats import haversine_km, route_destinations
+
+TIME_LIMIT = 0.5
+
+
+def distance_matrix(latitudes, longitudes):
+    """Pairwise great-circle distances in km."""
+    lats = np.asarray(latitudes, dtype=float)
+    lons = np.asarray(longitudes, dtype=float)
+    return haversine_km(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+
+
+def route_length(route, dist):
+    route = np.asarray(route)
+    return float(dist[route[:-1], route[1:]].sum())
+
+
+def nearest_neighbor(dist, start=0):
+    """Builds a path from `start` by always visiting the closest stop next."""
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    route = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[route[-1]])
+        nearest = int(np.argmin(row))
+        route.append(nearest)
+        visited[nearest] = True
+    return np.array(route)
+
+
+def two_opt(route, dist, deadline):
+    """
+    Improves an open path by reversing segments while that shortens it.
+
+    The first stop stays fixed. For each edge, every candidate reversal is
+    scored at once and the best one applied.
+    """
+    route = np.array(route)
+    n = len(route)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 2):
+            if time.monotonic() > deadline:
+                return route
+            a, b = route[i], route[i + 1]
+            js = np.arange(i + 2, n)
+            c = route[js]
+            # reversing route[i+1..j] swaps edges (a, b), (c, d) for (a, c), (b, d)
+            delta = dist[a, c] - dist[a, b]
+            d = route[js[:-1] + 1]
+            delta[:-1] += dist[b, d] - dist[c[:-1], d]
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                j = js[k]
+                route[i + 1:j + 1] = route[i + 1:j + 1][::-1].copy()
+                improved = True
+    return route
+
+
+def optimize_order(dist, time_limit=TIME_LIMIT):
+    """
+    Returns a short visiting order of the points of a distance matrix,
+    starting from the first one and never longer than their current order.
+    """
+    n = len(dist)
+    if n < 3:
+        return np.arange(n)
+    # 2-opt from the nearest-neighbor path usually ends up shorter, but not
+    # always, so 2-opt from the current order gets the rest of the time
+    start = time.monotonic()
+    candidates = [
+        two_opt(nearest_neighbor(dist), dist, start + time_limit / 2),
+        two_opt(np.arange(n), dist, start + time_limit),
+    ]
+    return min(candidates, key=lambda route: route_length(route, dist))
+
+
+def reschedule(dests):
+    """
+    Assigns the destinations' start times to them in visiting order.
+
+    Each stop takes the next of the start times, but no earlier than the
+    previous stop ends, and keeps its duration.
+    """
+    slots = sorted(d.start_time for d in dests)
+    previous_end = None
+    for dest, slot in zip(dests, slots):
+        duration = None
+        if dest.end_time:
+            duration = max(dest.end_time - dest.start_time, datetime.timedelta())
+        dest.start_time = max(slot, previous_end) if previous_end else slot
+        dest.end_time = dest.start_time + duration if duration is not None else None
+        previous_end = dest.end_time or dest.start_time
+
+
+def optimize_trip_route(trip, time_limit=TIME_LIMIT):
+    """
+    Reorders a trip's scheduled, located destinations to minimize travel
+    distance. Destinations without a start time have no place in the route
+    to move to, so they are left alone.
+
+    If the order found is shorter, it is scheduled with `reschedule` and all
+    changes are saved in one bulk update. Returns the (old, new) route
+    lengths in km.
+    """
+    dests = list(route_destinations(trip.destination_set.exclude(start_time=None)))
+    if len(dests) < 2:
+        return (0.0, 0.0)
+
+    dist = distance_matrix([d.latitude for d in dests], [d.longitude for d in dests])
+    order = optimize_order(dist, time_limit)
+    old_length = route_length(np.arange(len(dests)), dist)
+    new_length = route_length(order, dist)
+    if new_length >= old_length - 1e-9:
+        return (old_length, old_length)
+    reschedule([dests[i] for i in order])
+
+    with transaction.atomic():
+        Destination.objects.bulk_update(dests, ["start_time", "end_time"], batch_size=500)
+        get_user_model().bump_data_versions([trip.owner_id])
+        if trip.public:
+            purge_shared_pages([trip.slug])
+    return (old_length, new_length)
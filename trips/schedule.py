@@ -0,0 +1,209 @@
+"""
+Schedule conflicts between destinations.
+
+A destination occupies [start_time, end_time), or just the instant of its
+start time if it has no end. A user's destinations are kept in a cached
+interval tree, so checking one new stop against all of them takes
+O(log n + k) for k conflicts. Saved and deleted destinations are recorded
+in a small overlay next to the tree rather than rebuilding it (see
+`indexcache`). The full report uses a sweep line over the stops sorted by
+start time.
+
+Calendars fetch only the trips and destinations overlapping the visible
+days, with range queries on the indexed date and time columns.
+"""
+
+import calendar
+import datetime
+import heapq
+
+from django.utils import timezone
+
+from .indexcache import IndexCache
+from .models import Trip, Destination
+
+
+def _interval(start_time, end_time):
+    start = start_time.timestamp()
+    return start, max(end_time.timestamp(), start) if end_time else start
+
+
+def overlaps(a_start, a_end, b_start, b_end):
+    """Whether two stops overlap; stops starting at the same time always do."""
+    return (a_start < b_end and b_start < a_end) or a_start == b_start
+
+
+class IntervalTree:
+    """
+    A static interval tree over (start, end, key) tuples.
+
+    The intervals are sorted by start and form an implicit balanced binary
+    tree (each slice's middle element is its root). Every node also stores
+    the latest end in its subtree, so whole subtrees ending too early are
+    skipped.
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals)
+        self.starts = [i[0] for i in intervals]
+        self.ends = [i[1] for i in intervals]
+        self.keys = [i[2] for i in intervals]
+        self.max_ends = list(self.ends)
+        self._build(0, len(intervals))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        self.max_ends[mid] = max(self.ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self.max_ends[mid]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def overlapping(self, start, end):
+        """Returns the keys of intervals overlapping [start, end)."""
+        found = []
+        stack = [(0, len(self.keys))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_ends[mid] < start:
+                continue
+            stack.append((lo, mid))
+            # nodes to the right start no earlier, so prune them together
+            if self.starts[mid] < end or self.starts[mid] == start:
+                if overlaps(self.starts[mid], self.ends[mid], start, end):
+                    found.append(self.keys[mid])
+                stack.append((mid + 1, hi))
+        return found
+
+
+def find_conflicts(intervals):
+    """
+    Returns every overlapping pair of keys among (start, end, key) tuples.
+
+    Sweeps the intervals in start order while a heap holds those still
+    running, so the cost is O(n log n) plus the number of pairs.
+    """
+    pairs = []
+    running = []  # heap of (end, start, key)
+    for start, end, key in sorted(intervals):
+        while running and not overlaps(running[0][1], running[0][0], start, end):
+            heapq.heappop(running)
+        pairs += [(other, key) for _, _, other in running]
+        heapq.heappush(running, (end, start, key))
+    return pairs
+
+
+def _scheduled(user):
+    dests = Destination.objects.filter(trip__owner=user).exclude(start_time=None).values_list(
+        "pk", "start_time", "end_time")
+    return [(*_interval(start_time, end_time), pk) for pk, start_time, end_time in dests]
+
+
+schedule_cache = IndexCache("schedule", lambda user: IntervalTree(_scheduled(user)))
+
+
+def get_schedule_index(user):
+    """
+    Returns the interval tree of a user's scheduled destinations and the
+    overlay of destinations changed since it was built.
+    """
+    return schedule_cache.get(user)
+
+
+def sync_cached_schedule(user_id, version, destination=None, deleted=False):
+    """
+    Records a saved or deleted destination in the user's cached schedule
+    after the change bumped their data version to `version`.
+    """
+    if destination is None:
+        schedule_cache.sync(user_id, version)
+    elif deleted or destination.start_time is None:
+        schedule_cache.sync(user_id, version, destination.pk)
+    else:
+        # the times may still be strings when created from them
+        times = [Destination._meta.get_field(name).to_python(getattr(destination, name))
+                 for name in ("start_time", "end_time")]
+        schedule_cache.sync(user_id, version, destination.pk, _interval(*times))
+
+
+def schedule_conflicts(user, start_time, end_time=None, exclude=None):
+    """
+    Returns the user's destinations overlapping the given times.
+
+    `exclude` is the pk of a destination to leave out, such as the one
+    being edited.
+    """
+    if start_time is None:
+        return []
+    start, end = _interval(start_time, end_time)
+    tree, overlay = get_schedule_index(user)
+    pks = [pk for pk in tree.overlapping(start, end) if pk not in overlay.removed]
+    pks += [pk for pk, interval in overlay.entries() if overlaps(*interval, start, end)]
+    pks = [pk for pk in pks if pk != exclude]
+    return list(Destination.objects.select_related("trip").filter(pk__in=pks).order_by(
+        "start_time", "pk"))
+
+
+def user_schedule_conflicts(user):
+    """Returns every pair of the user's destinations that overlap in time."""
+    pairs = find_conflicts(_scheduled(user))
+    dests = Destination.objects.select_related("trip").in_bulk(
+        {pk for pair in pairs for pk in pair})
+    conflicts = [(dests[a], dests[b]) for a, b in pairs]
+    return sorted(conflicts, key=lambda pair: (pair[0].start_time, pair[0].pk, pair[1].pk))
+
+
+def _days(first, last):
+    return [first + datetime.timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+def calendar_days(user, first, last):
+    """
+    Returns {date: {"trips", "destinations"}} for each day from `first` to
+    `last` (inclusive), listing the user's trips and destinations on it.
+    """
+    days = {day: {"trips": [], "destinations": []} for day in _days(first, last)}
+    trips = Trip.objects.filter(owner=user).overlapping(first, last).only(
+        "slug", "title", "start_date", "end_date").order_by("start_date", "pk")
+    for trip in trips:
+        start = max(trip.start_date or trip.end_date, first)
+        end = min(trip.end_date or trip.start_date, last)
+        for day in _days(start, end):
+            days[day]["trips"].append(trip)
+
+    window = [timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+              for day in (first, last + datetime.timedelta(days=1))]
+    dests = Destination.objects.filter(trip__owner=user).overlapping(*window).select_related(
+        "trip").only("name", "start_time", "end_time", "trip__slug", "trip__title").order_by(
+        "start_time", "pk")
+    for dest in dests:
+        end_time = dest.start_time
+        if dest.end_time and dest.end_time > dest.start_time:
+            # a stop ending at midnight does not reach into the next day
+            end_time = dest.end_time - datetime.timedelta(microseconds=1)
+        start = max(timezone.localdate(dest.start_time), first)
+        end = min(timezone.localdate(end_time), last)
+        for day in _days(start, end):
+            days[day]["destinations"].append(dest)
+    return days
+
+
+def calendar_months(user, year, months):
+    """
+    Returns a calendar for each of the given months of a year.
+
+    Each month is a dict with its first `date` and its `weeks`, lists of
+    seven days holding `date`, `in_month`, `trips` and `destinations`.
+    """
+    grids = {month: calendar.Calendar().monthdatescalendar(year, month) for month in months}
+    days = calendar_days(user, grids[months[0]][0][0], grids[months[-1]][-1][-1])
+    return [{
+        "date": datetime.date(year, month, 1),
+        "weeks": [[{"date": day, "in_month": day.month == month, **days[day]} for day in week]
+                  for week in weeks],
+    } for month, weeks in grids.items()]
@@ -0,0 +1,134 @@
+"""
+Full-text search over a user's trips and destinations.
+
+On Postgres, trips and destinations keep a stored `search_vector` (updated
+by signals) that is matched through a GIN index, and trigram indexes on
+titles and names catch typos. Matches are ranked across both models in
+one query, and headlines are only computed for the page being shown.
+
+Other databases fall back to case-insensitive substring matching.
+"""
+
+import re
+
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery, SearchRank,
+                                            SearchVector, TrigramWordSimilarity)
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Trip, Destination
+
+SEARCH_CONFIG = "english"
+PAGE_SIZE = 10
+# highlighted words are wrapped in these before escaping, then marked up
+START_SEL, STOP_SEL = "\x02", "\x03"
+
+
+def trip_search_vector():
+    return (SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("notes", weight="B", config=SEARCH_CONFIG))
+
+
+def destination_search_vector():
+    return SearchVector("name", weight="A", config=SEARCH_CONFIG)
+
+
+def uses_postgres():
+    return connection.vendor == "postgresql"
+
+
+def update_search_vectors(queryset):
+    """Recomputes the stored search vectors of trips or destinations."""
+    if not uses_postgres():
+        return
+    if queryset.model is Trip:
+        queryset.update(search_vector=trip_search_vector())
+    else:
+        queryset.update(search_vector=destination_search_vector())
+
+
+def _marked(text):
+    return mark_safe(escape(text).replace(START_SEL, "<mark>").replace(STOP_SEL, "</mark>"))
+
+
+def _highlight(text, query):
+    """Marks words of the query in text (for databases without headlines)."""
+    words = [re.escape(word) for word in query.split()]
+    if not words:
+        return escape(text)
+    pattern = re.compile("|".join(words), re.IGNORECASE)
+    return _marked(pattern.sub(lambda m: f"{START_SEL}{m.group()}{STOP_SEL}", text))
+
+
+def _ranked(user, query):
+    """The user's matching trips and destinations as (kind, pk, rank) rows."""
+    trips = Trip.objects.filter(owner=user)
+    dests = Destination.objects.filter(trip__owner=user)
+    if uses_postgres():
+        search = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+        trips = trips.filter(Q(search_vector=search) | Q(title__trigram_word_similar=query)).annotate(
+            rank=SearchRank(F("search_vector"), search) + TrigramWordSimilarity(query, "title"))
+        dests = dests.filter(Q(search_vector=search) | Q(name__trigram_word_similar=query)).annotate(
+            rank=SearchRank(F("search_vector"), search) + TrigramWordSimilarity(query, "name"))
+    else:
+        trips = trips.filter(Q(title__icontains=query) | Q(notes__icontains=query)).annotate(
+            rank=Case(When(title__icontains=query, then=Value(1.0)), default=Value(0.5),
+                      output_field=FloatField()))
+        dests = dests.filter(name__icontains=query).annotate(
+            rank=Value(1.0, output_field=FloatField()))
+    trips = trips.annotate(kind=Value("trip")).values_list("kind", "pk", "rank")
+    dests = dests.annotate(kind=Value("destination")).values_list("kind", "pk", "rank")
+    return trips.union(dests, all=True).order_by("-rank", "kind", "pk")
+
+
+def _results(rows, query):
+    """Loads the trips and destinations of a page of rows, with headlines."""
+    pks = {"trip": [], "destination": []}
+    for kind, pk, rank in rows:
+        pks[kind].append(pk)
+    trips = Trip.objects.filter(pk__in=pks["trip"])
+    dests = Destination.objects.filter(pk__in=pks["destination"]).select_related("trip")
+    if uses_postgres():
+        search = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+        options = {"config": SEARCH_CONFIG, "start_sel": START_SEL, "stop_sel": STOP_SEL}
+        trips = trips.annotate(headline=SearchHeadline("notes", search, **options),
+                               title_headline=SearchHeadline("title", search, **options))
+        dests = dests.annotate(title_headline=SearchHeadline("name", search, **options))
+    found = {("trip", trip.pk): trip for trip in trips}
+    found.update({("destination", dest.pk): dest for dest in dests})
+
+    results = []
+    for kind, pk, rank in rows:
+        obj = found[(kind, pk)]
+        if kind == "trip":
+            title, url = obj.title, obj.get_absolute_url()
+            headline = getattr(obj, "headline", None)
+            headline = _marked(headline) if headline is not None else _highlight(obj.notes, query)
+        else:
+            title, url, headline = obj.name, obj.trip.get_absolute_url(), escape(obj.trip.title)
+        title_headline = getattr(obj, "title_headline", None)
+        results.append({
+            "kind": kind,
+            "object": obj,
+            "url": url,
+            "title": _marked(title_headline) if title_headline else _highlight(title, query),
+            "headline": headline,
+            "rank": rank,
+        })
+    return results
+
+
+def search_page(user, query, page_number=1):
+    """
+    Returns a page of the user's trips and destinations matching the query.
+
+    `page.object_list` is a list of result dicts with the matched `object`,
+    its `kind`, `url`, highlighted `title` and `headline`, and `rank`.
+    """
+    paginator = Paginator(_ranked(user, query), PAGE_SIZE)
+    page = paginator.get_page(page_number)
+    page.object_list = _results(list(page.object_list), query)
+    return page
@@ -0,0 +1,108 @@
+"""
+Public, read-only pages of shared trips.
+
+A shared page looks the same to everyone, so it is rendered once without
+the request (no user, CSRF token or messages) and kept whole in the cache.
+Responses are `Cache-Control: public` and tagged with a surrogate key per
+trip, so browsers and a CDN in front of the site can keep them too. A much
+viewed trip is then served without touching the database.
+
+Changes to a trip or its destinations purge its page from the cache, and
+from the CDN if `SHARED_PAGE_PURGE_URL` is set. Purges run when the
+transaction commits; purging earlier would let a concurrent request cache
+the page again from the old data. Bulk updates that bypass signals call
+`purge_shared_pages` themselves.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+
+from config.startup import lazy_import
+from tasks.registry import task
+
+from .geo import points_svg
+from .models import Trip
+from .stats import trip_route
+
+requests = lazy_import("requests")
+
+# seconds to remember that there is no public trip at a slug
+MISSING_TIMEOUT = 60
+# tags every shared page, to purge them all (e.g. after changing the template)
+ALL_PAGES_KEY = "shared-trips"
+
+
+def page_key(slug):
+    return f"shared-trip:{slug}"
+
+
+def surrogate_key(slug):
+    return f"trip-{slug}"
+
+
+def render_shared_page(slug):
+    """
+    Renders the page of the public trip at `slug` as a dict with its
+    `content` and `etag`, or returns an empty dict if there is none.
+    """
+    trip = Trip.objects.filter(slug=slug, public=True).select_related("owner").first()
+    if trip is None:
+        return {}
+    dests = list(trip.destination_set.order_by(F("start_time").asc(nulls_last=True), "pk"))
+    route = trip_route(trip)
+    points = [(d.latitude, d.longitude) for d in dests
+              if d.latitude is not None and d.longitude is not None]
+    content = render_to_string("trips/shared_trip.html", {
+        "trip": trip,
+        "destinations": dests,
+        "route_legs": route,
+        "route_distance_km": sum(leg["distance_km"] for leg in route),
+        "map_svg": points_svg(points, 400, 300).decode() if points else None,
+    }).encode()
+    return {"content": content, "etag": f'"{hashlib.md5(content).hexdigest()}"'}
+
+
+def get_shared_page(slug):
+    """The cached page of the public trip at `slug`, or None if there is none."""
+    page = cache.get(page_key(slug))
+    if page is None:
+        page = render_shared_page(slug)
+        cache.set(page_key(slug), page,
+                  settings.SHARED_PAGE_TIMEOUT if page else MISSING_TIMEOUT)
+    return page or None
+
+
+def patch_shared_headers(response, slug):
+    """Lets browsers and downstream caches keep a shared page."""
+    patch_cache_control(response, public=True, max_age=settings.SHARED_PAGE_MAX_AGE,
+                        s_maxage=settings.SHARED_PAGE_TIMEOUT)
+    response["Surrogate-Key"] = f"{surrogate_key(slug)} {ALL_PAGES_KEY}"
+
+
+@task(priority=1)
+def purge_cdn(keys):
+    """Purges the responses tagged with any of the surrogate `keys` from the CDN."""
+    response = requests.post(settings.SHARED_PAGE_PURGE_URL,
+                             headers={**settings.SHARED_PAGE_PURGE_HEADERS,
+                                      "Surrogate-Key": " ".join(keys)},
+                             timeout=(3.05, 10))
+    response.raise_for_status()
+
+
+def _purge(slugs):
+    cache.delete_many([page_key(slug) for slug in slugs])
+    if settings.SHARED_PAGE_PURGE_URL:
+        purge_cdn.enqueue([surrogate_key(slug) for slug in slugs])
+
+
+def purge_shared_pages(slugs, using=None):
+    """Purges the pages of trips by slug once the current transaction commits."""
+    slugs = sorted(set(slugs))
+    if slugs:
+        transaction.on_commit(lambda: _purge(slugs), using=using)
@@ -0,0 +1,54 @@
+"""
+Signal handlers for the trips app.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Trip, Destination
+from .nearby import sync_cached_index
+from .schedule import sync_cached_schedule
+from .search import update_search_vectors
+from .sharing import purge_shared_pages
+
+
+def _data_version(user_id):
+    return get_user_model().objects.filter(pk=user_id).values_list(
+        "data_version", flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Trip)
+def trip_changed(sender, instance, **kwargs):
+    get_user_model().bump_data_versions([instance.owner_id])
+    version = _data_version(instance.owner_id)
+    if version is not None:
+        sync_cached_index(instance.owner_id, version)
+        sync_cached_schedule(instance.owner_id, version)
+    # also when it was just unshared
+    purge_shared_pages([instance.slug])
+
+
+@receiver([post_save, post_delete], sender=Destination)
+def destination_changed(sender, instance, signal, **kwargs):
+    owner_id, slug, public, version = Trip.objects.filter(pk=instance.trip_id).values_list(
+        "owner_id", "slug", "public", "owner__data_version").first() or (None, None, False, None)
+    get_user_model().bump_data_versions([owner_id])
+    if version is not None:
+        # a concurrent bump makes this too low, which only drops the overlays
+        version += 1
+        deleted = signal is post_delete
+        sync_cached_index(owner_id, version, instance, slug, deleted=deleted)
+        sync_cached_schedule(owner_id, version, instance, deleted=deleted)
+    if public:
+        purge_shared_pages([slug])
+
+
+@receiver(post_save, sender=Trip)
+def trip_saved(sender, instance, **kwargs):
+    update_search_vectors(Trip.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Destination)
+def destination_saved(sender, instance, **kwargs):
+    update_search_vectors(Destination.objects.filter(pk=instance.pk))
@@ -0,0 +1,127 @@
+"""
+Route statistics for trips.
+
+A trip's route visits its located destinations in `start_time` order.
+Legs are computed with NumPy over whole coordinate arrays, so a user's
+trips are all handled in one query and one pass.
+"""
+
+import datetime
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F
+
+from .geo import EARTH_RADIUS_KM
+from .models import Destination
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance between arrays of points in km."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def _timestamps(values):
+    return np.array([v.timestamp() if v else np.nan for v in values], dtype=float)
+
+
+def route_destinations(queryset):
+    """Located destinations in route order (by trip, then start time)."""
+    return queryset.exclude(latitude=None).exclude(longitude=None).order_by(
+        "trip_id", F("start_time").asc(nulls_last=True), "pk")
+
+
+class RouteLegs:
+    """
+    The legs between consecutive destinations of one or more trips.
+
+    All attributes are arrays with one entry per leg: `trip_ids`,
+    `distance_km`, `gap_seconds` (from leaving one stop to arriving at the
+    next, NaN if unknown) and `speed_kmh` (NaN unless the gap is positive).
+    `origins` and `targets` index into `dest_ids`.
+    """
+
+    def __init__(self, rows):
+        """`rows` are (pk, trip_id, latitude, longitude, start_time, end_time)."""
+        pks, trip_ids, lats, lons, starts, ends = zip(*rows) if rows else ([],) * 6
+        self.dest_ids = np.array(pks, dtype=np.int64)
+        trip_ids = np.array(trip_ids, dtype=np.int64)
+        lats = np.array(lats, dtype=float)
+        lons = np.array(lons, dtype=float)
+        starts = _timestamps(starts)
+        ends = _timestamps(ends)
+
+        # consecutive rows form a leg only if they belong to the same trip
+        same_trip = trip_ids[1:] == trip_ids[:-1]
+        self.origins = np.flatnonzero(same_trip)
+        self.targets = self.origins + 1
+        self.trip_ids = trip_ids[self.origins]
+
+        self.distance_km = haversine_km(
+            lats[self.origins], lons[self.origins], lats[self.targets], lons[self.targets])
+        departures = np.where(np.isnan(ends), starts, ends)[self.origins]
+        self.gap_seconds = starts[self.targets] - departures
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.speed_kmh = np.where(
+                self.gap_seconds > 0, self.distance_km / (self.gap_seconds / 3600), np.nan)
+
+    def __len__(self):
+        return len(self.origins)
+
+    def totals(self):
+        """Returns {trip id: {"distance_km", "legs", "idle_hours"}}."""
+        if not len(self):
+            return {}
+        trips, index = np.unique(self.trip_ids, return_inverse=True)
+        distance = np.bincount(index, weights=self.distance_km)
+        legs = np.bincount(index)
+        idle = np.bincount(index, weights=np.where(self.gap_seconds > 0, self.gap_seconds, 0))
+        return {
+            int(trip): {
+                "distance_km": float(distance[i]),
+                "legs": int(legs[i]),
+                "idle_hours": float(idle[i] / 3600),
+            } for i, trip in enumerate(trips)
+        }
+
+
+def _rows(queryset):
+    return list(route_destinations(queryset).values_list(
+        "pk", "trip_id", "latitude", "longitude", "start_time", "end_time"))
+
+
+def user_route_totals(user):
+    """
+    Route totals for all of a user's trips, in a single query.
+
+    The totals are computed once per data version and cached, like the
+    trip cluster index.
+    """
+    version = user.read_data_version()
+    key = f"trips:route-totals:{user.pk}:{version}"
+    totals = cache.get(key) if version is not None else None
+    if totals is None:
+        totals = RouteLegs(_rows(Destination.objects.filter(trip__owner=user))).totals()
+        if version is not None:
+            cache.set(key, totals, CACHE_TIMEOUT)
+    return totals
+
+
+def trip_route(trip):
+    """Returns the legs of a trip's route as a list of dicts."""
+    dests = {dest.pk: dest for dest in route_destinations(trip.destination_set.all())}
+    legs = RouteLegs([(d.pk, d.trip_id, d.latitude, d.longitude, d.start_time, d.end_time)
+                      for d in dests.values()])
+    return [{
+        "origin": dests[int(legs.dest_ids[origin])],
+        "target": dests[int(legs.dest_ids[target])],
+        "distance_km": float(distance),
+        "gap": None if np.isnan(gap) else datetime.timedelta(seconds=float(gap)),
+        "speed_kmh": None if np.isnan(speed) else float(speed),
+    } for origin, target, distance, gap, speed in zip(
+        legs.origins, legs.targets, legs.distance_km, legs.gap_seconds, legs.speed_kmh)]
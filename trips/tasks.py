@@ -0,0 +1,12 @@
+"""
+Background tasks for the trips app, see tasks.registry.
+"""
+
+from tasks.registry import task
+
+from .geocoding import geocode_missing
+
+
+@task(priority=-1)
+def geocode_missing_destinations(limit=None):
+    geocode_missing(limit=limit)
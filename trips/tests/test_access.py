@@ -0,0 +1,149 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from ..access import get_trip
+from ..models import Collaborator, Trip, Destination
+from accounts.models import User
+
+
+class AccessTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner")
+        self.editor = User.objects.create(username="editor")
+        self.viewer = User.objects.create(username="viewer")
+        self.trip = Trip.objects.create(owner=self.owner, title="Lisbon")
+        Collaborator.objects.create(trip=self.trip, user=self.editor, role="editor")
+        Collaborator.objects.create(trip=self.trip, user=self.viewer, role="viewer")
+        self.dest = Destination.objects.create(trip=self.trip, name="Belem")
+
+    def test_with_access(self):
+        """
+        Annotates each user's role on a trip in a single query.
+        """
+        stranger = User.objects.create(username="stranger")
+        for user, role in [(self.owner, "owner"), (self.editor, "editor"),
+                           (self.viewer, "viewer"), (stranger, None), (AnonymousUser(), None)]:
+            with self.assertNumQueries(1):
+                trip = Trip.objects.with_access(user).get(pk=self.trip.pk)
+            self.assertEqual(trip.access_role, role)
+
+    def test_get_trip_once_per_request(self):
+        """
+        Repeated checks on one request share a single lookup.
+        """
+        request = RequestFactory().get("/")
+        request.user = self.viewer
+        with self.assertNumQueries(1):
+            trip = get_trip(request, self.trip.slug)
+            self.assertIs(get_trip(request, self.trip.slug), trip)
+
+    def test_viewer(self):
+        """
+        Viewers see the trip, but cannot change it.
+        """
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse("trips:trip-detail", args=[self.trip.slug]))
+        self.assertContains(response, "Belem")
+        self.assertNotContains(response, "Edit this destination")
+        self.assertEqual(self.client.get(
+            reverse("trips:trip-map", args=[self.trip.slug])).status_code, 200)
+
+        for url in [reverse("trips:edit-trip", args=[self.trip.slug]),
+                    reverse("trips:create-dest-with-trip", args=[self.trip.slug]),
+                    reverse("trips:edit-dest", args=[self.trip.slug, self.dest.pk])]:
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_editor_sees_owner_conflicts(self):
+        """
+        Stops an editor saves are checked against the trip owner's schedule.
+        """
+        Destination.objects.create(trip=self.trip, name="Museum",
+                                   start_time="2025-03-01 10:00Z", end_time="2025-03-01 12:00Z")
+        self.client.force_login(self.editor)
+        response = self.client.post(
+            reverse("trips:edit-dest", args=[self.trip.slug, self.dest.pk]),
+            {"trip": self.trip.pk, "name": "Belem", "start_time": "2025-03-01 11:00Z"},
+            follow=True)
+        self.assertContains(response, "Belem overlaps Museum (Lisbon)")
+
+    def test_editor(self):
+        """
+        Editors change the trip and its destinations, but cannot delete or publish it.
+        """
+        self.client.force_login(self.editor)
+        response = self.client.post(reverse("trips:edit-dest", args=[self.trip.slug, self.dest.pk]),
+                                    {"trip": self.trip.pk, "name": "Alfama"})
+        self.assertRedirects(response, reverse("trips:trip-detail", args=[self.trip.slug]))
+        self.dest.refresh_from_db()
+        self.assertEqual(self.dest.name, "Alfama")
+
+        response = self.client.get(reverse("trips:edit-trip", args=[self.trip.slug]))
+        self.assertNotIn("public", response.context["form"].fields)
+        response = self.client.get(reverse("trips:delete-trip", args=[self.trip.slug]))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(reverse("trips:profile"))
+        self.assertContains(response, "Shared with me")
+        self.assertContains(response, "Lisbon")
+
+
+class CollaboratorViewTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner")
+        self.trip = Trip.objects.create(owner=self.owner, title="Lisbon")
+        self.url = reverse("trips:trip-collaborators", args=[self.trip.slug])
+        self.client.force_login(self.owner)
+
+    def test_listing_paginated(self):
+        """
+        Lists collaborators a page at a time, with a constant number of queries.
+        """
+        users = User.objects.bulk_create(User(username=f"user{i:03}") for i in range(120))
+        Collaborator.objects.bulk_create(Collaborator(trip=self.trip, user=user) for user in users)
+
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context["collaborators"]), 50)
+        self.assertContains(response, "user000")
+        self.assertContains(response, "Page 1 of 3")
+
+        response = self.client.get(self.url + "?page=3")
+        self.assertContains(response, "user119")
+
+    def test_add_and_remove(self):
+        """
+        The owner shares the trip, changes roles and stops sharing it.
+        """
+        friend = User.objects.create(username="friend")
+        add_url = reverse("trips:add-collaborator", args=[self.trip.slug])
+        response = self.client.post(add_url, {"username": "friend", "role": "viewer"})
+        self.assertRedirects(response, self.url)
+        self.client.post(add_url, {"username": "friend", "role": "editor"})
+        collaborator = Collaborator.objects.get(trip=self.trip, user=friend)
+        self.assertEqual(collaborator.role, "editor")
+
+        response = self.client.post(add_url, {"username": "nobody", "role": "viewer"})
+        self.assertContains(response, "No user with this username.")
+
+        response = self.client.post(
+            reverse("trips:remove-collaborator", args=[self.trip.slug, collaborator.pk]))
+        self.assertRedirects(response, self.url)
+        self.assertFalse(Collaborator.objects.exists())
+
+    def test_only_owner_manages(self):
+        """
+        Collaborators see the listing, but cannot add or remove anyone.
+        """
+        editor = User.objects.create(username="editor")
+        collaborator = Collaborator.objects.create(trip=self.trip, user=editor, role="editor")
+        self.client.force_login(editor)
+
+        self.assertContains(self.client.get(self.url), "editor (Editor)")
+        response = self.client.post(reverse("trips:add-collaborator", args=[self.trip.slug]),
+                                    {"username": "editor", "role": "viewer"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            reverse("trips:remove-collaborator", args=[self.trip.slug, collaborator.pk]))
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(Collaborator.objects.exists())
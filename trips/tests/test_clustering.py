@@ -0,0 +1,66 @@
+from django.test import SimpleTestCase
+
+from ..clustering import ClusterIndex, MAX_ZOOM
+from ..geo import BBox
+
+
+class ClusterIndexTests(SimpleTestCase):
+    def setUp(self):
+        # a dense group around Houston plus one far away point
+        self.points = [
+            (-95.36 + i * 0.001, 29.76 + i * 0.001, {"title": f"houston {i}"})
+            for i in range(50)
+        ]
+        self.points.append((139.65, 35.68, {"title": "tokyo"}))
+        self.index = ClusterIndex(self.points)
+
+    def test_low_zoom_clusters(self):
+        """
+        Nearby points are clustered at low zoom levels.
+        """
+        features = self.index.get_clusters(0)
+        self.assertEqual(len(features), 2)
+        counts = sorted(f["properties"].get("point_count", 1) for f in features)
+        self.assertEqual(counts, [1, 50])
+
+    def test_max_zoom_points(self):
+        """
+        Past the maximum zoom, every point is returned with its properties.
+        """
+        features = self.index.get_clusters(MAX_ZOOM + 5)
+        self.assertEqual(len(features), len(self.points))
+        self.assertIn({"title": "tokyo"}, [f["properties"] for f in features])
+
+    def test_counts_are_preserved(self):
+        """
+        Every zoom level accounts for every point.
+        """
+        for zoom in range(MAX_ZOOM + 2):
+            features = self.index.get_clusters(zoom)
+            total = sum(f["properties"].get("point_count", 1) for f in features)
+            self.assertEqual(total, len(self.points))
+
+    def test_bbox(self):
+        """
+        Only clusters inside the bbox are returned.
+        """
+        features = self.index.get_clusters(0, BBox(100, 0, 150, 50))
+        self.assertEqual([f["properties"] for f in features], [{"title": "tokyo"}])
+
+    def test_bounds(self):
+        """
+        The index records the bounds of all points.
+        """
+        west, south, east, north = self.index.bbox
+        self.assertAlmostEqual(west, -95.36)
+        self.assertAlmostEqual(south, 29.76)
+        self.assertAlmostEqual(east, 139.65)
+        self.assertAlmostEqual(north, 35.68)
+
+    def test_empty(self):
+        """
+        An index of no points has no clusters.
+        """
+        index = ClusterIndex([])
+        self.assertIsNone(index.bbox)
+        self.assertEqual(index.get_clusters(3), [])
@@ -0,0 +1,134 @@
+import datetime
+import math
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..dedup import find_duplicate_groups, merge_destinations, normalize_name
+from ..models import Trip, Destination
+from accounts.models import User
+
+
+class FindDuplicateGroupsTests(SimpleTestCase):
+    def test_normalize_name(self):
+        """
+        Names are compared without case, accents or punctuation.
+        """
+        self.assertEqual(normalize_name("  Café   de Flore! "), "cafe de flore")
+
+    def test_groups_close_similar_names(self):
+        """
+        Nearby destinations with similar names are grouped.
+        """
+        rows = [
+            (1, "Eiffel Tower", 48.85837, 2.29448),
+            (2, "eiffel tower.", 48.85850, 2.29460),
+            (3, "Eifel Tower", 48.85830, 2.29500),
+            (4, "Louvre", 48.86061, 2.33764),
+            (5, "Eiffel Tower", 48.86061, 2.33764),
+        ]
+        self.assertEqual(find_duplicate_groups(rows), [[1, 2, 3]])
+
+    def test_many_copies_grouped(self):
+        """
+        Many copies of one place are grouped without comparing each pair.
+        """
+        rows = [(pk, "Eiffel Tower", 48.85837, 2.29448) for pk in range(2000)]
+        rows.append((2000, "Eiffel Tower.", 48.85840, 2.29450))
+        with mock.patch("trips.dedup.math.dist", wraps=math.dist) as dist:
+            self.assertEqual(find_duplicate_groups(rows), [list(range(2001))])
+        self.assertLess(dist.call_count, 5000)
+
+    def test_same_cube_too_far(self):
+        """
+        Destinations with the same name in one cube are not grouped if they
+        are too far apart.
+        """
+        # about 200 m apart, across the diagonal of a 150 m cube
+        rows = [(1, "Cafe", 48.8527, 2.2927), (2, "Cafe", 48.8539, 2.2947)]
+        self.assertEqual(find_duplicate_groups(rows), [])
+        self.assertEqual(find_duplicate_groups(rows, distance_m=250), [[1, 2]])
+
+    def test_different_names_not_grouped(self):
+        """
+        Destinations at the same place with different names are not grouped.
+        """
+        rows = [
+            (1, "Central Station", 52.37894, 4.90004),
+            (2, "Station Cafe", 52.37894, 4.90004),
+        ]
+        self.assertEqual(find_duplicate_groups(rows), [])
+
+    def test_groups_across_antimeridian(self):
+        """
+        Duplicates are found on both sides of the antimeridian.
+        """
+        rows = [
+            (1, "Dateline Marker", -16.5, 179.9995),
+            (2, "Dateline Marker", -16.5, -179.9995),
+        ]
+        self.assertEqual(find_duplicate_groups(rows), [[1, 2]])
+
+    def test_empty(self):
+        """
+        No rows give no groups.
+        """
+        self.assertEqual(find_duplicate_groups([]), [])
+
+
+class MergeDestinationsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="my-user")
+        self.trip = Trip.objects.create(owner=self.user, title="trip")
+        self.other_trip = Trip.objects.create(owner=self.user, title="other trip")
+        self.keep = Destination.objects.create(
+            trip=self.trip, name="Eiffel Tower", latitude=48.85837, longitude=2.29448)
+        self.start = timezone.make_aware(datetime.datetime(2024, 5, 1, 10))
+        self.duplicate = Destination.objects.create(
+            trip=self.other_trip, name="eiffel tower", latitude=48.8584, longitude=2.2945,
+            start_time=self.start)
+        self.elsewhere = Destination.objects.create(
+            trip=self.trip, name="Louvre", latitude=48.86061, longitude=2.33764)
+
+    def test_merge_fills_and_deletes(self):
+        """
+        Merging fills empty fields of the kept destination and deletes the rest.
+        """
+        merge_destinations(self.keep, [self.duplicate])
+        self.keep.refresh_from_db()
+        self.assertEqual(self.keep.start_time, self.start)
+        self.assertEqual(self.keep.latitude, 48.85837)
+        self.assertFalse(Destination.objects.filter(pk=self.duplicate.pk).exists())
+
+    def test_duplicates_page(self):
+        """
+        The duplicates page lists the user's groups of likely duplicates.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("trips:dest-duplicates"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["duplicate_groups"], [[self.keep, self.duplicate]])
+        self.assertNotContains(response, "Louvre")
+
+    def test_merge_view(self):
+        """
+        The merge view merges the chosen destinations and redirects.
+        """
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("trips:merge-dests"), {
+            "keep": self.keep.pk, "merge": [self.keep.pk, self.duplicate.pk]})
+        self.assertRedirects(response, reverse("trips:dest-duplicates"))
+        self.assertTrue(Destination.objects.filter(pk=self.keep.pk).exists())
+        self.assertFalse(Destination.objects.filter(pk=self.duplicate.pk).exists())
+
+    def test_merge_view_other_user(self):
+        """
+        Users cannot merge destinations they do not own.
+        """
+        self.client.force_login(User.objects.create(username="other-user"))
+        response = self.client.post(reverse("trips:merge-dests"), {
+            "keep": self.keep.pk, "merge": [self.duplicate.pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Destination.objects.filter(pk=self.duplicate.pk).exists())
@@ -0,0 +1,108 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..deletion import delete_account, delete_trips
+from ..models import Trip, Destination
+from accounts.models import User
+
+
+class DeletionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="my-user")
+        self.trips = [Trip.objects.create(owner=self.user, title=f"trip {i}") for i in range(3)]
+        Destination.objects.bulk_create(
+            Destination(trip=trip, name=f"dest {i}") for trip in self.trips for i in range(5))
+        self.other_user = User.objects.create(username="other-user")
+        self.other_trip = Trip.objects.create(owner=self.other_user, title="other trip")
+        Destination.objects.create(trip=self.other_trip, name="other dest")
+
+    def test_delete_trips_in_batches(self):
+        """
+        Deletes trips and their destinations in batches, reporting progress.
+        """
+        progress = []
+        counts = delete_trips(
+            Trip.objects.filter(pk__in=[t.pk for t in self.trips[:2]]), batch_size=4,
+            progress=lambda model, deleted: progress.append((model.__name__, deleted)))
+        self.assertEqual(counts, {"trips.Destination": 10, "trips.Trip": 2})
+        self.assertEqual(progress, [("Destination", 4), ("Destination", 8),
+                                    ("Destination", 10), ("Trip", 2)])
+        self.assertQuerySetEqual(Trip.objects.order_by("pk"), [self.trips[2], self.other_trip])
+        self.assertEqual(Destination.objects.count(), 6)
+
+    def test_interrupted_purge_rolls_back(self):
+        """
+        Nothing stays deleted after an interruption, and the purge can be run
+        again.
+        """
+        def interrupt(model, deleted):
+            raise KeyboardInterrupt
+
+        trips = Trip.objects.filter(owner=self.user)
+        with self.assertRaises(KeyboardInterrupt):
+            delete_trips(trips, batch_size=4, progress=interrupt)
+        self.assertEqual(Destination.objects.filter(trip__owner=self.user).count(), 15)
+
+        counts = delete_trips(trips, batch_size=4, progress=lambda model, deleted: None)
+        self.assertEqual(counts, {"trips.Destination": 15, "trips.Trip": 3})
+
+    def test_removes_cached_files(self):
+        """
+        The thumbnails and tiles cached for deleted trips and accounts are
+        removed once the deletion commits.
+        """
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(
+                THUMBNAIL_CACHE_DIR=os.path.join(cache_dir, "thumbnails"),
+                TILE_CACHE_DIR=os.path.join(cache_dir, "tiles")):
+            dirs = {name: os.path.join(cache_dir, *name.split(":")) for name in (
+                f"thumbnails:{self.trips[0].pk}", f"thumbnails:{self.trips[1].pk}",
+                f"thumbnails:{self.other_trip.pk}", f"tiles:{self.user.pk}",
+                f"tiles:{self.other_user.pk}")}
+            for path in dirs.values():
+                os.makedirs(os.path.join(path, "1"))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                delete_trips(Trip.objects.filter(pk=self.trips[0].pk))
+            self.assertEqual({name for name, path in dirs.items() if os.path.exists(path)},
+                             set(dirs) - {f"thumbnails:{self.trips[0].pk}",
+                                          f"tiles:{self.user.pk}"})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                delete_account(self.user)
+            self.assertEqual({name for name, path in dirs.items() if os.path.exists(path)},
+                             {f"thumbnails:{self.other_trip.pk}", f"tiles:{self.other_user.pk}"})
+
+    def test_delete_trips_bumps_data_version(self):
+        """
+        Deleting trips bumps their owner's data version.
+        """
+        version = User.objects.get(pk=self.user.pk).data_version
+        delete_trips(Trip.objects.filter(pk=self.trips[0].pk))
+        self.assertEqual(User.objects.get(pk=self.user.pk).data_version, version + 1)
+
+    def test_delete_account(self):
+        """
+        Deletes a user with their trips, destinations and group memberships.
+        """
+        self.user.groups.add(Group.objects.create(name="travellers"))
+        counts = delete_account(self.user)
+        self.assertEqual(counts["accounts.User"], 1)
+        self.assertEqual(counts["trips.Destination"], 15)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertQuerySetEqual(Trip.objects.all(), [self.other_trip])
+        self.assertEqual(Destination.objects.count(), 1)
+        self.assertEqual(User.groups.through.objects.count(), 0)
+
+    def test_delete_account_view(self):
+        """
+        The delete account view removes everything the user owns and logs out.
+        """
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("accounts:delete"))
+        self.assertRedirects(response, reverse("accounts:login"))
+        self.assertEqual(Destination.objects.count(), 1)
+        self.assertNotIn("_auth_user_id", self.client.session)
@@ -0,0 +1,84 @@
+from django.test import SimpleTestCase
+
+from ..geo import BBox, CELL_LEVEL, cell_id, cell_ranges, haversine_km
+
+
+class BBoxTests(SimpleTestCase):
+    def test_parse(self):
+        """
+        parse() reads a west,south,east,north string.
+        """
+        bbox = BBox.parse("-10.5,-20,30,40")
+        self.assertEqual((bbox.west, bbox.south, bbox.east, bbox.north),
+                         (-10.5, -20, 30, 40))
+
+    def test_parse_invalid(self):
+        """
+        parse() rejects malformed or out of range boxes.
+        """
+        for value in ["", "1,2,3", "a,b,c,d", "0,10,10,0", "0,-100,10,0", "nan,0,10,10",
+                      "-inf,0,0,10"]:
+            with self.assertRaises(ValueError):
+                BBox.parse(value)
+
+    def test_parse_wrapped_longitudes(self):
+        """
+        parse() wraps longitudes beyond ±180, as mapbox-gl reports them.
+        """
+        bbox = BBox.parse("170,-10,190,10")
+        self.assertEqual((bbox.west, bbox.east), (170, -170))
+        self.assertTrue(bbox.crosses_antimeridian)
+        bbox = BBox.parse("-400,-80,300,80")
+        self.assertEqual((bbox.west, bbox.east), (-180, 180))
+
+    def test_split_across_antimeridian(self):
+        """
+        split() breaks a box that wraps the antimeridian into two.
+        """
+        west, east = BBox(170, -10, -170, 10).split()
+        self.assertEqual((west.west, west.east), (170, 180))
+        self.assertEqual((east.west, east.east), (-180, -170))
+
+    def test_around(self):
+        """
+        around() returns a box containing the circle.
+        """
+        bbox = BBox.around(0, 0, 111.2)
+        self.assertAlmostEqual(bbox.north, 1, places=2)
+        self.assertAlmostEqual(bbox.east, 1, places=2)
+
+        bbox = BBox.around(0, 179.5, 111.2)
+        self.assertTrue(bbox.crosses_antimeridian)
+
+        bbox = BBox.around(89.5, 0, 111.2)
+        self.assertEqual((bbox.west, bbox.east, bbox.north), (-180, 180, 90))
+
+
+class CellTests(SimpleTestCase):
+    def test_cell_ranges_cover_points(self):
+        """
+        The cell ranges for a box include the cells of the points inside it.
+        """
+        bbox = BBox(-100, 25, -90, 35)
+        ranges = cell_ranges(bbox)
+        for lat, lon in [(25, -100), (35, -90), (29.76, -95.36)]:
+            cell = cell_id(lat, lon)
+            self.assertTrue(any(low <= cell <= high for low, high in ranges))
+
+    def test_cell_ranges_are_few(self):
+        """
+        A box is covered by a bounded number of ranges.
+        """
+        self.assertLessEqual(len(cell_ranges(BBox(-180, -90, 180, 90))), 16)
+        self.assertEqual(cell_ranges(BBox(-180, -90, 180, 90)),
+                         [(0, (1 << 2 * CELL_LEVEL) - 1)])
+
+
+class HaversineTests(SimpleTestCase):
+    def test_haversine_km(self):
+        """
+        haversine_km() returns the great-circle distance.
+        """
+        self.assertAlmostEqual(
+            haversine_km(29.76328, -95.36327, 30.26715, -97.74306), 235.4, delta=1)
+        self.assertAlmostEqual(haversine_km(0, 179.5, 0, -179.5), 111.2, delta=0.1)
@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..geocoding import GeocoderError, geocode_missing
+from ..models import Trip, Destination, GeocodedName
+from accounts.models import User
+from tasks.models import Task
+
+
+class StubGeocoder:
+    """Answers lookups from a dict, recording every query."""
+    places = {
+        "eiffel tower": (48.85837, 2.29448),
+        "louvre": (48.86061, 2.33764),
+    }
+    queries = []
+
+    def geocode(self, query):
+        self.queries.append(query)
+        if query == "flaky":
+            raise GeocoderError("timed out")
+        if query == "broken":
+            raise KeyError("features")
+        return self.places.get(query)
+
+
+@override_settings(GEOCODER_BACKEND="trips.tests.test_geocoding.StubGeocoder")
+class GeocodeMissingTests(TestCase):
+    def setUp(self):
+        StubGeocoder.queries = []
+        self.user = User.objects.create(username="my-user")
+        self.other_user = User.objects.create(username="other-user")
+        trip = Trip.objects.create(owner=self.user, title="trip")
+        other_trip = Trip.objects.create(owner=self.other_user, title="other trip")
+        self.tower = Destination.objects.create(trip=trip, name="Eiffel Tower")
+        self.other_tower = Destination.objects.create(trip=other_trip, name=" eiffel tower")
+        self.louvre = Destination.objects.create(trip=trip, name="Louvre")
+        self.nowhere = Destination.objects.create(trip=trip, name="Nowhere")
+        self.located = Destination.objects.create(
+            trip=trip, name="Louvre", latitude=1, longitude=2)
+
+    def test_geocodes_each_name_once(self):
+        """
+        Identical names of all users share one lookup.
+        """
+        version = User.objects.get(pk=self.user.pk).data_version
+        counts = geocode_missing(batch_size=2, concurrency=2, rate=0)
+        self.assertEqual(sorted(StubGeocoder.queries), ["eiffel tower", "louvre", "nowhere"])
+        self.assertEqual(counts, {"looked_up": 3, "found": 2, "failed": 0, "destinations": 3})
+
+        self.tower.refresh_from_db()
+        self.other_tower.refresh_from_db()
+        self.assertEqual((self.tower.latitude, self.tower.longitude), (48.85837, 2.29448))
+        self.assertEqual(self.other_tower.latitude, 48.85837)
+        self.assertIsNotNone(self.tower.cell)
+        self.located.refresh_from_db()
+        self.assertEqual(self.located.latitude, 1)
+        self.assertGreater(User.objects.get(pk=self.user.pk).data_version, version)
+
+    def test_resumes(self):
+        """
+        Names looked up by an earlier run are not looked up again.
+        """
+        geocode_missing(limit=2, rate=0)
+        self.assertEqual(StubGeocoder.queries, ["eiffel tower", "louvre"])
+        counts = geocode_missing(rate=0)
+        self.assertEqual(StubGeocoder.queries, ["eiffel tower", "louvre", "nowhere"])
+        self.assertEqual(counts["looked_up"], 1)
+
+        geocode_missing(rate=0)
+        self.assertEqual(len(StubGeocoder.queries), 3)
+        self.assertTrue(GeocodedName.objects.filter(query="nowhere", latitude=None).exists())
+
+    def test_cached_results_applied(self):
+        """
+        New destinations with a name found before get coordinates without a lookup.
+        """
+        geocode_missing(rate=0)
+        louvre = Destination.objects.create(trip=self.louvre.trip, name="LOUVRE")
+        StubGeocoder.queries = []
+        counts = geocode_missing(rate=0)
+        louvre.refresh_from_db()
+        self.assertEqual(louvre.latitude, 48.86061)
+        self.assertEqual(StubGeocoder.queries, [])
+        self.assertEqual(counts["destinations"], 1)
+
+    def test_failed_lookups_retried(self):
+        """
+        Names whose lookup failed are tried again on the next run.
+        """
+        Destination.objects.create(trip=self.louvre.trip, name="flaky")
+        with self.assertLogs("trips.geocoding", "WARNING"):
+            counts = geocode_missing(rate=0)
+        self.assertEqual(counts["failed"], 1)
+        self.assertFalse(GeocodedName.objects.filter(query="flaky").exists())
+        with self.assertLogs("trips.geocoding", "WARNING"):
+            geocode_missing(rate=0)
+        self.assertEqual(StubGeocoder.queries.count("flaky"), 2)
+
+    def test_unexpected_errors_logged(self):
+        """
+        An unexpected error looking up one name is logged and the run goes on.
+        """
+        Destination.objects.create(trip=self.louvre.trip, name="broken")
+        with self.assertLogs("trips.geocoding", "ERROR"):
+            counts = geocode_missing(rate=0)
+        self.assertEqual(counts, {"looked_up": 3, "found": 2, "failed": 1, "destinations": 3})
+        self.assertFalse(GeocodedName.objects.filter(query="broken").exists())
+
+    def test_command(self):
+        """
+        The command geocodes destinations and reports progress, or queues a task.
+        """
+        out = StringIO()
+        call_command("geocode_destinations", "--rate", "0", stdout=out)
+        self.assertIn("3 names looked up, 2 found", out.getvalue())
+
+        call_command("geocode_destinations", "--enqueue", stdout=StringIO())
+        self.assertEqual(Task.objects.get().name,
+                         "trips.tasks.geocode_missing_destinations")
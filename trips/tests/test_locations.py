@@ -0,0 +1,250 @@
+import json
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from requests import Response as r_Response
+from requests.exceptions import ConnectTimeout, RequestException
+
+from ..breaker import CircuitBreaker, mapbox
+from ..locations import (
+    FRESH_SECONDS, MAX_STALE_SECONDS, LocationSearchError, _cache_key, refresh_locations,
+    search_locations)
+from ..models import Trip, Destination, GeocodedName
+from ..throttle import TokenBucket, metrics, search_superseded, throttle_search
+from .test_views import get_sample_file
+from accounts.models import User
+from tasks.models import Task
+from tasks.worker import run_pending
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+
+    def test_opens_after_failures(self):
+        """
+        The circuit opens after consecutive failures; a success resets the count.
+        """
+        self.breaker.record_failure()
+        self.breaker.record(0.1)
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record(5)  # too slow
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_probe(self):
+        """
+        Once the circuit has been open long enough, a single probe is let through.
+        """
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with mock.patch("trips.breaker.time.time", return_value=time.time() + 31):
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+
+            self.breaker.record_failure()
+            self.assertFalse(self.breaker.allow())
+        with mock.patch("trips.breaker.time.time", return_value=time.time() + 62):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_success()
+            self.assertTrue(self.breaker.allow())
+            self.assertTrue(self.breaker.allow())
+
+    @override_settings(CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "test_cache"}})
+    def test_shared_between_processes(self):
+        """
+        With a shared cache, as in production, every process sees the circuit open.
+        """
+        call_command("createcachetable", database="default")
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        # a separate client, like the cache of another web process
+        other = caches.create_connection("default")
+        self.assertGreater(other.get("breaker:test:open-until"), time.time())
+
+
+@mock.patch("trips.locations.requests", spec=True)
+@mock.patch.dict("os.environ", {"MAPBOX_ACCESS_TOKEN": "token"})
+class SearchLocationsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="my-user")
+        trip = Trip.objects.create(owner=self.user, title="Paris")
+        Destination.objects.create(trip=trip, name="Nemo cafe", latitude=1, longitude=2)
+        Destination.objects.create(trip=trip, name="Nemo bar")
+        other_trip = Trip.objects.create(
+            owner=User.objects.create(username="other-user"), title="Other")
+        Destination.objects.create(trip=other_trip, name="Nemo club", latitude=3, longitude=4)
+        GeocodedName.objects.create(query="nemo museum", latitude=5, longitude=6)
+
+    def ok_response(self):
+        response = r_Response()
+        response.status_code = 200
+        with open(get_sample_file("mapbox_search_box_response.json")) as f:
+            response.json = mock.MagicMock(return_value=json.load(f))
+        return response
+
+    def test_fresh_results_cached(self, mock_requests):
+        """
+        A repeated search is answered from the cache.
+        """
+        mock_requests.get.return_value = self.ok_response()
+        results, stale = search_locations(self.user, "nemo")
+        self.assertEqual(len(results), 5)
+        self.assertFalse(stale)
+
+        self.assertEqual(search_locations(self.user, " Nemo "), (results, False))
+        mock_requests.get.assert_called_once()
+
+    def test_stale_results_refreshed(self, mock_requests):
+        """
+        Stale results are served at once and refreshed by a single background task.
+        """
+        mock_requests.get.return_value = self.ok_response()
+        cache.set(_cache_key("nemo"), {
+            "results": ["old"], "fetched_at": time.time() - FRESH_SECONDS - 1})
+
+        self.assertEqual(search_locations(self.user, "nemo"), (["old"], True))
+        self.assertEqual(search_locations(self.user, "nemo"), (["old"], True))
+        mock_requests.get.assert_not_called()
+        self.assertEqual(Task.objects.get().name, refresh_locations.task_name)
+
+        run_pending()
+        results, stale = search_locations(self.user, "nemo")
+        self.assertEqual(len(results), 5)
+        self.assertFalse(stale)
+        mock_requests.get.assert_called_once()
+
+    def test_stale_refreshed_by_worker(self, mock_requests):
+        """
+        A refresh queued by a search is run by the task worker.
+        """
+        mock_requests.get.return_value = self.ok_response()
+        cache.set(_cache_key("nemo"), {
+            "results": [], "fetched_at": time.time() - FRESH_SECONDS - 1})
+        self.client.force_login(self.user)
+        url = reverse("trips:search-loc")
+
+        response = self.client.post(url, {"location": "nemo"})
+        self.assertContains(response, "out of date")
+        call_command("taskworker", "--once", stdout=StringIO())
+        self.assertEqual(Task.objects.get().status, Task.Status.DONE)
+
+        response = self.client.post(url, {"location": "nemo"})
+        self.assertNotContains(response, "out of date")
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_long_stale_searched_again(self, mock_requests):
+        """
+        Results stale for too long are not served while waiting on a refresh.
+        """
+        mock_requests.get.return_value = self.ok_response()
+        cache.set(_cache_key("nemo"), {
+            "results": ["old"], "fetched_at": time.time() - MAX_STALE_SECONDS - 1})
+
+        results, stale = search_locations(self.user, "nemo")
+        self.assertEqual(len(results), 5)
+        self.assertFalse(stale)
+        self.assertFalse(Task.objects.exists())
+
+    def test_open_circuit_serves_local(self, mock_requests):
+        """
+        While the circuit is open, searches are answered from the user's places.
+        """
+        for _ in range(mapbox.failure_threshold):
+            mapbox.record_failure()
+
+        results, stale = search_locations(self.user, "nemo")
+        self.assertTrue(stale)
+        self.assertEqual([r["name"] for r in results], ["Nemo cafe", "nemo museum"])
+        mock_requests.get.assert_not_called()
+
+    def test_timeout_falls_back(self, mock_requests):
+        """
+        A timed out search is answered from the user's places, or errors if none match.
+        """
+        mock_requests.RequestException = RequestException
+        mock_requests.get.side_effect = ConnectTimeout("timed out")
+
+        results, stale = search_locations(self.user, "cafe")
+        self.assertEqual(results, [
+            {"name": "Nemo cafe", "place": "Paris", "latitude": 1, "longitude": 2}])
+        self.assertTrue(stale)
+
+        with self.assertRaisesMessage(LocationSearchError, "timed out"):
+            search_locations(self.user, "louvre")
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="my-user")
+        self.other_user = User.objects.create(username="other-user")
+
+    def test_token_bucket(self):
+        """
+        A bucket allows a burst, then refills at its rate.
+        """
+        bucket = TokenBucket("test", rate=2, burst=3)
+        now = time.time()
+        with mock.patch("trips.throttle.time.time", return_value=now):
+            self.assertEqual([bucket.take() for _ in range(3)], [0, 0, 0])
+            self.assertAlmostEqual(bucket.take(), 0.5)
+            self.assertEqual(bucket.take("other"), 0)
+        with mock.patch("trips.throttle.time.time", return_value=now + 1):
+            self.assertEqual([bucket.take() for _ in range(2)], [0, 0])
+            self.assertGreater(bucket.take(), 0)
+
+    @override_settings(LOCATION_SEARCH_USER_RATE=(1, 2), LOCATION_SEARCH_GLOBAL_RATE=(1, 3))
+    def test_throttle_search(self):
+        """
+        Searches are limited per user and globally, and counted by outcome.
+        """
+        with mock.patch("trips.throttle.time.time", return_value=time.time()):
+            self.assertEqual(throttle_search(self.user), 0)
+            self.assertEqual(throttle_search(self.user), 0)
+            self.assertGreater(throttle_search(self.user), 0)
+            self.assertEqual(throttle_search(self.other_user), 0)
+            with self.assertLogs("trips.throttle", "WARNING"):
+                self.assertGreater(throttle_search(self.other_user), 0)
+        self.assertEqual(metrics(), {
+            "allowed": 3, "throttled_user": 1, "throttled_global": 1, "superseded": 0})
+        out = StringIO()
+        call_command("searchthrottle", stdout=out)
+        self.assertIn("throttled_global            1", out.getvalue())
+
+    @override_settings(CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "test_cache"}},
+        LOCATION_SEARCH_GLOBAL_RATE=(1, 3))
+    def test_global_bucket_shared_between_processes(self):
+        """
+        With a shared cache, as in production, the global bucket and the
+        counts are shared by every process.
+        """
+        call_command("createcachetable", database="default")
+        throttle_search(self.user)
+        # a separate client, like the cache of another web process
+        other = caches.create_connection("default")
+        tokens, _ = other.get("throttle:search-global:")
+        self.assertLess(tokens, 3)
+        self.assertEqual(other.get("throttle:metrics:allowed"), 1)
+
+    def test_search_superseded(self):
+        """
+        Searches sent before a user's latest one are superseded.
+        """
+        self.assertFalse(search_superseded(self.user, "2000"))
+        self.assertTrue(search_superseded(self.user, "1000"))
+        self.assertFalse(search_superseded(self.user, "2000"))
+        self.assertFalse(search_superseded(self.other_user, "1000"))
+        self.assertFalse(search_superseded(self.user, None))
+        self.assertEqual(metrics()["superseded"], 1)
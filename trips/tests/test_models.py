@@ -1,5 +1,6 @@
 from django.test import TestCase
 
+from ..geo import BBox, cell_id
 from ..models import Trip, Destination
 from accounts.models import User
 
@@ -51,3 +52,93 @@ class DestinationModelTests(TestCase):
         self.assertEqual(dest.longitude, -95.36327000)
         self.assertEqual(dest.start_time, "2025-01-01 12:01Z")
         self.assertIsNone(dest.end_time)
+
+    def test_destination_cell(self):
+        """
+        Saving a destination keeps its spatial index cell in sync with its
+        coordinates.
+        """
+        trip = Trip.objects.create(owner=User.objects.create(), title="trip")
+        dest = Destination.objects.create(trip=trip, name="test dest")
+        self.assertIsNone(dest.cell)
+
+        dest.latitude, dest.longitude = 29.76328, -95.36327
+        dest.save(update_fields=["latitude", "longitude"])
+        dest.refresh_from_db()
+        self.assertEqual(dest.cell, cell_id(29.76328, -95.36327))
+
+    def test_changes_bump_owner_data_version(self):
+        """
+        Saving or deleting a destination bumps its trip owner's data version.
+        """
+        user = User.objects.create()
+        trip = Trip.objects.create(owner=user, title="trip")
+        user.refresh_from_db()
+        version = user.data_version
+
+        dest = Destination.objects.create(trip=trip, name="test dest")
+        user.refresh_from_db()
+        self.assertGreater(user.data_version, version)
+        version = user.data_version
+
+        dest.delete()
+        user.refresh_from_db()
+        self.assertGreater(user.data_version, version)
+
+
+class DestinationQuerySetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="my-user")
+        trip = Trip.objects.create(owner=self.user, title="trip")
+        places = {
+            "houston": (29.76328, -95.36327),
+            "austin": (30.26715, -97.74306),
+            "tokyo": (35.6764, 139.65),
+            "fiji": (-17.7134, 178.065),
+            "samoa": (-13.759, -172.1046),
+            "nowhere": (None, None),
+        }
+        self.dests = {
+            name: Destination.objects.create(
+                trip=trip, name=name, latitude=lat, longitude=lon)
+            for name, (lat, lon) in places.items()
+        }
+
+    def test_in_bbox(self):
+        """
+        in_bbox() returns only destinations inside the box.
+        """
+        dests = Destination.objects.in_bbox(BBox(-100, 25, -90, 35))
+        self.assertQuerySetEqual(
+            dests, [self.dests["houston"], self.dests["austin"]], ordered=False)
+
+    def test_in_bbox_across_antimeridian(self):
+        """
+        in_bbox() handles boxes that wrap around the antimeridian.
+        """
+        dests = Destination.objects.in_bbox(BBox(170, -30, -160, 0))
+        self.assertQuerySetEqual(
+            dests, [self.dests["fiji"], self.dests["samoa"]], ordered=False)
+
+    def test_near(self):
+        """
+        near() returns destinations within the distance, with the distance.
+        """
+        dests = Destination.objects.near(29.76328, -95.36327, 250)
+        self.assertQuerySetEqual(
+            dests, [self.dests["houston"], self.dests["austin"]], ordered=False)
+        austin = dests.get(name="austin")
+        self.assertAlmostEqual(austin.distance, 235.4, delta=1)
+
+        dests = Destination.objects.near(29.76328, -95.36327, 100)
+        self.assertQuerySetEqual(dests, [self.dests["houston"]])
+
+    def test_near_across_antimeridian(self):
+        """
+        near() finds destinations on the other side of the antimeridian.
+        """
+        dests = Destination.objects.near(-17.7134, 179.9, 500)
+        self.assertQuerySetEqual(dests, [self.dests["fiji"]])
+        dests = Destination.objects.near(-15, -179.9, 1000)
+        self.assertQuerySetEqual(
+            dests, [self.dests["fiji"], self.dests["samoa"]], ordered=False)
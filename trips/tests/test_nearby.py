@@ -0,0 +1,151 @@
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..geo import haversine_km
+from ..models import Trip, Destination
+from ..nearby import KDTree, get_nearby_index, nearest_destinations, to_unit_vectors
+from accounts.models import User
+
+
+class KDTreeTests(SimpleTestCase):
+    def test_matches_brute_force(self):
+        """
+        The tree finds the same neighbors as comparing every point.
+        """
+        rng = np.random.default_rng(7)
+        points = to_unit_vectors(rng.uniform(-90, 90, 1000), rng.uniform(-180, 180, 1000))
+        tree = KDTree(points)
+        for point in points[:20] * 0.99:
+            d2, idx = tree.query(point, 5)
+            expected = np.argsort(((points - point) ** 2).sum(axis=1))[:5]
+            self.assertEqual(list(idx), list(expected))
+            self.assertTrue(np.all(np.diff(d2) >= 0))
+
+    def test_empty(self):
+        """
+        An empty tree returns no neighbors.
+        """
+        d2, idx = KDTree([]).query([1, 0, 0], 3)
+        self.assertEqual(len(idx), 0)
+
+
+class NearestDestinationsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="my-user")
+        self.trip = Trip.objects.create(owner=self.user, title="trip")
+        places = {
+            "houston": (29.76328, -95.36327),
+            "austin": (30.26715, -97.74306),
+            "tokyo": (35.6764, 139.65),
+            "fiji": (-17.7134, 178.065),
+        }
+        self.dests = {
+            name: Destination.objects.create(
+                trip=self.trip, name=name, latitude=lat, longitude=lon)
+            for name, (lat, lon) in places.items()
+        }
+        Destination.objects.create(trip=self.trip, name="nowhere")
+        other_trip = Trip.objects.create(owner=User.objects.create(), title="x")
+        Destination.objects.create(
+            trip=other_trip, name="someone else's", latitude=29.7, longitude=-95.3)
+
+    def get_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def names(self, results):
+        return [props["name"] for pk, lat, lon, km, props in results]
+
+    def test_nearest(self):
+        """
+        Returns the user's k nearest located destinations with distances.
+        """
+        results = nearest_destinations(self.get_user(), 29.7, -95.3, 2)
+        self.assertEqual(self.names(results), ["houston", "austin"])
+        pk, lat, lon, km, props = results[1]
+        self.assertEqual(pk, self.dests["austin"].pk)
+        self.assertAlmostEqual(km, haversine_km(29.7, -95.3, lat, lon), places=6)
+        self.assertEqual(props["trip"], self.trip.slug)
+
+    def test_nearest_across_antimeridian(self):
+        """
+        Distances wrap around the antimeridian.
+        """
+        results = nearest_destinations(self.get_user(), -17, -179.9, 1)
+        self.assertEqual(self.names(results), ["fiji"])
+
+    def test_index_patched_on_change(self):
+        """
+        Saving and deleting destinations patch the cached index instead of
+        rebuilding it.
+        """
+        get_nearby_index(self.get_user())
+
+        dallas = Destination.objects.create(
+            trip=self.trip, name="dallas", latitude=32.77667, longitude=-96.79699)
+        self.dests["austin"].latitude, self.dests["austin"].longitude = 40, -110
+        self.dests["austin"].save()
+        houston_pk = self.dests["houston"].pk
+        self.dests["houston"].delete()
+
+        user = self.get_user()
+        with self.assertNumQueries(0):
+            index, overlay = get_nearby_index(user)
+        self.assertEqual(len(index), 4)
+        self.assertEqual({pk for pk, _ in overlay.entries()}, {dallas.pk, self.dests["austin"].pk})
+        self.assertIn(houston_pk, overlay.removed)
+        results = nearest_destinations(self.get_user(), 29.7, -95.3, 2)
+        self.assertEqual(self.names(results), ["dallas", "austin"])
+        self.assertGreater(results[1][3], 1500)
+
+    def test_index_rebuilt_when_stale(self):
+        """
+        The index is rebuilt if it missed a change.
+        """
+        get_nearby_index(self.get_user())
+        Destination.objects.filter(name="houston").update(latitude=0, longitude=0)
+        User.bump_data_versions([self.user.pk])
+
+        results = nearest_destinations(self.get_user(), 29.7, -95.3, 1)
+        self.assertEqual(self.names(results), ["austin"])
+
+
+class NearbyDestinationsViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("trips:nearby-dests")
+        self.user = User.objects.create(username="myuser")
+        trip = Trip.objects.create(owner=self.user, title="trip")
+        Destination.objects.create(
+            trip=trip, name="nasa", latitude=29.5519, longitude=-95.0981)
+        self.client.force_login(self.user)
+
+    def test_nearby(self):
+        """
+        Returns the nearest destinations as GeoJSON.
+        """
+        response = self.client.get(self.url, {"latitude": 29.5, "longitude": -95})
+        features = response.json()["features"]
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]["geometry"]["coordinates"], [-95.0981, 29.5519])
+        self.assertEqual(features[0]["properties"]["name"], "nasa")
+        self.assertAlmostEqual(features[0]["properties"]["distance_km"], 11.1, delta=0.1)
+
+    def test_wraps_longitude(self):
+        """
+        Longitudes past the antimeridian are wrapped around.
+        """
+        response = self.client.get(self.url, {"latitude": 29.5, "longitude": 265})
+        [feature] = response.json()["features"]
+        self.assertAlmostEqual(feature["properties"]["distance_km"], 11.1, delta=0.1)
+
+    def test_bad_request_on_invalid_point(self):
+        """
+        Returns 400 if the point is missing or invalid.
+        """
+        for params in [{}, {"latitude": 1}, {"latitude": "a", "longitude": 1},
+                       {"latitude": 91, "longitude": 0}, {"latitude": 0, "longitude": "inf"}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
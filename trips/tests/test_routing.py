@@ -0,0 +1,178 @@
+import datetime
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..models import Trip, Destination
+from ..routing import distance_matrix, optimize_order, optimize_trip_route, route_length
+from accounts.models import User
+
+
+def at(day, hour=9):
+    return datetime.datetime(2025, 1, day, hour, tzinfo=datetime.timezone.utc)
+
+
+class OptimizeOrderTests(SimpleTestCase):
+    def test_orders_points_along_a_line(self):
+        """
+        Points along a line are visited in order from the first one.
+        """
+        lons = [0, 4, 1, 3, 2, 5]
+        order = optimize_order(distance_matrix([0] * len(lons), lons))
+        self.assertEqual([lons[i] for i in order], [0, 1, 2, 3, 4, 5])
+
+    def test_improves_on_nearest_neighbor(self):
+        """
+        The optimized route is never longer than the original order.
+        """
+        import numpy as np
+        rng = np.random.default_rng(42)
+        lats = rng.uniform(-10, 10, 200)
+        lons = rng.uniform(-10, 10, 200)
+        dist = distance_matrix(lats, lons)
+        order = optimize_order(dist)
+
+        self.assertEqual(sorted(order), list(range(200)))
+        self.assertEqual(order[0], 0)
+        self.assertLess(route_length(order, dist), route_length(np.arange(200), dist) / 3)
+
+    def test_never_longer_than_current_order(self):
+        """
+        Routes come back no longer than they were, even where 2-opt from the
+        nearest neighbor path does worse.
+        """
+        import numpy as np
+        rng = np.random.default_rng(7)
+        for _ in range(300):
+            n = int(rng.integers(3, 12))
+            dist = distance_matrix(rng.uniform(-1, 1, n), rng.uniform(-1, 1, n))
+            order = optimize_order(dist, time_limit=0.05)
+            self.assertEqual(order[0], 0)
+            self.assertLessEqual(route_length(order, dist),
+                                 route_length(np.arange(n), dist) + 1e-9)
+
+    def test_small_inputs(self):
+        """
+        Fewer than three points are left in order.
+        """
+        self.assertEqual(list(optimize_order(distance_matrix([], []))), [])
+        self.assertEqual(list(optimize_order(distance_matrix([1, 2], [1, 2]))), [0, 1])
+
+
+class OptimizeTripRouteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="my-user")
+        self.trip = Trip.objects.create(owner=self.user, title="trip")
+        self.dests = [
+            Destination.objects.create(trip=self.trip, name=name, latitude=0, longitude=lon,
+                                       start_time=at(day), end_time=at(day, 12))
+            for day, (name, lon) in enumerate([("a", 0), ("c", 2), ("b", 1), ("d", 3)], start=1)
+        ]
+
+    def get_order(self):
+        return list(self.trip.destination_set.order_by("start_time").values_list("name", flat=True))
+
+    def test_reorders_start_times(self):
+        """
+        Destinations are reassigned the trip's time slots in the shorter order
+        and keep their durations.
+        """
+        old_length, new_length = optimize_trip_route(self.trip)
+        self.assertLess(new_length, old_length)
+        self.assertEqual(self.get_order(), ["a", "b", "c", "d"])
+
+        b = Destination.objects.get(name="b")
+        self.assertEqual((b.start_time, b.end_time), (at(2), at(2, 12)))
+
+    def test_leaves_unscheduled_stops(self):
+        """
+        Destinations without times are not given any.
+        """
+        Destination.objects.filter(name="d").update(start_time=None, end_time=None)
+        optimize_trip_route(self.trip)
+        self.assertEqual([name for name in self.get_order() if name != "d"], ["a", "b", "c"])
+        d = Destination.objects.get(name="d")
+        self.assertEqual((d.start_time, d.end_time), (None, None))
+
+    def test_shortest_route_unchanged(self):
+        """
+        Nothing is saved if the route is as short as it gets.
+        """
+        Destination.objects.filter(name="b").update(start_time=at(2), end_time=at(2, 12))
+        Destination.objects.filter(name="c").update(start_time=at(3), end_time=at(3, 12))
+        self.user.refresh_from_db()
+        version = self.user.data_version
+        old_length, new_length = optimize_trip_route(self.trip)
+        self.assertEqual(old_length, new_length)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.data_version, version)
+
+    def test_stops_do_not_overlap(self):
+        """
+        A stop starts no earlier than the previous one ends.
+        """
+        Destination.objects.filter(name="c").update(end_time=at(3, 12))
+        optimize_trip_route(self.trip)
+        c = Destination.objects.get(name="c")
+        self.assertEqual((c.start_time, c.end_time), (at(3), at(4, 12)))
+        d = Destination.objects.get(name="d")
+        self.assertEqual((d.start_time, d.end_time), (at(4, 12), at(4, 15)))
+
+    def test_keeps_end_only_times(self):
+        """
+        Stops with an end time but no start time keep their times.
+        """
+        Destination.objects.filter(name="a").update(start_time=None, end_time=at(1))
+        optimize_trip_route(self.trip)
+        a = Destination.objects.get(name="a")
+        self.assertEqual((a.start_time, a.end_time), (None, at(1)))
+        for dest in Destination.objects.exclude(name="a"):
+            self.assertLessEqual(dest.start_time, dest.end_time)
+
+    def test_bumps_data_version(self):
+        """
+        Optimizing invalidates the owner's derived caches.
+        """
+        self.user.refresh_from_db()
+        version = self.user.data_version
+        optimize_trip_route(self.trip)
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.data_version, version)
+
+
+class OptimizeTripRouteViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="my-user")
+        self.trip = Trip.objects.create(owner=self.user, title="trip")
+        for day, lon in enumerate([0, 2, 1], start=1):
+            Destination.objects.create(trip=self.trip, name=str(lon), latitude=0,
+                                       longitude=lon, start_time=at(day))
+        self.url = reverse("trips:optimize-trip", kwargs={"slug": self.trip.slug})
+        self.client.force_login(self.user)
+
+    def test_post_optimizes(self):
+        """
+        Reorders the trip's destinations and redirects to the trip on POST.
+        """
+        response = self.client.post(self.url, follow=True)
+        self.assertRedirects(response, self.trip.get_absolute_url())
+        self.assertContains(response, "Shortened the route from 333.6 km to 222.4 km.")
+        names = self.trip.destination_set.order_by("start_time").values_list("name", flat=True)
+        self.assertEqual(list(names), ["0", "1", "2"])
+
+    def test_get_not_allowed(self):
+        """
+        Does not change anything on GET.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 405)
+
+    def test_only_for_owner(self):
+        """
+        Does not allow non-owners to optimize trips.
+        """
+        self.client.force_login(User.objects.create())
+        response = self.client.post(self.url)
+        self.assertContains(
+            response, "You don't have access to this trip.", status_code=403, html=True)
+        names = self.trip.destination_set.order_by("start_time").values_list("name", flat=True)
+        self.assertEqual(list(names), ["0", "2", "1"])
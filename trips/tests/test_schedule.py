@@ -0,0 +1,231 @@
+import datetime
+import random
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Trip, Destination
+from ..schedule import (IntervalTree, find_conflicts, overlaps, schedule_conflicts,
+                        user_schedule_conflicts)
+from accounts.models import User
+
+
+def brute_force(intervals, start, end):
+    return sorted(key for s, e, key in intervals if overlaps(s, e, start, end))
+
+
+class IntervalTreeTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.intervals = []
+        for key in range(500):
+            start = rng.randrange(0, 10000)
+            self.intervals.append((start, start + rng.choice([0, 5, 50, 500]), key))
+
+    def test_matches_brute_force(self):
+        """
+        The tree finds the same overlapping intervals as checking each one.
+        """
+        tree = IntervalTree(self.intervals)
+        for start, end in [(0, 10), (5000, 5000), (2500, 3000), (9990, 20000), (-10, -1)]:
+            self.assertEqual(sorted(tree.overlapping(start, end)),
+                             brute_force(self.intervals, start, end))
+
+    def test_touching_intervals(self):
+        """
+        Stops that end when another starts do not overlap, but stops starting
+        together do.
+        """
+        tree = IntervalTree([(0, 10, "a"), (10, 20, "b"), (20, 20, "c")])
+        self.assertEqual(tree.overlapping(10, 20), ["b"])
+        self.assertEqual(sorted(tree.overlapping(20, 30)), ["c"])
+        self.assertEqual(tree.overlapping(5, 5), ["a"])
+
+    def test_find_conflicts_matches_brute_force(self):
+        """
+        The sweep line finds every overlapping pair.
+        """
+        pairs = {frozenset(pair) for pair in find_conflicts(self.intervals)}
+        expected = {
+            frozenset((a[2], b[2])) for i, a in enumerate(self.intervals)
+            for b in self.intervals[i + 1:] if overlaps(a[0], a[1], b[0], b[1])
+        }
+        self.assertEqual(pairs, expected)
+
+
+class ScheduleConflictTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="my-user")
+        self.trip = Trip.objects.create(owner=self.user, title="trip")
+        self.other_trip = Trip.objects.create(owner=self.user, title="other trip")
+        self.day = timezone.make_aware(datetime.datetime(2025, 3, 1))
+        self.museum = Destination.objects.create(
+            trip=self.trip, name="museum", start_time=self.at(10), end_time=self.at(12))
+        self.lunch = Destination.objects.create(
+            trip=self.other_trip, name="lunch", start_time=self.at(11), end_time=self.at(13))
+        self.dinner = Destination.objects.create(
+            trip=self.trip, name="dinner", start_time=self.at(19))
+        Destination.objects.create(trip=self.trip, name="unscheduled")
+        Destination.objects.create(
+            trip=Trip.objects.create(owner=User.objects.create(), title="x"),
+            name="someone else's", start_time=self.at(10), end_time=self.at(12))
+
+    def at(self, hour):
+        return self.day + datetime.timedelta(hours=hour)
+
+    def test_schedule_conflicts(self):
+        """
+        Finds the user's destinations overlapping the given times.
+        """
+        self.assertEqual(schedule_conflicts(self.user, self.at(9), self.at(11)), [self.museum])
+        self.assertEqual(schedule_conflicts(self.user, self.at(11)), [self.museum, self.lunch])
+        self.assertEqual(schedule_conflicts(self.user, self.at(13), self.at(19)), [])
+        self.assertEqual(schedule_conflicts(
+            self.user, self.at(10), self.at(12), exclude=self.museum.pk), [self.lunch])
+
+    def test_changes_patch_cached_tree(self):
+        """
+        Saving or deleting destinations updates the cached tree without
+        scanning the user's destinations again.
+        """
+        self.user.refresh_from_db()
+        schedule_conflicts(self.user, self.at(0))
+        self.museum.start_time, self.museum.end_time = self.at(19), self.at(20)
+        self.museum.save()
+        self.lunch.delete()
+        show = Destination.objects.create(
+            trip=self.trip, name="show", start_time=self.at(11), end_time=self.at(14))
+        self.user.refresh_from_db()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(schedule_conflicts(self.user, self.at(11)), [show])
+        self.assertEqual(schedule_conflicts(self.user, self.at(19), self.at(21)),
+                         [self.museum, self.dinner])
+
+    def test_bulk_changes_rebuild_tree(self):
+        """
+        Changes made without signals are picked up once the version moves on.
+        """
+        self.user.refresh_from_db()
+        schedule_conflicts(self.user, self.at(0))
+        Destination.objects.filter(pk=self.lunch.pk).update(start_time=self.at(19))
+        User.bump_data_versions([self.user.pk])
+        self.user.refresh_from_db()
+        self.assertEqual(schedule_conflicts(self.user, self.at(11)), [self.museum])
+
+    def test_user_schedule_conflicts(self):
+        """
+        Reports every overlapping pair of the user's destinations.
+        """
+        self.assertEqual(user_schedule_conflicts(self.user), [(self.museum, self.lunch)])
+
+    def test_create_destination_warns(self):
+        """
+        Saving an overlapping destination succeeds with a warning.
+        """
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("trips:create-dest-with-trip", args=[self.trip.slug]),
+            {"name": "show", "start_time": "2025-03-01 18:30Z", "end_time": "2025-03-01 21:00Z"},
+            follow=True)
+        self.assertRedirects(response, reverse("trips:trip-detail", args=[self.trip.slug]))
+        self.assertTrue(Destination.objects.filter(name="show").exists())
+        self.assertContains(response, "show overlaps dinner (trip)")
+
+    def test_conflicts_view(self):
+        """
+        The conflicts page lists the user's overlapping destinations.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("trips:dest-conflicts"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["conflicts"], [(self.museum, self.lunch)])
+        self.assertNotContains(response, "someone else")
+
+
+class CalendarTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="my-user")
+        self.client.force_login(self.user)
+        self.march = Trip.objects.create(
+            owner=self.user, title="march trip",
+            start_date=datetime.date(2025, 2, 27), end_date=datetime.date(2025, 3, 2))
+        self.open_ended = Trip.objects.create(
+            owner=self.user, title="open ended", start_date=datetime.date(2025, 3, 15))
+        self.summer = Trip.objects.create(
+            owner=self.user, title="summer trip",
+            start_date=datetime.date(2025, 7, 1), end_date=datetime.date(2025, 7, 10))
+        Trip.objects.create(owner=self.user, title="undated")
+        self.overnight = Destination.objects.create(
+            trip=self.march, name="overnight train",
+            start_time=timezone.make_aware(datetime.datetime(2025, 2, 28, 22)),
+            end_time=timezone.make_aware(datetime.datetime(2025, 3, 1, 6)))
+        self.checkout = Destination.objects.create(
+            trip=self.march, name="checkout",
+            start_time=timezone.make_aware(datetime.datetime(2025, 3, 2, 11)))
+        Trip.objects.create(
+            owner=User.objects.create(), title="someone else's",
+            start_date=datetime.date(2025, 3, 1), end_date=datetime.date(2025, 3, 1))
+
+    def test_trips_overlapping(self):
+        """
+        Only trips overlapping the dates are fetched.
+        """
+        trips = Trip.objects.filter(owner=self.user).overlapping(
+            datetime.date(2025, 3, 1), datetime.date(2025, 3, 31))
+        self.assertQuerySetEqual(trips.order_by("pk"), [self.march, self.open_ended])
+
+    def test_destinations_overlapping(self):
+        """
+        Only destinations overlapping the times are fetched.
+        """
+        dests = Destination.objects.overlapping(
+            timezone.make_aware(datetime.datetime(2025, 3, 1)),
+            timezone.make_aware(datetime.datetime(2025, 3, 2)))
+        self.assertQuerySetEqual(dests, [self.overnight])
+
+    def test_month_calendar(self):
+        """
+        The month calendar lists trips and destinations on each day they span.
+        """
+        response = self.client.get(reverse("trips:calendar-month", args=[2025, 3]))
+        self.assertEqual(response.status_code, 200)
+        [month] = response.context["months"]
+        days = {day["date"]: day for week in month["weeks"] for day in week}
+        first = days[datetime.date(2025, 3, 1)]
+        self.assertEqual(first["trips"], [self.march])
+        self.assertEqual(first["destinations"], [self.overnight])
+        self.assertEqual(days[datetime.date(2025, 2, 28)]["destinations"], [self.overnight])
+        self.assertEqual(days[datetime.date(2025, 3, 2)]["destinations"], [self.checkout])
+        self.assertEqual(days[datetime.date(2025, 3, 15)]["trips"], [self.open_ended])
+        self.assertEqual(days[datetime.date(2025, 3, 16)]["trips"], [])
+        self.assertNotContains(response, "someone else")
+        self.assertContains(response, reverse("trips:calendar-month", args=[2025, 4]))
+
+    def test_year_calendar(self):
+        """
+        The year calendar has every month of the year.
+        """
+        response = self.client.get(reverse("trips:calendar-year", args=[2025]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["date"].month for m in response.context["months"]], list(range(1, 13)))
+        july = {day["date"]: day for week in response.context["months"][6]["weeks"] for day in week}
+        self.assertEqual(july[datetime.date(2025, 7, 10)]["trips"], [self.summer])
+
+    def test_invalid_month(self):
+        """
+        Months outside 1-12 are not found.
+        """
+        response = self.client.get(reverse("trips:calendar-month", args=[2025, 13]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_default_month(self):
+        """
+        The calendar shows the current month by default.
+        """
+        response = self.client.get(reverse("trips:calendar"))
+        today = timezone.localdate()
+        self.assertEqual(response.context["months"][0]["date"], today.replace(day=1))
@@ -0,0 +1,76 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Trip, Destination
+from ..search import PAGE_SIZE, search_page
+from accounts.models import User
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="my-user")
+        self.paris = Trip.objects.create(
+            owner=self.user, title="Paris weekend", notes="Croissants every morning")
+        self.rome = Trip.objects.create(
+            owner=self.user, title="Rome", notes="Fly back through Paris <b>on Sunday</b>")
+        self.louvre = Destination.objects.create(trip=self.paris, name="Louvre")
+        Trip.objects.create(owner=User.objects.create(), title="Paris again")
+
+    def search(self, query, page=1):
+        return search_page(self.user, query, page)
+
+    def test_title_and_notes(self):
+        """
+        Trips match by title and notes, with title matches ranked first.
+        """
+        results = self.search("paris").object_list
+        self.assertEqual([r["object"] for r in results], [self.paris, self.rome])
+        self.assertEqual(results[0]["kind"], "trip")
+        self.assertEqual(results[0]["url"], self.paris.get_absolute_url())
+
+    def test_destination_names(self):
+        """
+        Destinations match by name and link to their trip.
+        """
+        [result] = self.search("louvre").object_list
+        self.assertEqual(result["object"], self.louvre)
+        self.assertEqual(result["kind"], "destination")
+        self.assertEqual(result["url"], self.paris.get_absolute_url())
+
+    def test_highlighted_and_escaped(self):
+        """
+        Matched words are highlighted and the rest of the text is escaped.
+        """
+        results = self.search("paris").object_list
+        self.assertIn("<mark>Paris</mark>", results[0]["title"])
+        self.assertIn("<mark>Paris</mark>", results[1]["headline"])
+        self.assertIn("&lt;b&gt;", results[1]["headline"])
+
+    def test_paginated(self):
+        """
+        Results are split into pages.
+        """
+        for i in range(PAGE_SIZE + 2):
+            Destination.objects.create(trip=self.rome, name=f"Paris stop {i}")
+        page = self.search("paris", 2)
+        self.assertEqual(page.paginator.count, PAGE_SIZE + 4)
+        self.assertEqual(len(page.object_list), 4)
+
+    def test_search_view(self):
+        """
+        The search page shows the user's results.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("trips:search"), {"q": "paris"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.paris.get_absolute_url())
+        self.assertNotContains(response, "Paris again")
+
+    def test_search_view_empty(self):
+        """
+        The search page without a query shows only the form.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("trips:search"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("page_obj", response.context)
@@ -0,0 +1,113 @@
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..deletion import delete_trips
+from ..models import Trip, Destination
+from ..sharing import page_key
+from tasks.models import Task
+from accounts.models import User
+
+
+class SharedTripViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="myuser")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip = Trip.objects.create(owner=self.user, title="Lisbon", public=True)
+            Destination.objects.create(trip=self.trip, name="Belem",
+                                       latitude=38.6916, longitude=-9.2160)
+        self.url = reverse("trips:shared-trip", args=[self.trip.slug])
+
+    def test_shows_trip_to_anyone(self):
+        """
+        Shows the trip without per-user content, cacheable by anyone.
+        """
+        response = self.client.get(self.url)
+        self.assertContains(response, "Lisbon")
+        self.assertContains(response, "Belem")
+        self.assertContains(response, "<svg")
+        self.assertNotContains(response, "Edit this trip")
+        self.assertIn("public", response["Cache-Control"])
+        self.assertEqual(response["Surrogate-Key"], f"trip-{self.trip.slug} shared-trips")
+
+        other = User.objects.create(username="otheruser")
+        self.client.force_login(other)
+        logged_in = self.client.get(self.url)
+        self.assertEqual(logged_in.content, response.content)
+        self.assertNotContains(logged_in, "otheruser")
+        self.assertNotIn("Cookie", logged_in.get("Vary", ""))
+        self.assertFalse(logged_in.cookies)
+
+    def test_served_from_cache(self):
+        """
+        Only the first view of a page queries the database.
+        """
+        response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, response.content)
+
+        response = self.client.get(self.url, headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_only_public_trips(self):
+        """
+        Unshared and nonexistent trips are not found.
+        """
+        private = Trip.objects.create(owner=self.user, title="Porto")
+        response = self.client.get(reverse("trips:shared-trip", args=[private.slug]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse("trips:shared-trip", args=["nonexistant"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_purged_on_change(self):
+        """
+        Changes to the trip or its destinations show up at once.
+        """
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Destination.objects.create(trip=self.trip, name="Alfama")
+        self.assertContains(self.client.get(self.url), "Alfama")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip.public = False
+            self.trip.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "test_cache"}})
+    def test_purge_seen_by_other_processes(self):
+        """
+        With a shared cache, as in production, a purge reaches every process.
+        """
+        call_command("createcachetable", database="default")
+        self.client.get(self.url)
+        # a separate client, like the cache of another web process
+        other = caches.create_connection("default")
+        self.assertIsNotNone(other.get(page_key(self.trip.slug)))
+        with self.captureOnCommitCallbacks(execute=True):
+            Destination.objects.create(trip=self.trip, name="Alfama")
+        self.assertIsNone(other.get(page_key(self.trip.slug)))
+
+    @override_settings(SHARED_PAGE_PURGE_URL="https://cdn.example.com/purge")
+    def test_purged_on_delete(self):
+        """
+        Deleting a shared trip purges its page here and from the CDN.
+        """
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_trips(Trip.objects.filter(pk=self.trip.pk))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        task = Task.objects.get()
+        self.assertEqual(task.name, "trips.sharing.purge_cdn")
+        self.assertEqual(task.args, [[f"trip-{self.trip.slug}"]])
+
+    def test_owner_sees_shared_url(self):
+        """
+        The trip's page links to its shared page.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("trips:trip-detail", args=[self.trip.slug]))
+        self.assertContains(response, self.url)
@@ -0,0 +1,100 @@
+import datetime
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..models import Trip, Destination
+from ..stats import trip_route, user_route_totals
+from accounts.models import User
+
+
+def at(hour):
+    return datetime.datetime(2025, 1, 1, hour, tzinfo=datetime.timezone.utc)
+
+
+class RouteStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="my-user")
+        self.trip = Trip.objects.create(owner=self.user, title="texas")
+        # created out of order to check ordering by start time
+        self.austin = Destination.objects.create(
+            trip=self.trip, name="austin", latitude=30.26715, longitude=-97.74306,
+            start_time=at(14), end_time=at(15))
+        self.houston = Destination.objects.create(
+            trip=self.trip, name="houston", latitude=29.76328, longitude=-95.36327,
+            start_time=at(9), end_time=at(11))
+        self.dallas = Destination.objects.create(
+            trip=self.trip, name="dallas", latitude=32.77667, longitude=-96.79699)
+        Destination.objects.create(trip=self.trip, name="nowhere", start_time=at(12))
+
+    def test_trip_route(self):
+        """
+        trip_route() returns legs between located destinations in start time
+        order, with distances, time gaps and speeds.
+        """
+        legs = trip_route(self.trip)
+        self.assertEqual([(leg["origin"], leg["target"]) for leg in legs],
+                         [(self.houston, self.austin), (self.austin, self.dallas)])
+
+        self.assertAlmostEqual(legs[0]["distance_km"], 235.4, delta=1)
+        self.assertEqual(legs[0]["gap"], datetime.timedelta(hours=3))
+        self.assertAlmostEqual(legs[0]["speed_kmh"], 78.5, delta=0.5)
+
+        self.assertAlmostEqual(legs[1]["distance_km"], 293.1, delta=1)
+        self.assertIsNone(legs[1]["gap"])
+        self.assertIsNone(legs[1]["speed_kmh"])
+
+    def test_trip_route_without_legs(self):
+        """
+        trip_route() returns no legs for trips with fewer than two located
+        destinations.
+        """
+        trip = Trip.objects.create(owner=self.user, title="short")
+        self.assertEqual(trip_route(trip), [])
+        Destination.objects.create(trip=trip, name="a", latitude=1, longitude=1)
+        self.assertEqual(trip_route(trip), [])
+
+    def test_user_route_totals(self):
+        """
+        user_route_totals() sums the legs of each of the user's trips without
+        joining legs across trips.
+        """
+        other_trip = Trip.objects.create(owner=self.user, title="other")
+        Destination.objects.create(
+            trip=other_trip, name="a", latitude=0, longitude=0, start_time=at(1))
+        Destination.objects.create(
+            trip=other_trip, name="b", latitude=0, longitude=1, start_time=at(3))
+        Destination.objects.create(
+            trip=Trip.objects.create(owner=User.objects.create(), title="x"),
+            name="c", latitude=0, longitude=2)
+
+        totals = user_route_totals(self.user)
+        self.assertEqual(set(totals), {self.trip.pk, other_trip.pk})
+
+        expected = sum(leg["distance_km"] for leg in trip_route(self.trip))
+        self.assertAlmostEqual(totals[self.trip.pk]["distance_km"], expected)
+        self.assertEqual(totals[self.trip.pk]["legs"], 2)
+        self.assertEqual(totals[self.trip.pk]["idle_hours"], 3)
+
+        self.assertAlmostEqual(totals[other_trip.pk]["distance_km"], 111.2, delta=0.1)
+        self.assertEqual(totals[other_trip.pk]["legs"], 1)
+        self.assertEqual(totals[other_trip.pk]["idle_hours"], 2)
+
+    def test_user_route_totals_empty(self):
+        """
+        user_route_totals() is empty for users without destinations.
+        """
+        self.assertEqual(user_route_totals(User.objects.create()), {})
+
+    def test_user_route_totals_cached(self):
+        """
+        user_route_totals() is cached until the user's data changes.
+        """
+        self.user.refresh_from_db()
+        totals = user_route_totals(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(user_route_totals(self.user), totals)
+
+        self.dallas.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(user_route_totals(self.user)[self.trip.pk]["legs"], 1)
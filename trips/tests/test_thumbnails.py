@@ -0,0 +1,108 @@
+import os
+import re
+import tempfile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..geo import points_svg
+from ..models import Trip, Destination
+from ..thumbnails import get_thumbnail_path, thumbnail_version, trip_points
+from accounts.models import User
+
+
+class PointsSvgTests(SimpleTestCase):
+    def test_fits_route(self):
+        """
+        Draws the route through the points, fitted inside the padding.
+        """
+        svg = points_svg([(48.85, 2.29), (52.37, 4.90), (51.51, -0.13)], 160, 100).decode()
+        self.assertEqual(svg.count("<circle"), 3)
+        coords = [tuple(map(float, p.split(",")))
+                  for p in re.search(r'polyline points="([^"]+)"', svg)[1].split()]
+        self.assertEqual(len(coords), 3)
+        for x, y in coords:
+            self.assertTrue(12 <= x <= 148 and 12 <= y <= 88)
+        # Amsterdam is north east of Paris
+        self.assertGreater(coords[1][0], coords[0][0])
+        self.assertLess(coords[1][1], coords[0][1])
+
+    def test_single_and_no_points(self):
+        """
+        A single point is drawn in the middle, and no points give an empty map.
+        """
+        svg = points_svg([(10, 20)], 160, 100).decode()
+        self.assertIn('<circle cx="80.0" cy="50.0"', svg)
+        self.assertNotIn("<polyline", svg)
+        self.assertNotIn("<circle", points_svg([], 160, 100).decode())
+
+
+class TripThumbnailViewTests(TestCase):
+    def setUp(self):
+        self.thumbnail_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            THUMBNAIL_CACHE_DIR=self.thumbnail_dir.name, THUMBNAIL_PROCESSES=0)
+        self.settings_override.enable()
+
+        self.user = User.objects.create(username="myuser")
+        self.trip = Trip.objects.create(owner=self.user, title="test trip")
+        self.dest = Destination.objects.create(
+            trip=self.trip, name="nasa", latitude=29.5519, longitude=-95.0981)
+        Destination.objects.create(trip=self.trip, name="somewhere")
+        self.url = reverse("trips:trip-thumbnail", args=[self.trip.slug])
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.thumbnail_dir.cleanup()
+
+    def test_profile_links_versioned_thumbnails(self):
+        """
+        The trip list links thumbnails of trips with located destinations by version.
+        """
+        Trip.objects.create(owner=self.user, title="empty trip")
+        version = thumbnail_version([(29.5519, -95.0981)])
+        response = self.client.get(reverse("trips:profile"))
+        self.assertContains(response, f'src="{self.url}?v={version}"', count=1)
+
+    def test_get_thumbnail(self):
+        """
+        Returns the trip's thumbnail, immutable for the current version.
+        """
+        points = trip_points(self.trip.destination_set.all())[self.trip.pk]
+        response = self.client.get(self.url, {"v": thumbnail_version(points)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn(b"<circle", b"".join(response.streaming_content))
+
+        response = self.client.get(self.url, {"v": "old"})
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn(b"<circle", b"".join(response.streaming_content))
+
+    def test_forbidden_for_other_users(self):
+        """
+        Only the trip's owner can get its thumbnail.
+        """
+        self.client.force_login(User.objects.create(username="other"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_new_version_replaces_old(self):
+        """
+        Moving a destination renders a new version and removes the old one.
+        """
+        old_path = get_thumbnail_path(self.trip.pk, [(29.5519, -95.0981)])
+        self.dest.latitude = 30
+        self.dest.save()
+        points = trip_points(self.trip.destination_set.all())[self.trip.pk]
+        path = get_thumbnail_path(self.trip.pk, points)
+        self.assertNotEqual(path, old_path)
+        self.assertEqual(os.listdir(os.path.dirname(path)), [os.path.basename(path)])
+
+    @override_settings(THUMBNAIL_PROCESSES=1)
+    def test_renders_on_process_pool(self):
+        """
+        Thumbnails rendered on the process pool match those rendered inline.
+        """
+        path = get_thumbnail_path(self.trip.pk, [(29.5519, -95.0981)])
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), points_svg([(29.5519, -95.0981)], 160, 100))
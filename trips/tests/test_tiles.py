@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Trip, Destination
+from ..tiles import encode_tile, tile_bbox
+from accounts.models import User
+
+
+class EncodeTileTests(SimpleTestCase):
+    def test_encode_point(self):
+        """
+        Encodes a point with its id and properties into a vector tile.
+        """
+        data = encode_tile(0, 0, 0, [(1, 0.0, 0.0, {"name": "x"})])
+        self.assertEqual(data.hex(), (
+            "1a2f"  # layer
+            "7802"  # version 2
+            "0a0c64657374696e6174696f6e73"  # name "destinations"
+            "120f08011202000018012205098020802"  # feature id 1, point (2048, 2048)
+            "01a046e616d65"  # key "name"
+            "22030a0178"  # value "x"
+            "288020"  # extent 4096
+        ))
+
+    def test_encode_empty(self):
+        """
+        A tile without points is empty.
+        """
+        self.assertEqual(encode_tile(3, 1, 2, []), b"")
+
+    def test_tile_bbox(self):
+        """
+        tile_bbox() returns the bounds of a tile.
+        """
+        bbox = tile_bbox(1, 0, 0)
+        self.assertEqual((bbox.west, bbox.south, bbox.east), (-180, 0, 0))
+        self.assertAlmostEqual(bbox.north, 85.0511, places=4)
+
+
+class UserTileViewTests(TestCase):
+    def setUp(self):
+        self.tile_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(TILE_CACHE_DIR=self.tile_dir.name)
+        self.settings_override.enable()
+
+        self.user = User.objects.create(username="myuser")
+        self.trip = Trip.objects.create(owner=self.user, title="test trip")
+        Destination.objects.create(
+            trip=self.trip, name="nasa", latitude=29.5519, longitude=-95.0981)
+        self.url = reverse("trips:user-tile", args=[1, 0, 0])
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tile_dir.cleanup()
+
+    def get_version(self):
+        self.user.refresh_from_db()
+        return self.user.data_version
+
+    def test_get_tile(self):
+        """
+        Returns a vector tile of the user's destinations in the tile.
+        """
+        other_trip = Trip.objects.create(
+            owner=User.objects.create(), title="someone else's trip")
+        Destination.objects.create(
+            trip=other_trip, name="someone else's", latitude=29.5, longitude=-95)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+        data = b"".join(response.streaming_content)
+        self.assertIn(b"nasa", data)
+        self.assertIn(self.trip.slug.encode(), data)
+        self.assertNotIn(b"someone else's", data)
+
+        response = self.client.get(reverse("trips:user-tile", args=[1, 1, 1]))
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+    def test_immutable_for_current_version(self):
+        """
+        Tiles requested for the current data version are cached immutably.
+        """
+        response = self.client.get(self.url, {"v": self.get_version()})
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response = self.client.get(self.url, {"v": self.get_version() - 1})
+        self.assertNotIn("immutable", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_cached_per_version(self):
+        """
+        Tiles are cached on disk and rebuilt when the user's data changes.
+        """
+        self.client.get(self.url)
+        version = self.get_version()
+        version_dir = os.path.join(self.tile_dir.name, str(self.user.pk), str(version))
+        self.assertTrue(os.path.exists(os.path.join(version_dir, "1", "0", "0.mvt")))
+
+        Destination.objects.create(
+            trip=self.trip, name="arena", latitude=29.75, longitude=-95.36)
+        response = self.client.get(self.url)
+        self.assertIn(b"arena", b"".join(response.streaming_content))
+        self.assertFalse(os.path.exists(version_dir))
+
+    def test_keeps_newer_versions(self):
+        """
+        A request still on an older data version does not remove the tiles
+        of a newer one.
+        """
+        version = self.get_version()
+        newer_dir = os.path.join(self.tile_dir.name, str(self.user.pk), str(version + 1))
+        os.makedirs(newer_dir)
+        self.client.get(self.url)
+        self.assertTrue(os.path.isdir(newer_dir))
+
+    def test_directory_removed_while_building(self):
+        """
+        The tile is still written if its directory is removed while it is built.
+        """
+        user_dir = os.path.join(self.tile_dir.name, str(self.user.pk))
+        mkstemp = tempfile.mkstemp
+        removed = []
+
+        def remove_and_mkstemp(*args, **kwargs):
+            if not removed:
+                removed.append(user_dir)
+                shutil.rmtree(user_dir)
+            return mkstemp(*args, **kwargs)
+
+        with mock.patch("trips.tiles.tempfile.mkstemp", side_effect=remove_and_mkstemp):
+            response = self.client.get(self.url)
+        self.assertEqual(removed, [user_dir])
+        self.assertIn(b"nasa", b"".join(response.streaming_content))
+
+    def test_nonexistant_tile(self):
+        """
+        Returns 404 for tiles outside the grid.
+        """
+        response = self.client.get(reverse("trips:user-tile", args=[1, 2, 0]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse("trips:user-tile", args=[30, 0, 0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_logged_in(self):
+        """
+        A logged out user cannot get tiles.
+        """
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
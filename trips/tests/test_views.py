@@ -1,11 +1,15 @@
 import json
 import datetime
+from io import StringIO
 from unittest import mock
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from requests import Response as r_Response
 
-from ..models import Trip, Destination
+from ..models import Collaborator, Trip, Destination
 from ..forms import TripForm, DestinationForm
 from accounts.models import User
 
@@ -94,6 +98,16 @@ class UserTripsViewTests(LoginRequiredTestMixin, TestCase):
         self.assertIsInstance(
             response.context["create_dest_form"], DestinationForm)
 
+    def test_includes_destination_tiles_url(self):
+        """
+        Context includes the vector tile url template for the current data
+        version.
+        """
+        self.user.refresh_from_db()
+        response = self.client.get(self.url)
+        self.assertEqual(response.context["destination_tiles_url"],
+                         f"/tiles/{{z}}/{{x}}/{{y}}.mvt?v={self.user.data_version}")
+
 
 class TripDetailViewTests(LoginRequiredTestMixin, TestCase):
     def setUp(self):
@@ -157,6 +171,191 @@ class TripDetailViewTests(LoginRequiredTestMixin, TestCase):
             response.context["create_dest_form"], DestinationForm)
 
 
+class UserTripsMapViewTests(LoginRequiredTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("trips:profile-map")
+
+        self.user = User.objects.create(username="myuser", password="testpw")
+        self.client.force_login(self.user)
+
+        self.trip = Trip.objects.create(owner=self.user, title="my cool trip")
+        Destination.objects.create(
+            trip=self.trip, name="a", latitude=10, longitude=20)
+        Destination.objects.create(
+            trip=self.trip, name="b", latitude=20, longitude=40)
+
+    def test_returns_trip_markers(self):
+        """
+        Returns a GeoJSON point at the average location of each trip.
+        """
+        Trip.objects.create(owner=self.user, title="no destinations")
+        other_trip = Trip.objects.create(
+            owner=User.objects.create(), title="someone else's trip")
+        Destination.objects.create(
+            trip=other_trip, name="c", latitude=0, longitude=0)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json(), {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [30, 15]},
+                "properties": {
+                    "title": self.trip.title,
+                    "link": self.trip.get_absolute_url(),
+                },
+            }],
+        })
+
+    def test_filters_by_bbox(self):
+        """
+        Only returns trips inside the requested bbox.
+        """
+        response = self.client.get(self.url, {"bbox": "0,0,10,10"})
+        self.assertEqual(response.json()["features"], [])
+
+        response = self.client.get(self.url, {"bbox": "25,10,35,20"})
+        self.assertEqual(len(response.json()["features"]), 1)
+
+    def test_bad_request_on_invalid_bbox(self):
+        """
+        Returns 400 if the bbox is malformed.
+        """
+        response = self.client.get(self.url, {"bbox": "1,2,3"})
+        self.assertContains(response, "Invalid bbox", status_code=400)
+
+    def test_not_modified_on_matching_etag(self):
+        """
+        Returns 304 if the data has not changed since the client's copy.
+        """
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        Destination.objects.create(
+            trip=self.trip, name="c", latitude=30, longitude=60)
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_clusters_by_zoom(self):
+        """
+        Returns clustered markers and the overall bounds for a zoom level.
+        """
+        other_trip = Trip.objects.create(owner=self.user, title="close by")
+        Destination.objects.create(
+            trip=other_trip, name="c", latitude=15.01, longitude=30.01)
+
+        response = self.client.get(self.url, {"zoom": 2})
+        data = response.json()
+        self.assertEqual(data["bbox"], [30, 15, 30.01, 15.01])
+        self.assertEqual(len(data["features"]), 1)
+        self.assertEqual(data["features"][0]["properties"],
+                         {"cluster": True, "point_count": 2})
+
+        response = self.client.get(self.url, {"zoom": 20})
+        self.assertEqual(len(response.json()["features"]), 2)
+
+    def test_clusters_rebuilt_on_change(self):
+        """
+        Clusters reflect trips added after they were first built.
+        """
+        response = self.client.get(self.url, {"zoom": 2})
+        self.assertEqual(len(response.json()["features"]), 1)
+
+        other_trip = Trip.objects.create(owner=self.user, title="far away")
+        Destination.objects.create(
+            trip=other_trip, name="c", latitude=-40, longitude=-100)
+
+        response = self.client.get(self.url, {"zoom": 2})
+        self.assertEqual(len(response.json()["features"]), 2)
+
+    def test_bad_request_on_invalid_zoom(self):
+        """
+        Returns 400 if the zoom is not a number.
+        """
+        for zoom in ["far", "inf", "nan"]:
+            response = self.client.get(self.url, {"zoom": zoom})
+            self.assertContains(response, "Invalid zoom", status_code=400)
+
+    def test_gzipped_when_accepted(self):
+        """
+        Compresses the data if the client accepts gzip.
+        """
+        for i in range(20):
+            trip = Trip.objects.create(owner=self.user, title=f"trip {i}")
+            Destination.objects.create(
+                trip=trip, name="a", latitude=i, longitude=i)
+
+        response = self.client.get(
+            self.url, headers={"accept-encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+
+class TripMapViewTests(LoginRequiredTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="myuser")
+        self.trip = Trip.objects.create(owner=self.user, title="test trip")
+        Destination.objects.create(
+            trip=self.trip, name="nasa", latitude=29.5519, longitude=-95.0981)
+        Destination.objects.create(trip=self.trip, name="nowhere")
+
+        self.url = reverse("trips:trip-map", kwargs={'slug': self.trip.slug})
+        self.client.force_login(self.user)
+
+    def test_returns_destination_markers(self):
+        """
+        Returns a GeoJSON point for each of the trip's located destinations.
+        """
+        other_trip = Trip.objects.create(owner=self.user, title="other trip")
+        Destination.objects.create(
+            trip=other_trip, name="arena", latitude=29.75, longitude=-95.36)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["features"], [{
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [-95.0981, 29.5519]},
+            "properties": {"name": "nasa"},
+        }])
+
+    def test_filters_by_bbox_across_antimeridian(self):
+        """
+        Handles bboxes that wrap around the antimeridian.
+        """
+        Destination.objects.create(
+            trip=self.trip, name="fiji", latitude=-17.7, longitude=178.06)
+        Destination.objects.create(
+            trip=self.trip, name="samoa", latitude=-13.76, longitude=-172.1)
+
+        # as given, and as mapbox-gl reports it (east of 180)
+        for bbox in ["170,-30,-160,0", "170,-30,200,0"]:
+            response = self.client.get(self.url, {"bbox": bbox})
+            names = [f["properties"]["name"] for f in response.json()["features"]]
+            self.assertCountEqual(names, ["fiji", "samoa"])
+
+    def test_only_for_owner(self):
+        """
+        A user cannot access map data for someone else's trip.
+        """
+        self.client.force_login(User.objects.create())
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_nonexistant_trip(self):
+        """
+        Returns 404 if the trip does not exist.
+        """
+        self.trip.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
 class CreateTripViewTests(LoginRequiredTestMixin, TestCase):
     def setUp(self):
         self.url = reverse("trips:create-trip")
@@ -350,22 +549,31 @@ class CreateDestinationViewTests(LoginRequiredTestMixin, TestCase):
         self.assertTemplateUsed(response, "trips/create_destination.html")
         self.assertIsInstance(response.context["form"], DestinationForm)
 
-    def test_form_trip_displays_limited_to_user(self):
+    def test_form_trip_limited_to_user(self):
         """
-        Only displays trip options owned by user in form on GET.
+        Only accepts trip options owned by user in form on GET.
         """
         trip1 = Trip.objects.create(owner=self.user, title="my cool trip")
         trip2 = Trip.objects.create(owner=self.user, title="another trip")
-        other_trip = Trip.objects.create(
+        Trip.objects.create(
             owner=User.objects.create(), title="someone else's trip")
 
         response = self.client.get(self.url)
         trip_choices = response.context["form"].fields["trip"]
         self.assertQuerySetEqual(trip_choices.queryset,
                                  [trip1, trip2], ordered=False)
-        self.assertContains(response, trip1.title)
-        self.assertContains(response, trip2.title)
-        self.assertNotContains(response, other_trip.title)
+
+    def test_form_trip_choices_not_rendered(self):
+        """
+        Does not render every trip option in the form on GET.
+        """
+        trip1 = Trip.objects.create(owner=self.user, title="my cool trip")
+        trip2 = Trip.objects.create(owner=self.user, title="another trip")
+
+        response = self.client.get(self.url)
+        self.assertNotContains(response, trip1.title)
+        self.assertNotContains(response, trip2.title)
+        self.assertContains(response, reverse("trips:search-trip"))
 
     def test_create_destination_post_with_trip(self):
         """
@@ -570,9 +778,10 @@ class EditDestinationViewTests(LoginRequiredTestMixin, TestCase):
         self.assertTemplateUsed(response, "trips/destination_update_form.html")
         self.assertIsInstance(response.context["form"], DestinationForm)
 
-    def test_form_trip_displays_limited_to_user(self):
+    def test_form_trip_limited_to_user(self):
         """
-        Only displays trip options owned by user in form on GET.
+        Only accepts trip options owned by user and displays only the
+        selected trip in form on GET.
         """
         trip1 = Trip.objects.create(owner=self.user, title="my cool trip")
         trip2 = Trip.objects.create(owner=self.user, title="another trip")
@@ -583,9 +792,9 @@ class EditDestinationViewTests(LoginRequiredTestMixin, TestCase):
         trip_choices = response.context["form"].fields["trip"]
         self.assertQuerySetEqual(trip_choices.queryset,
                                  [trip1, trip2, self.trip], ordered=False)
-        self.assertContains(response, trip1.title)
-        self.assertContains(response, trip2.title)
         self.assertContains(response, self.trip.title)
+        self.assertNotContains(response, trip1.title)
+        self.assertNotContains(response, trip2.title)
         self.assertNotContains(response, other_trip.title)
 
     def test_post_destination_edit_valid_data(self):
@@ -775,7 +984,71 @@ class DeleteDestinationViewTests(LoginRequiredTestMixin, TestCase):
             pk=self.dest.pk).count(), 1)
 
 
-@mock.patch("trips.views.requests", spec=True)
+class SearchTripViewTests(LoginRequiredTestMixin, TestCase):
+    def setUp(self):
+        self.url = reverse("trips:search-trip")
+
+        self.user = User.objects.create(username="myuser", password="testpw")
+        self.client.force_login(self.user)
+
+    def test_search_trips(self):
+        """
+        Returns the user's trips matching the search text.
+        """
+        trip = Trip.objects.create(owner=self.user, title="beach week")
+        other_trip = Trip.objects.create(owner=self.user, title="ski trip")
+
+        response = self.client.get(self.url, {"trip_search": "BEACH"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(
+            response, "trips/trip_search_results_snippet.html")
+        self.assertQuerySetEqual(response.context["trips"], [trip])
+        self.assertContains(response, trip.title)
+        self.assertNotContains(response, other_trip.title)
+
+    def test_search_trips_only_for_user(self):
+        """
+        Does not return trips owned by other users.
+        """
+        trip = Trip.objects.create(owner=self.user, title="beach week")
+        other_trip = Trip.objects.create(
+            owner=User.objects.create(), title="beach weekend")
+
+        response = self.client.get(self.url, {"trip_search": "beach"})
+        self.assertQuerySetEqual(response.context["trips"], [trip])
+        self.assertNotContains(response, other_trip.title)
+
+    def test_search_trips_shared_with_editor(self):
+        """
+        Returns trips the user is an editor of, but not ones they can only view.
+        """
+        owner = User.objects.create(username="owner")
+        edited = Trip.objects.create(owner=owner, title="beach house")
+        viewed = Trip.objects.create(owner=owner, title="beach bar")
+        Collaborator.objects.create(trip=edited, user=self.user, role="editor")
+        Collaborator.objects.create(trip=viewed, user=self.user, role="viewer")
+
+        response = self.client.get(self.url, {"trip_search": "beach"})
+        self.assertQuerySetEqual(response.context["trips"], [edited])
+        self.assertNotContains(response, viewed.title)
+
+    def test_search_trips_paginated(self):
+        """
+        Returns one page of trips at a time.
+        """
+        trips = [Trip.objects.create(owner=self.user, title=f"trip {i:02}")
+                 for i in range(15)]
+
+        response = self.client.get(self.url)
+        self.assertQuerySetEqual(response.context["trips"], trips[:10])
+        self.assertContains(response, "page=2")
+
+        response = self.client.get(self.url, {"page": 2})
+        self.assertQuerySetEqual(response.context["trips"], trips[10:])
+        self.assertNotContains(response, "page=3")
+
+
+@mock.patch("trips.locations.requests", spec=True)
 class SearchLocationViewTests(LoginRequiredTestMixin, TestCase):
     def setUp(self):
         self.url = reverse("trips:search-loc")
@@ -785,6 +1058,7 @@ class SearchLocationViewTests(LoginRequiredTestMixin, TestCase):
 
         self.user = User.objects.create(username="myuser", password="testpw")
         self.client.force_login(self.user)
+        cache.clear()
 
         self.mock_env = mock.patch.dict(
             "os.environ", {"MAPBOX_ACCESS_TOKEN": self.mapbox_access_token})
@@ -816,7 +1090,7 @@ class SearchLocationViewTests(LoginRequiredTestMixin, TestCase):
             "auto_complete": "true",
         }
         mock_requests.get.assert_called_once_with(
-            self.mapbox_url, params=mapbox_params)
+            self.mapbox_url, params=mapbox_params, timeout=(3.05, 5))
 
         expected = [
             {
@@ -899,6 +1173,68 @@ class SearchLocationViewTests(LoginRequiredTestMixin, TestCase):
             "auto_complete": "true",
         }
         mock_requests.get.assert_called_once_with(
-            self.mapbox_url, params=mapbox_params)
+            self.mapbox_url, params=mapbox_params, timeout=(3.05, 5))
 
         self.assertContains(response, expected_err, status_code=502)
+
+    @override_settings(LOCATION_SEARCH_USER_RATE=(0.5, 2))
+    def test_throttles_searches(self, mock_requests):
+        """
+        Returns 429 with Retry-After once the user searched too often.
+        """
+        ext_response = r_Response()
+        ext_response.status_code = 200
+        ext_response.json = mock.MagicMock(return_value={"features": []})
+        mock_requests.get.return_value = ext_response
+
+        for search_text in ("a", "b"):
+            response = self.client.post(self.url, {"location": search_text})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(self.url, {"location": "c"})
+        self.assertContains(response, "Too many searches", status_code=429)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(mock_requests.get.call_count, 2)
+
+    def test_drops_superseded_searches(self, mock_requests):
+        """
+        Returns 204 without searching if the user already sent a newer search.
+        """
+        ext_response = r_Response()
+        ext_response.status_code = 200
+        ext_response.json = mock.MagicMock(return_value={"features": []})
+        mock_requests.get.return_value = ext_response
+
+        response = self.client.post(self.url, {"location": "nemo", "sent": 2000})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(self.url, {"location": "ne", "sent": 1000})
+        self.assertEqual(response.status_code, 204)
+        mock_requests.get.assert_called_once()
+
+
+class BenchmarkPagesCommandTests(TestCase):
+    def test_reports_pages(self):
+        """
+        Reports the latency and query count of each page.
+        """
+        user = User.objects.create(username="myuser")
+        Trip.objects.create(owner=user, title="trip")
+        out = StringIO()
+        call_command("benchmark_pages", "/profile/", "/calendar/", "--user", "myuser",
+                     "--requests", "3", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], f"{connection.vendor} database, 3 requests per page")
+        self.assertTrue(lines[2].startswith("/profile/"))
+        self.assertTrue(lines[3].startswith("/calendar/"))
+
+        with self.assertRaisesMessage(CommandError, "No user 'nobody'"):
+            call_command("benchmark_pages", "--user", "nobody")
+
+    def test_reports_compression(self):
+        """
+        Reports the bytes saved and CPU time of each encoding with --compression.
+        """
+        user = User.objects.create(username="myuser")
+        out = StringIO()
+        call_command("benchmark_pages", "/profile/", "--user", "myuser", "--requests", "2",
+                     "--compression", stdout=out)
+        self.assertRegex(out.getvalue(), r"gzip +\d+ -> +\d+ bytes \(\d+% saved\), [\d.]+ms CPU \(used\)")
@@ -0,0 +1,111 @@
+"""
+Throttling of location searches with token buckets kept in the cache.
+
+Each user has a bucket, and all users share a global one that bounds the
+load on workers and on the Mapbox quota. Buckets and the counts of
+searches by outcome (shown by `manage.py searchthrottle`) are shared by
+all processes where the cache is, as in production; elsewhere each
+process has its own. A bucket holds up to `burst`
+tokens and refills at `rate` tokens a second; a search takes one token
+from each. Reads and writes of a bucket are not atomic, so concurrent
+requests can occasionally get a token too many, which is fine for
+throttling.
+
+Searches are also dropped when the same user has already sent a newer one
+(the search field sends the time it was typed in), since their results
+would be thrown away anyway.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+EVENTS = ("allowed", "throttled_user", "throttled_global", "superseded")
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    def _key(self, key):
+        return f"throttle:{self.name}:{key}"
+
+    def take(self, key=""):
+        """
+        Takes a token from the bucket `key`. Returns 0 if there was one,
+        otherwise the seconds until there will be.
+        """
+        now = time.time()
+        tokens, stamp = cache.get(self._key(key), (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+        # once full again the entry can go
+        cache.set(self._key(key), (tokens - 1, now), self.burst / self.rate + 1)
+        return 0
+
+    def give_back(self, key=""):
+        """Returns a token taken for a request that was refused after all."""
+        state = cache.get(self._key(key))
+        if state:
+            cache.set(self._key(key), (min(self.burst, state[0] + 1), state[1]),
+                      self.burst / self.rate + 1)
+
+
+def record(event):
+    key = f"throttle:metrics:{event}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:  # evicted in between
+        cache.set(key, 1, None)
+
+
+def metrics():
+    """Counts of location searches by outcome since the cache was cleared."""
+    counts = cache.get_many([f"throttle:metrics:{event}" for event in EVENTS])
+    return {event: counts.get(f"throttle:metrics:{event}", 0) for event in EVENTS}
+
+
+def throttle_search(user):
+    """
+    Takes a token for a search by `user`. Returns 0 if the search may go
+    ahead, otherwise the seconds the user should wait before retrying.
+    """
+    user_bucket = TokenBucket("search-user", *settings.LOCATION_SEARCH_USER_RATE)
+    global_bucket = TokenBucket("search-global", *settings.LOCATION_SEARCH_GLOBAL_RATE)
+
+    if wait := user_bucket.take(user.pk):
+        record("throttled_user")
+        logger.info("Throttled location search by user %s for %.1fs", user.pk, wait)
+        return wait
+    if wait := global_bucket.take():
+        user_bucket.give_back(user.pk)
+        record("throttled_global")
+        logger.warning("Throttled location search globally for %.1fs", wait)
+        return wait
+    record("allowed")
+    return 0
+
+
+def search_superseded(user, sent):
+    """
+    Whether `user` has already sent a search newer than one sent at `sent`
+    (milliseconds since the epoch, as sent by the browser).
+    """
+    try:
+        sent = int(sent)
+    except (TypeError, ValueError):
+        return False
+    key = f"throttle:search-latest:{user.pk}"
+    if sent < cache.get(key, 0):
+        record("superseded")
+        return True
+    cache.set(key, sent, 60)
+    return False
@@ -0,0 +1,100 @@
+"""
+Static map thumbnails of trips.
+
+A thumbnail is an SVG drawing of a trip's route, so the trip list needs no
+map library or tile provider. Thumbnails are versioned by a hash of the
+points they show, rendered on a process pool (of `THUMBNAIL_PROCESSES`
+processes, or inline if 0) and cached on disk under
+`THUMBNAIL_CACHE_DIR/<trip>/<version>.svg`.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .geo import points_svg
+from .stats import route_destinations
+
+WIDTH = 160
+HEIGHT = 100
+# changing how thumbnails look changes all their versions
+STYLE = 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def trip_points(destinations):
+    """The located points of each trip's destinations, in route order."""
+    points = defaultdict(list)
+    for trip_id, latitude, longitude in route_destinations(destinations).values_list(
+            "trip_id", "latitude", "longitude"):
+        points[trip_id].append((latitude, longitude))
+    return points
+
+
+def thumbnail_version(points):
+    return hashlib.sha1(repr((STYLE, WIDTH, HEIGHT, points)).encode()).hexdigest()[:16]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawned rather than forked, as the web worker has threads
+            _pool = ProcessPoolExecutor(settings.THUMBNAIL_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def render_thumbnail(points):
+    """Renders a thumbnail on the process pool."""
+    global _pool
+    if not settings.THUMBNAIL_PROCESSES:
+        return points_svg(points, WIDTH, HEIGHT)
+    try:
+        return _get_pool().submit(points_svg, points, WIDTH, HEIGHT).result()
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None
+        return points_svg(points, WIDTH, HEIGHT)
+
+
+def get_thumbnail_path(trip_id, points):
+    """
+    Returns the path of a trip's cached thumbnail, rendering it if needed.
+    Rendering a new version removes the older ones.
+    """
+    trip_dir = os.path.join(settings.THUMBNAIL_CACHE_DIR, str(trip_id))
+    path = os.path.join(trip_dir, f"{thumbnail_version(points)}.svg")
+    if os.path.exists(path):
+        return path
+
+    data = render_thumbnail(points)
+    os.makedirs(trip_dir, exist_ok=True)
+    for old in os.listdir(trip_dir):
+        if old.endswith(".svg"):
+            try:
+                os.remove(os.path.join(trip_dir, old))
+            except FileNotFoundError:
+                pass
+    fd, tmp_path = tempfile.mkstemp(dir=trip_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def clear_thumbnails(trip_ids):
+    """Removes the cached thumbnails of trips."""
+    for trip_id in trip_ids:
+        shutil.rmtree(os.path.join(settings.THUMBNAIL_CACHE_DIR, str(trip_id)),
+                      ignore_errors=True)
@@ -0,0 +1,162 @@
+"""
+Mapbox Vector Tiles of destinations.
+
+Tiles are encoded by hand (the MVT format is a small protobuf schema and we
+only ever write points), built from indexed bbox queries and cached on disk
+per user data version.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+from .geo import BBox
+from .models import Destination
+
+EXTENT = 4096
+BUFFER = 64
+LAYER_NAME = "destinations"
+MAX_ZOOM = 22
+
+
+def tile_bbox(z, x, y, buffer=0):
+    """Returns the bbox of a tile, grown by `buffer` tile pixels."""
+    size = 2 ** z
+    pad = buffer / EXTENT
+
+    def lon(tx):
+        return min(max(tx / size * 360 - 180, -180), 180)
+
+    def lat(ty):
+        ty = min(max(ty, 0), size)
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / size))))
+
+    return BBox(lon(x - pad), lat(y + 1 + pad), lon(x + 1 + pad), lat(y - pad))
+
+
+def _tile_pixel(z, x, y, longitude, latitude):
+    size = 2 ** z
+    sin = math.sin(math.radians(latitude))
+    mx = (longitude / 360 + 0.5) * size
+    my = (0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi) * size
+    return round((mx - x) * EXTENT), round((my - y) * EXTENT)
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _uint(number, value):
+    return _field(number, 0) + _varint(value)
+
+
+def _bytes(number, value):
+    if isinstance(value, str):
+        value = value.encode()
+    return _field(number, 2) + _varint(len(value)) + value
+
+
+def _packed(number, values):
+    return _bytes(number, b"".join(_varint(v) for v in values))
+
+
+def encode_tile(z, x, y, points):
+    """
+    Encodes points into a one-layer vector tile.
+
+    `points` is an iterable of (id, longitude, latitude, properties) where
+    properties map names to strings.
+    """
+    keys, values = {}, {}
+    features = []
+    for pk, longitude, latitude, properties in points:
+        px, py = _tile_pixel(z, x, y, longitude, latitude)
+        tags = []
+        for key, value in properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(str(value), len(values)))
+        feature = (_uint(1, pk) + _packed(2, tags) + _uint(3, 1) +
+                   _packed(4, [(1 << 3) | 1, _zigzag(px), _zigzag(py)]))
+        features.append(_bytes(2, feature))
+
+    if not features:
+        return b""
+
+    layer = b"".join([
+        _uint(15, 2),
+        _bytes(1, LAYER_NAME),
+        *features,
+        *(_bytes(3, key) for key in keys),
+        *(_bytes(4, _bytes(1, value)) for value in values),
+        _uint(5, EXTENT),
+    ])
+    return _bytes(3, layer)
+
+
+def build_user_tile(user, z, x, y):
+    """Encodes a tile of a user's destinations."""
+    dests = Destination.objects.filter(trip__owner=user).in_bbox(
+        tile_bbox(z, x, y, BUFFER)).values_list("pk", "longitude", "latitude", "name", "trip__slug")
+    return encode_tile(z, x, y, (
+        (pk, lon, lat, {"name": name, "trip": slug}) for pk, lon, lat, name, slug in dests
+    ))
+
+
+def get_user_tile_path(user, z, x, y):
+    """
+    Returns the path of a user's cached tile, building it if needed.
+
+    Tiles live under `TILE_CACHE_DIR/<user>/<data version>/`, and building
+    the first tile of a new version removes the older versions.
+    """
+    user_dir = os.path.join(settings.TILE_CACHE_DIR, str(user.pk))
+    version_dir = os.path.join(user_dir, str(user.data_version))
+    path = os.path.join(version_dir, str(z), str(x), f"{y}.mvt")
+    if os.path.exists(path):
+        return path
+
+    if not os.path.isdir(version_dir) and os.path.isdir(user_dir):
+        for old_version in os.listdir(user_dir):
+            # a request still on an older version leaves newer ones alone
+            if old_version.isdigit() and int(old_version) < user.data_version:
+                shutil.rmtree(os.path.join(user_dir, old_version), ignore_errors=True)
+
+    data = build_user_tile(user, z, x, y)
+    for attempt in range(3):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            return path
+        except FileNotFoundError:
+            # the directory was removed meanwhile, by a request on a newer
+            # version or by deleting the user's trips
+            if attempt == 2:
+                raise
+
+
+def clear_user_tiles(user_ids):
+    """Removes the cached tiles of users."""
+    for user_id in user_ids:
+        shutil.rmtree(os.path.join(settings.TILE_CACHE_DIR, str(user_id)), ignore_errors=True)
@@ -9,8 +9,29 @@ app_name = "trips"
 urlpatterns = [
     path("", views.index, name="index"),
     path("profile/", views.UserTripsView.as_view(), name="profile"),
+    path("profile/map/", views.UserTripsMapView.as_view(), name="profile-map"),
+    path("search/", views.SearchView.as_view(), name="search"),
+    path("calendar/", views.CalendarView.as_view(), name="calendar"),
+    path("calendar/<int:year>/", views.CalendarView.as_view(), name="calendar-year"),
+    path("calendar/<int:year>/<int:month>/",
+         views.CalendarView.as_view(), name="calendar-month"),
+    path("tiles/<int:z>/<int:x>/<int:y>.mvt",
+         views.UserTileView.as_view(), name="user-tile"),
     path("trip/new/", views.CreateTripView.as_view(), name="create-trip"),
+    path("trip/search/", views.SearchTripView.as_view(), name="search-trip"),
     path("trip/<slug:slug>/", views.TripDetailView.as_view(), name="trip-detail"),
+    path("trip/<slug:slug>/map/", views.TripMapView.as_view(), name="trip-map"),
+    path("trip/<slug:slug>/thumbnail.svg",
+         views.TripThumbnailView.as_view(), name="trip-thumbnail"),
+    path("shared/<slug:slug>/", views.SharedTripView.as_view(), name="shared-trip"),
+    path("trip/<slug:slug>/optimize/",
+         views.OptimizeTripRouteView.as_view(), name="optimize-trip"),
+    path("trip/<slug:slug>/collaborators/",
+         views.TripCollaboratorsView.as_view(), name="trip-collaborators"),
+    path("trip/<slug:slug>/collaborators/add/",
+         views.AddCollaboratorView.as_view(), name="add-collaborator"),
+    path("trip/<slug:slug>/collaborators/<int:pk>/delete/",
+         views.RemoveCollaboratorView.as_view(), name="remove-collaborator"),
     path("trip/<slug:slug>/edit/", views.EditTripView.as_view(), name="edit-trip"),
     path("trip/<slug:slug>/delete/",
          views.DeleteTripView.as_view(), name="delete-trip"),
@@ -21,6 +42,14 @@ urlpatterns = [
          views.EditDestinationView.as_view(), name="edit-dest"),
     path("trip/<slug:trip_slug>/destination/<int:pk>/delete/",
          views.DeleteDestinationView.as_view(), name="delete-dest"),
+    path("destination/duplicates/",
+         views.DuplicateDestinationsView.as_view(), name="dest-duplicates"),
+    path("destination/duplicates/merge/",
+         views.MergeDestinationsView.as_view(), name="merge-dests"),
+    path("destination/conflicts/",
+         views.ScheduleConflictsView.as_view(), name="dest-conflicts"),
+    path("destination/nearby/",
+         views.NearbyDestinationsView.as_view(), name="nearby-dests"),
     path("destination/loc-search/",
          views.SearchLocationView.as_view(), name="search-loc")
 ]
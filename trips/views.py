@@ -2,18 +2,61 @@
 Views for the trips app.
 """
 
+import datetime
+import math
 import os
-import requests
 from http import HTTPStatus
-from django.shortcuts import render, get_object_or_404
-from django.views.generic import View, ListView, CreateView, DetailView, UpdateView, DeleteView
+from django.shortcuts import render, redirect
+from django.views.generic import (View, ListView, CreateView, DetailView, UpdateView, DeleteView,
+                                  FormView, TemplateView)
+from django.views.generic.detail import SingleObjectMixin
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse, reverse_lazy
-from django.http import HttpResponse, HttpResponseBadRequest
-from django.db.models import Avg
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.timezone import localdate, localtime
+
+from config.db import ReplicaReadMixin
+
+from .access import EDITOR, OWNER, VIEWER, get_trip, has_role
+from .models import Collaborator, Trip, Destination
+from .forms import CollaboratorForm, TripForm, DestinationForm, MergeDestinationsForm
+from .geo import BBox, point_feature, feature_collection, wrap_longitude
+from .clustering import get_trip_cluster_index
+from .stats import trip_route, user_route_totals
+from .routing import optimize_trip_route
+from .nearby import nearest_destinations
+from .dedup import merge_destinations, user_duplicate_groups
+from .schedule import calendar_months, user_schedule_conflicts
+from .search import search_page
+from .deletion import delete_trips
+from .locations import LocationSearchError, search_locations
+from .throttle import search_superseded, throttle_search
+from . import sharing, thumbnails, tiles
+
+
+class TripAccessMixin(UserPassesTestMixin):
+    """
+    Allows users with at least `required_role` on the trip in the URL, see
+    access.py. `get_trip()` returns the trip with the user's `access_role`.
+    """
+    required_role = OWNER
+    trip_slug_url_kwarg = "slug"
+    permission_denied_message = "You don't have access to this trip."
 
-from .models import Trip, Destination
-from .forms import TripForm, DestinationForm
+    def get_trip(self):
+        return get_trip(self.request, self.kwargs[self.trip_slug_url_kwarg])
+
+    def test_func(self):
+        return has_role(self.get_trip(), self.required_role)
+
+
+class TripObjectMixin(TripAccessMixin):
+    """For views of the trip itself, whose object is the checked trip."""
+
+    def get_object(self, queryset=None):
+        return self.get_trip()
 
 
 def index(request):
@@ -24,7 +67,7 @@ def index(request):
     return render(request, "trips/index.html")
 
 
-class UserTripsView(LoginRequiredMixin, ListView):
+class UserTripsView(ReplicaReadMixin, LoginRequiredMixin, ListView):
     """View for trips for a logged-in user."""
     context_object_name = "user_trip_list"
     template_name = "trips/profile.html"
@@ -32,40 +75,221 @@ class UserTripsView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["create_trip_form"] = TripForm()
+        route_totals = user_route_totals(self.request.user)
+        points = thumbnails.trip_points(Destination.objects.filter(trip__owner=self.request.user))
+        for trip in context["user_trip_list"]:
+            trip.route_totals = route_totals.get(trip.pk)
+            if trip.pk in points:
+                trip.thumbnail_url = (reverse("trips:trip-thumbnail", args=[trip.slug]) +
+                                      f"?v={thumbnails.thumbnail_version(points[trip.pk])}")
         context["create_dest_form"] = DestinationForm(user=self.request.user)
         context["mapbox_api_key"] = os.getenv("MAPBOX_ACCESS_TOKEN")
-        mapbox_trips = self.request.user.trip_set.annotate(avg_latitude=Avg('destination__latitude'), avg_longitude=Avg(
-            'destination__longitude')).exclude(avg_latitude=None).exclude(avg_longitude=None)
-        context["mapbox_trips"] = [{
-            'title': trip.title,
-            'avg_latitude': trip.avg_latitude,
-            'avg_longitude': trip.avg_longitude,
-            'link': trip.get_absolute_url(),
-        } for trip in mapbox_trips]
+        tile_root = reverse("trips:user-tile", args=[0, 0, 0]).removesuffix("0/0/0.mvt")
+        context["destination_tiles_url"] = (
+            f"{tile_root}{{z}}/{{x}}/{{y}}.mvt?v={self.request.user.data_version}")
+        context["shared_trips"] = Trip.objects.filter(
+            collaborator__user=self.request.user).select_related("owner").order_by("title")
         return context
 
     def get_queryset(self):
         return self.request.user.trip_set.all()
 
 
-class TripDetailView(UserPassesTestMixin, DetailView):
+class TripDetailView(ReplicaReadMixin, TripObjectMixin, DetailView):
     """View for single trip details."""
     model = Trip
-    permission_denied_message = "You don't have access to this trip."
-
-    def test_func(self):
-        return self.request.user == self.get_object().owner
+    required_role = VIEWER
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["create_dest_form"] = DestinationForm(only_trip=self.object)
-        mapbox_dests = self.object.destination_set.exclude(longitude=None).exclude(
-            latitude=None).values('name', 'latitude', 'longitude')
-        context["mapbox_destinations"] = list(mapbox_dests)
+        context["can_edit"] = has_role(self.object, EDITOR)
+        context["is_owner"] = has_role(self.object, OWNER)
+        if context["can_edit"]:
+            context["create_dest_form"] = DestinationForm(only_trip=self.object)
+        route = trip_route(self.object)
+        context["route_legs"] = route
+        context["route_distance_km"] = sum(leg["distance_km"] for leg in route)
         context["mapbox_api_key"] = os.getenv("MAPBOX_ACCESS_TOKEN")
         return context
 
 
+class SharedTripView(View):
+    """
+    View for the public, read-only page of a shared trip.
+
+    The page is the same for everyone and served from the cache (see
+    sharing.py), so it is neither checked against nor rendered for the user.
+    """
+
+    def get(self, request, slug):
+        page = sharing.get_shared_page(slug)
+        if page is None:
+            raise Http404("No such shared trip")
+        response = HttpResponse(page["content"])
+        response["ETag"] = page["etag"]
+        sharing.patch_shared_headers(response, slug)
+        return get_conditional_response(request, etag=page["etag"], response=response)
+
+
+class MapDataView(View):
+    """
+    Base view for GeoJSON map data.
+
+    Responses are compact, compressed when accepted and carry an ETag so the
+    browser can revalidate instead of downloading the data again.
+    Subclasses implement `get_features(bbox)`.
+    """
+
+    def get(self, request, *args, **kwargs):
+        bbox = None
+        if request.GET.get("bbox"):
+            try:
+                bbox = BBox.parse(request.GET["bbox"])
+            except ValueError:
+                return HttpResponseBadRequest("Invalid bbox")
+
+        data = self.get_data(bbox)
+        response = JsonResponse(data, json_dumps_params={"separators": (",", ":")})
+        patch_cache_control(response, private=True, no_cache=True)
+        set_response_etag(response)
+        return get_conditional_response(request, etag=response["ETag"], response=response)
+
+    def get_data(self, bbox):
+        return feature_collection(self.get_features(bbox))
+
+    def get_features(self, bbox):
+        raise NotImplementedError
+
+
+class UserTripsMapView(ReplicaReadMixin, LoginRequiredMixin, MapDataView):
+    """
+    View for map markers of a logged-in user's trips.
+
+    With a `zoom` parameter, markers are clustered for that zoom level.
+    """
+
+    def get(self, request, *args, **kwargs):
+        self.zoom = None
+        if request.GET.get("zoom"):
+            try:
+                self.zoom = int(float(request.GET["zoom"]))
+            except (ValueError, OverflowError):
+                return HttpResponseBadRequest("Invalid zoom")
+        return super().get(request, *args, **kwargs)
+
+    def get_data(self, bbox):
+        if self.zoom is None:
+            return super().get_data(bbox)
+        index = get_trip_cluster_index(self.request.user)
+        data = feature_collection(index.get_clusters(self.zoom, bbox))
+        if index.bbox:
+            data["bbox"] = [round(coord, 6) for coord in index.bbox]
+        return data
+
+    def get_features(self, bbox):
+        trips = self.request.user.trip_set.with_centroid()
+        if bbox:
+            trips = trips.filter(bbox.as_q("avg_latitude", "avg_longitude"))
+
+        return [point_feature(trip.avg_longitude, trip.avg_latitude,
+                              title=trip.title, link=trip.get_absolute_url())
+                for trip in trips.only("slug", "title")]
+
+
+class TripMapView(ReplicaReadMixin, TripAccessMixin, MapDataView):
+    """View for map markers of a single trip's destinations."""
+    required_role = VIEWER
+
+    def get_features(self, bbox):
+        dests = self.get_trip().destination_set.exclude(longitude=None).exclude(latitude=None)
+        if bbox:
+            dests = dests.in_bbox(bbox)
+
+        return [point_feature(dest["longitude"], dest["latitude"], name=dest["name"])
+                for dest in dests.values("name", "latitude", "longitude")]
+
+
+class NearbyDestinationsView(LoginRequiredMixin, MapDataView):
+    """View for a logged-in user's destinations nearest to a point."""
+    max_results = 100
+
+    def get(self, request, *args, **kwargs):
+        try:
+            self.latitude = float(request.GET["latitude"])
+            # maps panned across the antimeridian report longitudes past 180
+            self.longitude = wrap_longitude(float(request.GET["longitude"]))
+            self.k = min(int(request.GET.get("k", 10)), self.max_results)
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest("Invalid point")
+        if not (-90 <= self.latitude <= 90 and -180 <= self.longitude <= 180):
+            return HttpResponseBadRequest("Invalid point")
+        return super().get(request, *args, **kwargs)
+
+    def get_features(self, bbox):
+        nearest = nearest_destinations(self.request.user, self.latitude, self.longitude, self.k)
+        return [point_feature(lon, lat, distance_km=round(km, 3), **props)
+                for pk, lat, lon, km, props in nearest]
+
+
+class UserTileView(LoginRequiredMixin, View):
+    """
+    View for vector tiles of a logged-in user's destinations.
+
+    Tile URLs carry the user's data version as `v`, so a tile for the
+    current version never changes and is served as immutable.
+    """
+
+    def get(self, request, z, x, y):
+        if z > tiles.MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            raise Http404("No such tile")
+
+        path = tiles.get_user_tile_path(request.user, z, x, y)
+        response = FileResponse(open(path, "rb"), content_type="application/vnd.mapbox-vector-tile")
+        if request.GET.get("v") == str(request.user.data_version):
+            patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class TripThumbnailView(TripObjectMixin, SingleObjectMixin, View):
+    """
+    View for the map thumbnail of a trip.
+
+    Thumbnail URLs carry the thumbnail's version as `v`, so a thumbnail for
+    the current version never changes and is served as immutable.
+    """
+    model = Trip
+    required_role = VIEWER
+
+    def get(self, request, *args, **kwargs):
+        trip = self.get_object()
+        points = thumbnails.trip_points(trip.destination_set.all())[trip.pk]
+        path = thumbnails.get_thumbnail_path(trip.pk, points)
+        response = FileResponse(open(path, "rb"), content_type="image/svg+xml")
+        if request.GET.get("v") == thumbnails.thumbnail_version(points):
+            patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class OptimizeTripRouteView(TripObjectMixin, SingleObjectMixin, View):
+    """View for reordering a trip's destinations into a shorter route."""
+    model = Trip
+    required_role = EDITOR
+
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        old_length, new_length = optimize_trip_route(self.object)
+        if new_length < old_length:
+            messages.success(request, (
+                f"Shortened the route from {old_length:.1f} km to {new_length:.1f} km."))
+        else:
+            messages.info(request, f"The route of {old_length:.1f} km is already as short as it gets.")
+        return redirect(self.object)
+
+
 class CreateTripView(LoginRequiredMixin, CreateView):
     """View for creating a new trip."""
 
@@ -77,51 +301,110 @@ class CreateTripView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class EditTripView(UserPassesTestMixin, UpdateView):
+class EditTripView(TripObjectMixin, UpdateView):
     """View for updating a trip."""
     template_name_suffix = "_update_form"
     model = Trip
     form_class = TripForm
-    permission_denied_message = "You don't have access to this trip."
+    required_role = EDITOR
 
-    def test_func(self):
-        return self.request.user == self.get_object().owner
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # only the owner shares a trip publicly
+        if not has_role(self.object, OWNER):
+            del form.fields["public"]
+        return form
 
 
-class DeleteTripView(UserPassesTestMixin, DeleteView):
+class DeleteTripView(TripObjectMixin, DeleteView):
     """View for deleting a trip."""
     model = Trip
     success_url = reverse_lazy("trips:profile")
-    permission_denied_message = "You don't have access to this trip."
 
-    def test_func(self):
-        return self.request.user == self.get_object().owner
+    def form_valid(self, form):
+        delete_trips(Trip.objects.filter(pk=self.object.pk))
+        return redirect(self.get_success_url())
+
+
+class TripCollaboratorsView(ReplicaReadMixin, TripAccessMixin, ListView):
+    """View for the collaborators of a trip, a page at a time."""
+    template_name = "trips/trip_collaborators.html"
+    context_object_name = "collaborators"
+    paginate_by = 50
+    required_role = VIEWER
+
+    def get_queryset(self):
+        return self.get_trip().collaborator_set.select_related("user").only(
+            "trip", "role", "user__username").order_by("user__username", "pk")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["trip"] = self.get_trip()
+        context["is_owner"] = has_role(context["trip"], OWNER)
+        return context
+
+
+class AddCollaboratorView(TripAccessMixin, FormView):
+    """View for sharing a trip with a user, or changing their role."""
+    template_name = "trips/add_collaborator.html"
+    form_class = CollaboratorForm
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["trip"] = self.get_trip()
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["trip"] = self.get_trip()
+        return context
+
+    def form_valid(self, form):
+        Collaborator.objects.update_or_create(
+            trip=self.get_trip(), user=form.cleaned_data["username"],
+            defaults={"role": form.cleaned_data["role"]})
+        return redirect("trips:trip-collaborators", slug=self.get_trip().slug)
 
 
-class CreateDestinationView(UserPassesTestMixin, CreateView):
+class RemoveCollaboratorView(TripAccessMixin, DeleteView):
+    """View for removing a collaborator from a trip."""
+    model = Collaborator
+
+    def get_queryset(self):
+        return self.get_trip().collaborator_set.select_related("user")
+
+    def get_success_url(self):
+        return reverse("trips:trip-collaborators", args=[self.object.trip.slug])
+
+
+class ScheduleConflictMixin:
+    """Warns about stops overlapping a saved destination's times."""
+
+    def form_valid(self, form):
+        for dest in form.schedule_conflicts:
+            messages.warning(self.request, (
+                f"{form.cleaned_data['name']} overlaps {dest.name} "
+                f"({dest.trip.title}) starting {localtime(dest.start_time):%Y-%m-%d %H:%M}."))
+        return super().form_valid(form)
+
+
+class CreateDestinationView(TripAccessMixin, ScheduleConflictMixin, CreateView):
     """View for creating a new destination."""
 
     template_name = "trips/create_destination.html"
     form_class = DestinationForm
-    permission_denied_message = "You don't have access to this trip."
-
-    def setup(self, request, *args, **kwargs):
-        self.trip = None
-        trip_slug = kwargs.get("trip_slug")
-        if trip_slug:
-            self.trip = get_object_or_404(Trip, slug=trip_slug)
-
-        return super().setup(request, *args, **kwargs)
+    required_role = EDITOR
+    trip_slug_url_kwarg = "trip_slug"
 
     def test_func(self):
-        if self.trip:
-            return self.request.user == self.trip.owner
+        if self.trip_slug_url_kwarg in self.kwargs:
+            return super().test_func()
         return self.request.user.is_authenticated
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        if self.trip:
-            kwargs["only_trip"] = self.trip
+        if self.trip_slug_url_kwarg in self.kwargs:
+            kwargs["only_trip"] = self.get_trip()
         kwargs["user"] = self.request.user
         return kwargs
 
@@ -129,23 +412,16 @@ class CreateDestinationView(UserPassesTestMixin, CreateView):
         return reverse("trips:trip-detail", args=[self.object.trip.slug])
 
 
-class EditDestinationView(UserPassesTestMixin, UpdateView):
+class EditDestinationView(TripAccessMixin, ScheduleConflictMixin, UpdateView):
     """View for deleting a destination."""
     model = Destination
     form_class = DestinationForm
     template_name_suffix = "_update_form"
-    permission_denied_message = "You don't have access to this trip."
-
-    def setup(self, request, *args, **kwargs):
-        trip_slug = kwargs.get("trip_slug")
-        dest_pk = kwargs.get("pk")
-        trip = get_object_or_404(Trip, slug=trip_slug)
-        get_object_or_404(Destination, trip=trip, pk=dest_pk)
+    required_role = EDITOR
+    trip_slug_url_kwarg = "trip_slug"
 
-        return super().setup(request, *args, **kwargs)
-
-    def test_func(self):
-        return self.request.user == self.get_object().trip.owner
+    def get_queryset(self):
+        return self.get_trip().destination_set.all()
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -156,26 +432,126 @@ class EditDestinationView(UserPassesTestMixin, UpdateView):
         return reverse("trips:trip-detail", args=[self.object.trip.slug])
 
 
-class DeleteDestinationView(UserPassesTestMixin, DeleteView):
+class DeleteDestinationView(TripAccessMixin, DeleteView):
     """View for deleting a destination."""
     model = Destination
-    permission_denied_message = "You don't have access to this trip."
-
-    def setup(self, request, *args, **kwargs):
-        trip_slug = kwargs.get("trip_slug")
-        dest_pk = kwargs.get("pk")
-        trip = get_object_or_404(Trip, slug=trip_slug)
-        get_object_or_404(Destination, trip=trip, pk=dest_pk)
+    required_role = EDITOR
+    trip_slug_url_kwarg = "trip_slug"
 
-        return super().setup(request, *args, **kwargs)
-
-    def test_func(self):
-        return self.request.user == self.get_object().trip.owner
+    def get_queryset(self):
+        return self.get_trip().destination_set.all()
 
     def get_success_url(self):
         return reverse("trips:trip-detail", args=[self.object.trip.slug])
 
 
+class DuplicateDestinationsView(LoginRequiredMixin, TemplateView):
+    """View for a logged-in user's likely duplicate destinations."""
+    template_name = "trips/destination_duplicates.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["duplicate_groups"] = user_duplicate_groups(self.request.user)
+        return context
+
+
+class MergeDestinationsView(LoginRequiredMixin, FormView):
+    """View for merging duplicate destinations into one."""
+    form_class = MergeDestinationsForm
+    http_method_names = ["post"]
+    success_url = reverse_lazy("trips:dest-duplicates")
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
+    def form_valid(self, form):
+        merge_destinations(form.cleaned_data["keep"], form.cleaned_data["merge"])
+        return super().form_valid(form)
+
+    def form_invalid(self, form):
+        return HttpResponseBadRequest("Invalid merge")
+
+
+class ScheduleConflictsView(LoginRequiredMixin, TemplateView):
+    """View for a logged-in user's destinations that overlap in time."""
+    template_name = "trips/destination_conflicts.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["conflicts"] = user_schedule_conflicts(self.request.user)
+        return context
+
+
+class CalendarView(ReplicaReadMixin, LoginRequiredMixin, TemplateView):
+    """
+    View for a calendar of a logged-in user's trips and destinations.
+
+    Shows a single month when one is given (or by default the current
+    month), otherwise the whole year.
+    """
+    template_name = "trips/calendar.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        today = localdate()
+        year = kwargs.get("year", today.year)
+        month = kwargs.get("month", None if "year" in kwargs else today.month)
+        if not datetime.MINYEAR < year < datetime.MAXYEAR or month not in (None, *range(1, 13)):
+            raise Http404("No such month")
+
+        months = [month] if month else list(range(1, 13))
+        context["months"] = calendar_months(self.request.user, year, months)
+        context["year"] = year
+        context["month"] = month
+        if month:
+            prev_month = datetime.date(year, month, 1) - datetime.timedelta(days=1)
+            next_month = datetime.date(year, month, 28) + datetime.timedelta(days=4)
+            context["prev_url"] = reverse(
+                "trips:calendar-month", args=[prev_month.year, prev_month.month])
+            context["next_url"] = reverse(
+                "trips:calendar-month", args=[next_month.year, next_month.month])
+        else:
+            context["prev_url"] = reverse("trips:calendar-year", args=[year - 1])
+            context["next_url"] = reverse("trips:calendar-year", args=[year + 1])
+        return context
+
+
+class SearchTripView(LoginRequiredMixin, ListView):
+    """View for searching the trips a logged-in user can add destinations to by title."""
+    template_name = "trips/trip_search_results_snippet.html"
+    context_object_name = "trips"
+    paginate_by = 10
+
+    def get_queryset(self):
+        trips = Trip.objects.editable_by(self.request.user).only("pk", "title").order_by(
+            "title", "pk")
+        query = self.request.GET.get("trip_search", "").strip()
+        if query:
+            trips = trips.filter(title__icontains=query)
+        return trips
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET.get("trip_search", "").strip()
+        return context
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    """View for full-text search of a logged-in user's trips and destinations."""
+    template_name = "trips/search.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "").strip()
+        context["query"] = query
+        if query:
+            context["page_obj"] = search_page(
+                self.request.user, query, self.request.GET.get("page", 1))
+        return context
+
+
 class SearchLocationView(LoginRequiredMixin, View):
     """View for searching a location with Mapbox."""
 
@@ -184,31 +560,18 @@ class SearchLocationView(LoginRequiredMixin, View):
         if not q:
             return HttpResponseBadRequest("Missing search query")
 
-        mapbox_access_token = os.environ["MAPBOX_ACCESS_TOKEN"]
-        params = {
-            "q": q,
-            "access_token": mapbox_access_token,
-            "auto_complete": "true",
-        }
-        response = requests.get(
-            "https://api.mapbox.com/search/searchbox/v1/forward", params=params)
-
-        if not response.ok:
-            err = str({
-                "reason": response.reason,
-                "response": response.json()
-            })
-            return HttpResponse(err, status=HTTPStatus.BAD_GATEWAY)
-
-        results = []
-        for feature in response.json()["features"]:
-            props = feature["properties"]
-            coords = props["coordinates"]
-            results.append({
-                "name": props["name"],
-                "place": props.get("place_formatted"),
-                "latitude": coords["latitude"],
-                "longitude": coords["longitude"],
-            })
-
-        return render(request, "trips/location_search_results_snippet.html", {"locations": results})
+        if search_superseded(request.user, request.POST.get("sent")):
+            return HttpResponse(status=HTTPStatus.NO_CONTENT)
+        if retry_after := throttle_search(request.user):
+            response = HttpResponse("Too many searches, try again shortly",
+                                    status=HTTPStatus.TOO_MANY_REQUESTS)
+            response["Retry-After"] = math.ceil(retry_after)
+            return response
+
+        try:
+            results, stale = search_locations(request.user, q)
+        except LocationSearchError as e:
+            return HttpResponse(str(e), status=HTTPStatus.BAD_GATEWAY)
+
+        return render(request, "trips/location_search_results_snippet.html",
+                      {"locations": results, "stale": stale})